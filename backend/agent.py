@@ -1,10 +1,16 @@
-import asyncio, json, base64, re, sys
+import asyncio, json, re, sys
+from dataclasses import asdict
 from pathlib import Path
 from typing import Literal
 
 from backend.smart_browser_controller import SmartBrowserController
-from backend.vision_model import decide
+from backend.vision_model import decide, no_change_note, unchanged_page_action
 from backend.universal_extractor import UniversalExtractor
+from backend.tab_explorer import explore_tabs
+from backend.dom_diff import diff_page_states
+from backend.ax_tree import COMPARE_REPRESENTATIONS
+from backend.screen_hash import same_screen, UNCHANGED_MODEL_STEPS
+from backend.screenshot_store import screenshot_store
 from utils.helpers import discover_function_registry, parse_run_functions
 
 # Ensure project root is on the Python path so top-level utility modules can be imported
@@ -92,6 +98,11 @@ async def run_agent(
     enable_streaming: bool = False,
     storage_location: str | None = None,
     include_images: bool = False,
+    resource_profile: str = "none",
+    max_tabs: int = 3,
+    use_asset_cache: bool = False,
+    dom_engine: str = "js",
+    page_representation: str = "dom",
 ):
     """Enhanced agent with smart proxy rotation and vision-based anti-bot detection"""
     from backend.main import broadcast, OUTPUT_DIR, register_streaming_session, store_job_info
@@ -117,7 +128,18 @@ async def run_agent(
     function_registry = discover_function_registry()
     
     # Use SmartBrowserController instead of regular BrowserController
-    async with SmartBrowserController(headless, proxy, enable_streaming) as browser:
+    # Images stay allowed when they are going to be embedded in the PDF
+    allow_images = include_images and fmt == "pdf"
+    async with SmartBrowserController(
+        headless,
+        proxy,
+        enable_streaming,
+        resource_profile=resource_profile,
+        allow_images=allow_images,
+        use_asset_cache=use_asset_cache,
+        dom_engine=dom_engine,
+    ) as browser:
+        browser.watchdog.label = job_id
         
         # Register streaming session
         if enable_streaming:
@@ -131,6 +153,11 @@ async def run_agent(
             "prompt": prompt,
             "storage_location": storage_location,
             "include_images": include_images,
+            "resource_profile": resource_profile,
+            "max_tabs": max_tabs,
+            "asset_cache": use_asset_cache,
+            "dom_engine": dom_engine,
+            "page_representation": page_representation,
         })
         
         # Show initial proxy stats
@@ -205,11 +232,22 @@ async def run_agent(
         max_consecutive_scrolls = 3
         extraction_attempts = 0
         max_extraction_attempts = 2
+        # Page state and decision of the previous step, to see what the action changed
+        previous_page_state = None
+        previous_action = None
+        previous_decision = None
+        # Steps in a row whose action changed neither the DOM nor the screenshot
+        unchanged_steps = 0
+        decision_stats = {"model_calls": 0, "images_skipped": 0, "local_decisions": 0}
         
         print(f"🎯 Running for max {max_steps} steps, output format: {fmt}")
         
         # Main enhanced agent loop with smart proxy rotation
         for step in range(max_steps):
+            # Report how long the previous step actually waited for the page to settle
+            if step > 0:
+                await report_settle_time(job_id, browser, step)
+            
             print(f"\n🔄 Step {step + 1}/{max_steps}")
             
             # Periodically check proxy health and broadcast stats
@@ -223,23 +261,54 @@ async def run_agent(
                 print(f"📊 Proxy health check: {proxy_stats['available']}/{proxy_stats['total']} available")
             
             try:
+                # The watchdog only flags a crashed or bloated context; it is swapped here, between actions
+                recycled = await browser.recycle_if_requested()
+                if recycled:
+                    print(f"♻️ Browser context recycled ({recycled})")
+                    previous_page_state = None
+                    previous_decision = None
+                    unchanged_steps = 0
+
                 page_state = await browser.get_page_state(include_screenshot=True)
                 print(f"📊 Found {len(page_state.selector_map)} interactive elements")
+                occluded = page_state.dom_stats.get("occludedElements", 0)
+                redundant = page_state.dom_stats.get("redundantElements", 0)
+                if occluded or redundant:
+                    print(f"🙈 Filtered out {occluded} covered and {redundant} duplicate elements")
                 print(f"📍 Current: {page_state.url}")
                 
+                dom_diff = None
+                page_unchanged = False
+                if previous_page_state is not None:
+                    dom_diff = diff_page_states(previous_page_state, page_state)
+                    print(f"🧬 Since last step: +{len(dom_diff.added)} -{len(dom_diff.removed)} "
+                          f"~{len(dom_diff.changed)} elements{', new URL' if dom_diff.url_changed else ''}")
+                    page_unchanged = dom_diff.is_empty() and same_screen(previous_page_state.screen_hash,
+                                                                         page_state.screen_hash)
+                    if dom_diff.is_empty() and previous_action in ("click", "type", "press_key"):
+                        print(f"⚠️ Last {previous_action} did not change the page")
+                unchanged_steps = unchanged_steps + 1 if page_unchanged else 0
+                
                 await broadcast(job_id, {
                     "type": "page_info",
                     "step": step + 1,
                     "url": page_state.url,
                     "title": page_state.title,
                     "interactive_elements": len(page_state.selector_map),
+                    "dom_stats": page_state.dom_stats,
+                    "dom_diff": dom_diff.summary() if dom_diff else None,
+                    "previous_action": previous_action,
+                    "page_unchanged": page_unchanged,
                     "format": fmt
                 })
                 
                 if page_state.screenshot:
+                    # Clients get a reference and fetch the image (or its thumbnail) over HTTP
+                    stored = await screenshot_store.put(job_id, page_state.screenshot)
                     await broadcast(job_id, {
                         "type": "screenshot",
-                        "screenshot": page_state.screenshot
+                        "step": step + 1,
+                        **asdict(stored)
                     })
                 
             except Exception as e:
@@ -259,15 +328,31 @@ async def run_agent(
             
             # AI decision making
             try:
-                screenshot_bytes = base64.b64decode(page_state.screenshot)
-                decision = await decide(screenshot_bytes, page_state, prompt)
+                screenshot_bytes = page_state.screenshot
+                if unchanged_steps > UNCHANGED_MODEL_STEPS:
+                    # The model already saw this page without effect, decide locally
+                    decision = unchanged_page_action(page_state, prompt, previous_decision)
+                    decision_stats["local_decisions"] += 1
+                    print(f"🔁 Page unchanged for {unchanged_steps} steps, local decision instead of a model call")
+                else:
+                    ax_elements = None
+                    if page_representation == "ax" or COMPARE_REPRESENTATIONS:
+                        ax_elements = await browser.get_ax_elements(page_state)
+                    # Same screen as last step: say so instead of resending the image
+                    note = no_change_note(previous_decision) if unchanged_steps else None
+                    decision = await decide(screenshot_bytes, page_state, prompt, ax_elements, page_representation,
+                                            unchanged_note=note)
+                    decision_stats["model_calls"] += 1
+                    if note:
+                        decision_stats["images_skipped"] += 1
                 
                 print(f"🤖 AI Decision: {decision.get('action')} - {decision.get('reason', 'No reason')}")
                 
                 await broadcast(job_id, {
                     "type": "decision",
                     "step": step + 1,
-                    "decision": decision
+                    "decision": decision,
+                    "decision_stats": dict(decision_stats)
                 })
                 
             except Exception as e:
@@ -277,6 +362,9 @@ async def run_agent(
             # Execute action with enhanced error handling
             action = decision.get("action")
             print(f"⚡ Executing: {action}")
+            previous_page_state = page_state
+            previous_action = action
+            previous_decision = decision
             
             try:
                 if action == "click":
@@ -287,7 +375,6 @@ async def run_agent(
                         await browser.click_element_by_index(index, page_state)
                         consecutive_scrolls = 0
                         extraction_attempts = 0  # Reset on navigation
-                        await asyncio.sleep(2)
                     else:
                         print(f"❌ Invalid click index: {index}")
                         
@@ -299,7 +386,7 @@ async def run_agent(
                         print(f"⌨️ Typing '{text}' into: {elem.text[:30]}...")
                         await browser.input_text_by_index(index, text, page_state)
                         consecutive_scrolls = 0
-                        await asyncio.sleep(1)
+                        await browser.wait_for_settle("type")
                     else:
                         print(f"❌ Invalid type parameters: index={index}, text='{text}'")
                         
@@ -320,7 +407,32 @@ async def run_agent(
                     print(f"🔑 Pressing key: {key}")
                     await browser.press_key(key)
                     consecutive_scrolls = 0
-                    await asyncio.sleep(2)
+                    
+                elif action == "explore":
+                    indices = decision.get("indices", [])
+                    if max_tabs > 1 and len(indices) > 1:
+                        print(f"🗂️ Exploring {min(len(indices), max_tabs)} links in parallel tabs")
+                        result = await explore_tabs(browser, page_state, indices, prompt, max_tabs)
+                        for tab in result["tabs"]:
+                            status = f"error: {tab['error']}" if tab["error"] else f"score {tab['score']}"
+                            print(f"   • {tab['url']} ({status})")
+                        if result["chosen"]:
+                            print(f"✅ Continuing on: {result['chosen']['url']}")
+                            consecutive_scrolls = 0
+                            extraction_attempts = 0
+                        else:
+                            print("❌ No explored tab loaded successfully")
+                        await broadcast(job_id, {
+                            "type": "explore",
+                            "step": step + 1,
+                            **result
+                        })
+                    elif indices:
+                        # Tabs disabled for this job, follow the first candidate instead
+                        print(f"🖱️ Exploring disabled (max_tabs={max_tabs}), clicking index {indices[0]}")
+                        await browser.click_element_by_index(indices[0], page_state)
+                        consecutive_scrolls = 0
+                        extraction_attempts = 0
                     
                 elif action == "navigate":
                     url = decision.get("url", "")
@@ -331,7 +443,6 @@ async def run_agent(
                             await browser.goto(url)
                             consecutive_scrolls = 0
                             extraction_attempts = 0
-                            await asyncio.sleep(2)
                         except Exception as nav_error:
                             print(f"❌ Smart navigation failed: {nav_error}")
                             # Broadcast navigation failure with proxy stats
@@ -393,9 +504,9 @@ async def run_agent(
             except Exception as e:
                 print(f"❌ Action execution failed: {e}")
                 await asyncio.sleep(1)
-            
-            # Small delay between actions
-            await asyncio.sleep(0.5)
+        
+        # Settle time of the last step
+        await report_settle_time(job_id, browser, step + 1)
         
         # Final extraction if not done yet
         if extraction_attempts == 0:
@@ -415,12 +526,49 @@ async def run_agent(
         final_proxy_stats = browser.get_proxy_stats()
         print(f"📊 Final proxy stats: {final_proxy_stats}")
         
+        resource_stats = browser.get_resource_stats()
+        print(f"🚧 Resource blocking: {resource_stats['requests_blocked']}/{resource_stats['requests_seen']} requests blocked, "
+              f"~{resource_stats['estimated_bytes_saved'] // 1024} KB saved")
+        
+        asset_cache_stats = browser.get_asset_cache_stats()
+        if asset_cache_stats["enabled"]:
+            print(f"📦 Asset cache: {asset_cache_stats['hits']} hits ({asset_cache_stats['hit_rate']:.0%}), "
+                  f"{asset_cache_stats['bytes_saved'] // 1024} KB served from disk")
+        
+        watchdog_stats = browser.get_watchdog_stats()
+        if watchdog_stats["recycles"]:
+            print(f"♻️ Browser context recycled: {watchdog_stats['recycles']}")
+        
+        frame_cache_stats = browser.get_frame_cache_stats()
+        print(f"🖼️ Screenshots: {frame_cache_stats['captures']} captured, {frame_cache_stats['hits']} reused from the frame cache")
+        
+        print(f"🔁 Decisions: {decision_stats['model_calls']} model calls "
+              f"({decision_stats['images_skipped']} without the screenshot), "
+              f"{decision_stats['local_decisions']} model calls skipped on unchanged pages")
+        
         await broadcast(job_id, {
             "status": "finished", 
             "final_format": fmt,
-            "final_proxy_stats": final_proxy_stats
+            "final_proxy_stats": final_proxy_stats,
+            "resource_stats": resource_stats,
+            "asset_cache_stats": asset_cache_stats,
+            "watchdog_stats": watchdog_stats,
+            "frame_cache_stats": frame_cache_stats,
+            "decision_stats": decision_stats
         })
 
+async def report_settle_time(job_id: str, browser, step: int):
+    """Log and broadcast the time a step spent waiting for the page to settle"""
+    from backend.main import broadcast
+
+    settle_stats = browser.pop_settle_stats()
+    print(f"⏱️ Step {step} settle wait: {settle_stats['waited_ms']}ms")
+    await broadcast(job_id, {
+        "type": "settle",
+        "step": step,
+        **settle_stats
+    })
+
 async def save_content(content_result: str, output_file: Path, fmt: str, job_id: str) -> bool:
     """Save content based on format type with enhanced error handling"""
     try:
@@ -5,6 +5,7 @@ from PIL import Image
 import io
 
 from backend.gemini_client import GeminiClient
+from backend.vision_model import model_image
 
 class AntiBotVisionModel:
     def __init__(self):
@@ -13,13 +14,11 @@ class AntiBotVisionModel:
     async def analyze_anti_bot_page(self, screenshot_b64: str, detection_prompt: str, page_url: str) -> dict:
         """Analyze page screenshot to detect anti-bot systems"""
         try:
-            # Convert base64 to PIL Image
             image_data = base64.b64decode(screenshot_b64)
-            image = Image.open(io.BytesIO(image_data))
             
-            # Compress image for token efficiency
+            # Compress image for token efficiency (frames from the frame cache already fit)
             max_size = (1024, 768)
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
+            image = await model_image(image_data, max_size, stage="anti_bot_image")
             
             # Create content for analysis
             content = [detection_prompt, image]
@@ -0,0 +1,272 @@
+## opt-in on-disk HTTP cache for static assets, shared by every job's browser context
+
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_TYPES = {"stylesheet", "script", "font", "image"}
+# Headers describing the transfer rather than the asset; the body is stored decoded
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+# Freshness given to responses that only carry Last-Modified (RFC 9111 heuristic), capped
+HEURISTIC_MAX_SECONDS = 24 * 3600
+
+def _parse_http_date(value: str | None) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def freshness_lifetime(headers: dict) -> Optional[float]:
+    """Seconds a response may be reused according to its cache headers, None if it must not be stored"""
+    cache_control = headers.get("cache-control", "").lower()
+    if any(directive in cache_control for directive in ("no-store", "no-cache", "private")):
+        return None
+    if "set-cookie" in headers:
+        return None
+    vary = {v.strip() for v in headers.get("vary", "").lower().split(",") if v.strip()}
+    if vary - {"accept-encoding"}:
+        # Variants depend on request headers we do not key on
+        return None
+
+    match = re.search(r"s-maxage=(\d+)", cache_control) or re.search(r"max-age=(\d+)", cache_control)
+    if match:
+        lifetime = float(match.group(1))
+    else:
+        date = _parse_http_date(headers.get("date")) or time.time()
+        expires = _parse_http_date(headers.get("expires"))
+        last_modified = _parse_http_date(headers.get("last-modified"))
+        if expires is not None:
+            lifetime = expires - date
+        elif last_modified is not None:
+            lifetime = min((date - last_modified) * 0.1, HEURISTIC_MAX_SECONDS)
+        else:
+            return None
+
+    age = headers.get("age", "")
+    if age.isdigit():
+        lifetime -= float(age)
+    return lifetime if lifetime > 0 else None
+
+class SharedAssetCache:
+    """Disk store of static responses with a byte quota and least-recently-used eviction"""
+
+    def __init__(self, directory: str | None = None, max_bytes: int | None = None,
+                 max_entry_bytes: int | None = None):
+        self.directory = Path(directory or os.getenv("ASSET_CACHE_DIR", "asset_cache"))
+        self.max_bytes = max_bytes if max_bytes is not None \
+            else int(float(os.getenv("ASSET_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None \
+            else int(float(os.getenv("ASSET_CACHE_MAX_ENTRY_MB", "10")) * 1024 * 1024)
+        # key → metadata, least recently used first
+        self._index: Optional[OrderedDict] = None
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    async def lookup(self, url: str) -> Optional[tuple]:
+        """Fresh (metadata, body) for a URL, or None"""
+        key = _key(url)
+        index = self._load_index()
+        meta = index.get(key)
+        if meta is None or meta["url"] != url:
+            self.misses += 1
+            return None
+        if meta["expires_at"] < time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        try:
+            body = await asyncio.to_thread(self._body_path(key).read_bytes)
+        except OSError:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        index.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += len(body)
+        return meta, body
+
+    async def store(self, url: str, status: int, headers: dict, body: bytes) -> bool:
+        """Keep a response when its cache headers allow it and it fits the quota"""
+        if status != 200 or len(body) > self.max_entry_bytes:
+            return False
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None:
+            return False
+
+        key = _key(url)
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS},
+            "expires_at": time.time() + lifetime,
+            "size": len(body),
+        }
+        try:
+            await asyncio.to_thread(self._write, key, meta, body)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not store cached asset {url[:80]}: {e}")
+            return False
+
+        index = self._load_index()
+        if key in index:
+            self.total_bytes -= index[key]["size"]
+        index[key] = meta
+        index.move_to_end(key)
+        self.total_bytes += meta["size"]
+        self.stores += 1
+        self._evict()
+        return True
+
+    def clear(self):
+        for key in list(self._load_index()):
+            self._remove(key)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._load_index()),
+            "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def _evict(self):
+        index = self._load_index()
+        while self.total_bytes > self.max_bytes and index:
+            self._remove(next(iter(index)))
+            self.evictions += 1
+
+    def _write(self, key: str, meta: dict, body: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Unique temp name so concurrent jobs storing the same asset do not collide
+        body_tmp = self.directory / f"{key}.{uuid.uuid4().hex}.tmp"
+        body_tmp.write_bytes(body)
+        body_tmp.replace(self._body_path(key))
+        self._meta_path(key).write_text(json.dumps(meta))
+
+    def _remove(self, key: str):
+        meta = self._load_index().pop(key, None)
+        if meta:
+            self.total_bytes -= meta["size"]
+        for path in (self._meta_path(key), self._body_path(key)):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _meta_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _body_path(self, key: str) -> Path:
+        return self.directory / f"{key}.body"
+
+    def _load_index(self) -> OrderedDict:
+        """Read entry metadata the first time the cache is used, oldest first"""
+        if self._index is None:
+            self._index = OrderedDict()
+            paths = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime) \
+                if self.directory.exists() else []
+            for path in paths:
+                try:
+                    meta = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    continue
+                self._index[path.stem] = meta
+                self.total_bytes += meta.get("size", 0)
+            self._evict()
+        return self._index
+
+def _key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+class AssetCacheSession:
+    """Serves one job's static asset requests from the shared cache and records its savings"""
+
+    def __init__(self, enabled: bool = False, cache: SharedAssetCache | None = None):
+        self.enabled = enabled
+        self.cache = cache or asset_cache
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.bytes_saved = 0
+
+    async def attach(self, context):
+        """Route the context's requests through the cache"""
+        if self.enabled:
+            await context.route("**/*", self._handle_route)
+
+    @staticmethod
+    def _is_cacheable(request) -> bool:
+        if request.method != "GET" or request.resource_type not in CACHEABLE_TYPES:
+            return False
+        if not request.url.startswith(("http://", "https://")):
+            return False
+        headers = request.headers
+        return "range" not in headers and "authorization" not in headers
+
+    async def _handle_route(self, route):
+        request = route.request
+        if not self._is_cacheable(request):
+            await route.fallback()
+            return
+
+        cached = await self.cache.lookup(request.url)
+        if cached:
+            meta, body = cached
+            self.hits += 1
+            self.bytes_saved += len(body)
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return
+
+        self.misses += 1
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            # Let the browser load it the normal way
+            await route.fallback()
+            return
+
+        if await self.cache.store(request.url, response.status, response.headers, body):
+            self.stored += 1
+        await route.fulfill(response=response, body=body)
+
+    def get_stats(self) -> dict:
+        """Hit rate and bytes served from the shared cache for this job"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stored": self.stored,
+            "bytes_saved": self.bytes_saved,
+        }
+
+# Global asset cache shared by every job in this worker process
+asset_cache = SharedAssetCache()
@@ -0,0 +1,139 @@
+## accessibility-tree (CDP Accessibility.getFullAXTree) view of the indexed page elements
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from backend.dom_snapshot import PageSessions
+
+logger = logging.getLogger(__name__)
+
+PAGE_REPRESENTATIONS = ("dom", "ax")
+DEFAULT_PAGE_REPRESENTATION = "dom"
+# Read the AX tree every step even in "dom" mode, so the token cost of both element lists is logged
+COMPARE_REPRESENTATIONS = os.getenv("COMPARE_PAGE_REPRESENTATIONS", "false").lower() == "true"
+
+# Roles an agent can act on; everything else in the tree is structure or content
+ACTIONABLE_ROLES = {
+    "button", "link", "textbox", "searchbox", "combobox", "listbox", "option", "checkbox", "radio",
+    "switch", "slider", "spinbutton", "menuitem", "menuitemcheckbox", "menuitemradio", "tab", "treeitem",
+}
+# Boolean and tristate properties worth telling the model about
+AX_STATES = ("checked", "pressed", "selected", "expanded", "disabled", "required", "invalid")
+
+ELEMENT_NODE = 1
+
+# dom_js element ids of the nodes at the given paths (element child indices, -1 enters the open shadow root)
+ELEMENT_IDS_JS = """(paths) => {
+    const dom = window.__bpDom;
+    if (!dom) return [];
+    return paths.map(path => {
+        let node = document;
+        for (const step of path) {
+            node = step < 0 ? node.shadowRoot : node.children[step];
+            if (!node) return null;
+        }
+        return dom.keys.has(node) ? `element_${dom.token}_${dom.keys.get(node)}` : null;
+    });
+}"""
+
+@dataclass
+class AXElement:
+    """Role, accessible name and state of one actionable node"""
+    role: str
+    name: str
+    value: str = ""
+    states: Dict[str, str] = field(default_factory=dict)
+
+def _value(entry: Optional[dict]) -> str:
+    value = (entry or {}).get("value")
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "" if value is None else str(value).strip()
+
+def node_paths(document: dict, wanted) -> Dict[int, list]:
+    """Path from the document to each wanted backend node id, in ELEMENT_IDS_JS steps"""
+    wanted = set(wanted)
+    paths = {}
+    stack = [(document, [])]
+    while stack and len(paths) < len(wanted):
+        node, path = stack.pop()
+        if node.get("backendNodeId") in wanted:
+            paths[node["backendNodeId"]] = path
+        # Frame documents are left out: the tree and the dom_js keys both belong to the main frame
+        for shadow_root in node.get("shadowRoots", []):
+            if shadow_root.get("shadowRootType") == "open":
+                stack.append((shadow_root, path + [-1]))
+        elements = [child for child in node.get("children", []) if child.get("nodeType") == ELEMENT_NODE]
+        for position, child in enumerate(elements):
+            stack.append((child, path + [position]))
+    return paths
+
+def actionable_nodes(nodes: list) -> Dict[int, AXElement]:
+    """Named nodes with an actionable role, by backend DOM node id"""
+    actionable = {}
+    for node in nodes:
+        if node.get("ignored") or "backendDOMNodeId" not in node:
+            continue
+        role = _value(node.get("role"))
+        name = _value(node.get("name"))
+        if role not in ACTIONABLE_ROLES or not name:
+            continue
+        states = {}
+        for prop in node.get("properties", []):
+            state = _value(prop.get("value"))
+            if prop.get("name") in AX_STATES and state not in ("", "false"):
+                states[prop["name"]] = state
+        actionable[node["backendDOMNodeId"]] = AXElement(role, name, _value(node.get("value")), states)
+    return actionable
+
+class AXTreeReader:
+    """Matches the accessibility tree of the main frame to a PageState's indexed elements"""
+
+    def __init__(self, sessions: Optional[PageSessions] = None):
+        self.sessions = sessions or PageSessions()
+
+    async def read(self, page, page_state) -> Dict[int, AXElement]:
+        """Selector index → AXElement for the indexed elements that have a named actionable node"""
+        started = time.perf_counter()
+        session, temporary = await self.sessions.acquire(page)
+        try:
+            tree = await session.send("Accessibility.getFullAXTree")
+            actionable = actionable_nodes(tree.get("nodes", []))
+            if page_state.dom_stats.get("engine") == "snapshot":
+                # Snapshot element ids carry the backend node id
+                element_ids = {node_id: f"element_{node_id}" for node_id in actionable}
+            else:
+                element_ids = await self._dom_js_ids(session, list(actionable))
+        finally:
+            await self.sessions.release(session, temporary)
+
+        index_by_id = {element.id: index for index, element in page_state.selector_map.items()}
+        matched = {}
+        for node_id, ax_element in actionable.items():
+            index = index_by_id.get(element_ids.get(node_id))
+            if index is not None:
+                matched[index] = ax_element
+        logger.info(f"♿ AX tree: {len(actionable)} actionable nodes, {len(matched)} matched to indexed elements "
+                    f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return dict(sorted(matched.items()))
+
+    async def _dom_js_ids(self, session, node_ids: list) -> Dict[int, str]:
+        """dom_js element ids of backend nodes: locate them in one DOM tree read, then read their keys in one call"""
+        if not node_ids:
+            return {}
+        # CDP resolves remote objects one node at a time, so nodes are addressed by their path instead
+        tree = await session.send("DOM.getDocument", {"depth": -1, "pierce": True})
+        paths = node_paths(tree.get("root", {}), node_ids)
+        if not paths:
+            return {}
+        ordered = list(paths.items())
+        response = await session.send("Runtime.evaluate", {
+            "expression": f"({ELEMENT_IDS_JS})({json.dumps([path for _, path in ordered])})",
+            "returnByValue": True,
+        })
+        element_ids = response.get("result", {}).get("value") or []
+        return {node_id: element_id for (node_id, _), element_id in zip(ordered, element_ids) if element_id}
@@ -1,22 +1,74 @@
 import asyncio
-import subprocess
 import os
 import logging
 import json
 import base64
 from typing import Optional, Dict, List, Any, Tuple
 import hashlib
-from dataclasses import dataclass, asdict
+from array import array
+from dataclasses import dataclass, asdict, replace
 from pydantic import BaseModel
 from pathlib import Path
+import numpy as np
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from playwright.async_api import async_playwright, Page, CDPSession
+from playwright.async_api import Page, CDPSession
 
-@dataclass
+from backend.browser_pool import browser_pool, BrowserLease
+from backend.playwright_driver import playwright_driver
+from backend.resource_blocker import ResourceBlocker, DEFAULT_PROFILE
+from backend.asset_cache import AssetCacheSession
+from backend.page_settle import PageSettleDetector, SETTLE_INIT_JS, SETTLE_TIMEOUT
+from backend.resource_watchdog import ResourceWatchdog
+from backend.dom_snapshot import DOMSnapshotExtractor, PageSessions, DOM_ENGINES, DEFAULT_DOM_ENGINE
+from backend.ax_tree import AXTreeReader, AXElement
+from backend.set_of_marks import draw_marks
+from backend.screen_hash import dhash
+from backend.frame_cache import FrameCache, Frame
+from backend.dom_diff import element_fingerprint
+from backend.dom_packed import PACKED_TRANSFER, PackedElements, decode_result
+from backend.element_filter import element_rank, redundant_elements
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Attributes kept on element records; the rest never leave the page
+ELEMENT_ATTRIBUTES = (
+    "id", "class", "name", "type", "href", "placeholder", "value", "role", "aria-label",
+    "title", "alt", "for", "action", "src", "tabindex", "contenteditable",
+)
+MAX_ATTRIBUTE_LENGTH = 200
+
+# Interactive elements covered by another element at their center point get no index
+OCCLUSION_CHECK = os.getenv("DOM_OCCLUSION_CHECK", "true").lower() == "true"
+
+# Page state screenshots are captured by CDP straight in the format and size sent to the model
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "jpeg")  # jpeg | png | webp
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "75"))
+SCREENSHOT_MAX_SIZE = (1280, 800)  # the model input size used by vision_model.decide
+
+# Child frames extracted per page state; ad-heavy pages embed dozens
+MAX_FRAMES = int(os.getenv("DOM_MAX_FRAMES", "10"))
+
+# Content box of an <iframe> (its document's viewport) in the coordinates of the frame holding it
+FRAME_BOX_JS = """(frame) => {
+    const rect = frame.getBoundingClientRect();
+    const style = window.getComputedStyle(frame);
+    const paddingLeft = parseFloat(style.paddingLeft) || 0;
+    const paddingTop = parseFloat(style.paddingTop) || 0;
+    return [
+        rect.left + frame.clientLeft + paddingLeft,
+        rect.top + frame.clientTop + paddingTop,
+        frame.clientWidth - paddingLeft - (parseFloat(style.paddingRight) || 0),
+        frame.clientHeight - paddingTop - (parseFloat(style.paddingBottom) || 0)
+    ];
+}"""
+
+@dataclass(slots=True)
 class ElementInfo:
     """DOM element information compatible with browser-use"""
     index: int
@@ -35,23 +87,138 @@ class ElementInfo:
     bounding_box: Optional[Dict[str, float]] = None
     center_coordinates: Optional[Dict[str, float]] = None
     viewport_coordinates: Optional[Dict[str, float]] = None
+    fingerprint: str = ""
+
+def _box(x: float, y: float, width: float, height: float) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Bounding box and center point dicts of a rect"""
+    return ({"x": x, "y": y, "width": width, "height": height},
+            {"x": x + width / 2, "y": y + height / 2})
+
+def _record_rows(records: List[dict]):
+    """Engine element records as the row tuples _build_elements reads (the layout of PackedElements.rows)"""
+    for record in records:
+        yield (
+            record.get('index'), record.get('id', ''), bool(record.get('reused')), record.get('isVisible', True),
+            record.get('rect') or (0, 0, 0, 0), record.get('tagName', ''), record.get('text', ''),
+            record.get('attributes'), record.get('isClickable', False), record.get('isInput', False),
+            record.get('inputType'), record.get('placeholder'), record.get('path', ''),
+        )
+
+class ElementTable:
+    """Non-interactive elements of a page kept as columns, only turned into ElementInfo when read"""
+    __slots__ = ("positions", "ids", "tags", "texts", "attributes", "fingerprints", "rects", "_rows_by_id")
+
+    def __init__(self):
+        self.positions = array("I")  # place of each row among all elements, in document order
+        self.ids: List[str] = []
+        self.tags: List[str] = []
+        self.texts: List[str] = []
+        self.attributes: List[Optional[Dict[str, str]]] = []
+        self.fingerprints: List[str] = []
+        self.rects = array("d")  # x, y, width, height per row
+        self._rows_by_id: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, position: int, element_id: str, tag: str, text: str,
+               attributes: Optional[Dict[str, str]], fingerprint: str, rect):
+        self.positions.append(position)
+        self.ids.append(element_id)
+        self.tags.append(tag)
+        self.texts.append(text)
+        self.attributes.append(attributes or None)
+        self.fingerprints.append(fingerprint)
+        self.rects.extend(rect)
+
+    def find(self, element_id: str) -> Optional[int]:
+        """Row of an element id"""
+        if self._rows_by_id is None:
+            self._rows_by_id = {element_id: row for row, element_id in enumerate(self.ids)}
+        return self._rows_by_id.get(element_id)
+
+    def element(self, row: int) -> ElementInfo:
+        bounding_box, center = _box(*self.rects[row * 4:row * 4 + 4])
+        return ElementInfo(
+            index=None,
+            id=self.ids[row],
+            tag_name=self.tags[row],
+            xpath='',
+            css_selector='',
+            text=self.texts[row],
+            attributes=self.attributes[row] or {},
+            is_clickable=False,
+            is_input=False,
+            bounding_box=bounding_box,
+            center_coordinates=center,
+            fingerprint=self.fingerprints[row],
+        )
+
+    def materialize(self, interactive: List[ElementInfo]) -> List[ElementInfo]:
+        """All elements in document order, interleaving the given interactive ones"""
+        elements = []
+        pending = iter(interactive)
+        row = 0
+        for position in range(len(self) + len(interactive)):
+            if row < len(self) and self.positions[row] == position:
+                elements.append(self.element(row))
+                row += 1
+            else:
+                elements.append(next(pending))
+        return elements
 
 class PageState:
-    """Page state compatible with browser-use"""
-    def __init__(self, url: str, title: str, elements: List[ElementInfo], selector_map: Dict[int, ElementInfo], screenshot: Optional[str] = None):
+    """Page state compatible with browser-use
+
+    Interactive elements are ElementInfo objects in selector_map; the rest stay in an
+    ElementTable until `elements` is read. Interactive elements dropped as duplicates
+    of another target are kept by id in `redundant`, outside both. The screenshot is
+    raw image bytes; it is base64-encoded only where it is sent to a client.
+    `screen_hash` is the perceptual hash of the screenshot before marks were drawn.
+    """
+    def __init__(self, url: str, title: str, elements: "List[ElementInfo] | ElementTable", selector_map: Dict[int, ElementInfo], screenshot: Optional[bytes] = None,
+                 dom_stats: Optional[Dict[str, float]] = None, redundant: Optional[Dict[str, ElementInfo]] = None,
+                 screen_hash: Optional[int] = None):
         self.url = url
         self.title = title
-        self.elements = elements
         self.selector_map = selector_map
         self.screenshot = screenshot
-        self.clickable_elements = [e for e in elements if e.is_clickable]
-        self.input_elements = [e for e in elements if e.is_input]
+        self.screen_hash = screen_hash
+        self.dom_stats = dom_stats or {}
+        self.redundant = redundant or {}
+        if isinstance(elements, ElementTable):
+            self.element_table = elements
+            self._elements = None
+        else:
+            self.element_table = None
+            self._elements = elements
+
+    @property
+    def elements(self) -> List[ElementInfo]:
+        if self._elements is None:
+            self._elements = self.element_table.materialize(list(self.selector_map.values()))
+        return self._elements
+
+    @property
+    def clickable_elements(self) -> List[ElementInfo]:
+        # Clickable and input elements are always indexed, no need to materialize the rest
+        source = self.selector_map.values() if self._elements is None else self._elements
+        return [e for e in source if e.is_clickable]
+
+    @property
+    def input_elements(self) -> List[ElementInfo]:
+        source = self.selector_map.values() if self._elements is None else self._elements
+        return [e for e in source if e.is_input]
 
 class BrowserController:
-    def __init__(self, headless: bool, proxy: dict | None, enable_streaming: bool = False):
+    def __init__(self, headless: bool, proxy: dict | None, enable_streaming: bool = False,
+                 resource_profile: str = DEFAULT_PROFILE, allow_images: bool = False,
+                 use_asset_cache: bool = False, dom_engine: str = DEFAULT_DOM_ENGINE):
         self.headless = headless
         self.proxy = proxy
         self.enable_streaming = enable_streaming
+        self.resource_blocker = ResourceBlocker(resource_profile, allow_images=allow_images)
+        self.asset_cache = AssetCacheSession(enabled=use_asset_cache)
         self.play = None
         self.browser = None
         self.page = None
@@ -62,155 +229,229 @@ class BrowserController:
         self._cached_url = None
         self._last_action_timestamp = None
         self.input_enabled = False  # Track if Input domain is available
-        self._original_display = os.environ.get("DISPLAY")
-        self._display_was_set = False
-        self._xvfb_process: subprocess.Popen | None = None
-        self._xvfb_display: str | None = None
+        self.context = None
+        self._lease: BrowserLease | None = None
+        self.stream_quality = 80
+        self._polling_task: asyncio.Task | None = None
+        self._settle_detector: PageSettleDetector | None = None
+        self._settle_waits: List[Tuple[str, float]] = []
+        self.watchdog = ResourceWatchdog(self)
+        self._recycle_lock = asyncio.Lock()
+        # (reason, new_browser) the watchdog asked for; the job's loop runs it between steps
+        self._pending_recycle: Optional[Tuple[str, bool]] = None
+        self._recycle_task: asyncio.Task | None = None
 
         # Load the robust DOM extraction JavaScript
         self.dom_js = self._get_dom_extraction_js()
+        self.dom_engine = dom_engine if dom_engine in DOM_ENGINES else DEFAULT_DOM_ENGINE
+        # CDP session of the current page, shared by the snapshot engine and the AX tree reader
+        self.page_sessions = PageSessions()
+        self.dom_snapshot = DOMSnapshotExtractor(ELEMENT_ATTRIBUTES, MAX_ATTRIBUTE_LENGTH, self.page_sessions)
+        self.ax_tree = AXTreeReader(self.page_sessions)
+        # One screenshot per step, whoever asks for it first
+        self.frame_cache = FrameCache()
 
-    def _find_free_display(self, start: int = 99, end: int = 110) -> int:
-        """Locate a free X display number for Xvfb."""
-        for display in range(start, end):
-            lock_file = Path(f"/tmp/.X{display}-lock")
-            if not lock_file.exists():
-                return display
-        # Fall back to the starting display even if locked (Xvfb will fail clearly)
-        return start
-
-    def _terminate_xvfb(self):
-        """Stop the Xvfb process if it was started."""
-        if not self._xvfb_process:
-            return
+    async def __aenter__(self):
+        """Lease a warm browser from the pool and open this job's page"""
+        await self._open_session()
+        await self.watchdog.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Cleanup CDP session and return the browser to the pool"""
+        await self.watchdog.stop()
+        if self._recycle_task and not self._recycle_task.done():
+            # A recycle cancelled with the job keeps running; let it finish so its lease is released here
+            try:
+                await self._recycle_task
+            except Exception:
+                pass
+        if self.streaming_active:
+            await self._stop_cdp_streaming()
+        await self._close_session()
+
+    def _context_options(self) -> dict:
+        """Options for this job's isolated browser context"""
+        options = {"viewport": {"width": 1280, "height": 800}}
+        if self.proxy:
+            options["proxy"] = self.proxy
+        return options
 
-        self._xvfb_process.terminate()
+    async def _open_session(self, **context_overrides):
+        """Acquire a pooled browser and prepare a fresh context and page"""
+        self.play = await playwright_driver.acquire()
         try:
-            self._xvfb_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            self._xvfb_process.kill()
-        finally:
-            self._xvfb_process = None
-            self._xvfb_display = None
+            options = {**self._context_options(), **context_overrides}
+            self._lease = await browser_pool.acquire(self.headless, **options)
+        except Exception:
+            self.play = None
+            await playwright_driver.release()
+            raise
+        self.browser = self._lease.browser
+        self.context = self._lease.context
+        await self._prepare_context(self.context)
+        self.page = await self.context.new_page()
+        await self._configure_page()
+
+    async def _prepare_context(self, context):
+        """Install per-job request handling and page instrumentation on a freshly opened context"""
+        await context.add_init_script(SETTLE_INIT_JS)
+        # Routes run last-registered first: blocked requests never reach the cache
+        await self.asset_cache.attach(context)
+        await self.resource_blocker.attach(context)
+
+    async def _configure_page(self):
+        """Apply CDP streaming setup, settle tracking and headers to the current page"""
+        self._settle_detector = PageSettleDetector(self.page)
+        self.watchdog.watch_page(self.page)
+
+        # Set up CDP session for streaming
+        if self.enable_streaming:
+            await self._setup_cdp_streaming()
+
+        await self.page.set_extra_http_headers(DEFAULT_HEADERS)
+
+    async def _switch_page(self, page: Page):
+        """Move the controller, and any live stream, onto another page"""
+        was_streaming = self.streaming_active
+        if was_streaming or self.cdp_session:
+            await self._stop_cdp_streaming()
+        self.cdp_session = None
+        await self.page_sessions.close()
+
+        self.page = page
+        self._cached_page_state = None
+        self.frame_cache.invalidate()
+        await self._configure_page()
 
-    async def _ensure_display(self):
-        """Start a virtual X server when running in headful mode without DISPLAY."""
-        if self.headless or os.environ.get("DISPLAY"):
+        if was_streaming:
+            await self.start_streaming(quality=self.stream_quality)
+
+    async def open_tab(self) -> Page:
+        """Open an extra tab in this job's context (shares cookies, blocking and settle tracking)"""
+        page = await self.context.new_page()
+        await page.set_extra_http_headers(DEFAULT_HEADERS)
+        return page
+
+    async def close_tab(self, page: Page):
+        """Close an extra tab; the current page stays open"""
+        if page is self.page or page.is_closed():
             return
+        try:
+            await page.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing tab: {e}")
 
-        display_number = self._find_free_display()
-        display = f":{display_number}"
-        xvfb_cmd = [
-            "Xvfb",
-            display,
-            "-screen",
-            "0",
-            "1280x800x24",
-            "-nolisten",
-            "tcp",
-        ]
+    async def adopt_tab(self, page: Page):
+        """Continue the job on another tab and close the page it was on"""
+        previous = self.page
+        await self._switch_page(page)
+        if previous is not None and previous is not page:
+            await self.close_tab(previous)
 
+    async def _replace_context(self, **context_overrides):
+        """Open a new context on the leased browser and move onto it before closing the old one"""
+        options = {**self._context_options(), **context_overrides}
         try:
-            self._xvfb_process = subprocess.Popen(
-                xvfb_cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            self._xvfb_display = display
-            logger.info("🖥️ Started Xvfb on display %s for headful browser session", display)
-        except FileNotFoundError:
-            logger.warning("⚠️ Xvfb not available; falling back to headless mode")
-            self.headless = True
+            new_context = await self.browser.new_context(**options)
+        except Exception as e:
+            # The leased browser is gone; fall back to a fresh lease from the pool
+            logger.warning(f"⚠️ Could not open context on leased browser ({e}); re-leasing")
+            await self._relaunch_session(**context_overrides)
             return
 
-        # Wait briefly for Xvfb to be ready
-        ready = False
-        for _ in range(30):
-            if self._xvfb_process.poll() is not None:
-                logger.error(
-                    "❌ Xvfb exited prematurely with code %s", self._xvfb_process.returncode
-                )
-                self._terminate_xvfb()
-                self.headless = True
-                return
-            if Path(f"/tmp/.X{display_number}-lock").exists():
-                ready = True
-                break
-            await asyncio.sleep(0.1)
-
-        if not ready:
-            logger.warning("⚠️ Timed out waiting for Xvfb; falling back to headless mode")
-            self._terminate_xvfb()
-            self.headless = True
-            return
+        try:
+            await self._prepare_context(new_context)
+            new_page = await new_context.new_page()
+        except Exception:
+            await new_context.close()
+            raise
 
-        os.environ["DISPLAY"] = display
-        self._display_was_set = True
+        old_context = self.context
+        self.context = new_context
+        self._lease.context = new_context
+        await self._switch_page(new_page)
 
-    def _restore_display(self):
-        """Restore the DISPLAY environment variable and stop Xvfb if needed."""
-        self._terminate_xvfb()
+        try:
+            await old_context.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing previous context: {e}")
 
-        if not self._display_was_set:
-            return
+    async def _relaunch_session(self, **context_overrides):
+        """Give up the current lease and continue on a fresh one from the pool"""
+        was_streaming = self.streaming_active
+        if self.streaming_active or self.cdp_session:
+            await self._stop_cdp_streaming()
+        self.cdp_session = None
+        await self._close_session()
+        await self._open_session(**context_overrides)
+        if was_streaming:
+            await self.start_streaming(quality=self.stream_quality)
 
-        if self._original_display is None:
-            os.environ.pop("DISPLAY", None)
-        else:
-            os.environ["DISPLAY"] = self._original_display
+    async def recycle_context(self, reason: str, new_browser: bool = False):
+        """Replace a bloated or crashed context, carrying over the URL, cookies and localStorage"""
+        async with self._recycle_lock:
+            url = self.page.url if self.page else ""
+            storage_state = None
+            try:
+                storage_state = await asyncio.wait_for(self.context.storage_state(), timeout=10)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not save storage state before recycling: {e}")
 
-        self._display_was_set = False
+            logger.info(f"♻️ Recycling browser context ({reason}){' on a new browser' if new_browser else ''}")
+            overrides = {"storage_state": storage_state} if storage_state else {}
+            if new_browser and self._lease:
+                # Let the pool replace the browser once its other jobs are done
+                self._lease.pooled.retiring = True
+                await self._relaunch_session(**overrides)
+            else:
+                await self._replace_context(**overrides)
 
-    async def __aenter__(self):
-        """Initialize browser with CDP streaming support"""
-        await self._ensure_display()
-
-        self.play = await async_playwright().start()
-
-        launch_options = {
-            "headless": self.headless,
-            "args": [
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-                "--disable-gpu",
-                "--disable-web-security",
-                "--disable-features=VizDisplayCompositor",
-                "--window-size=1280,800",
-                "--window-position=0,0",
-                "--disable-blink-features=AutomationControlled",
-                "--disable-extensions",
-                "--no-first-run",
-                "--disable-default-apps",
-                # Enable remote debugging for CDP
-                "--remote-debugging-port=0"  # Use random port
-            ]
-        }
-        
-        if self.proxy:
-            launch_options["proxy"] = self.proxy
-            
-        self.browser = await self.play.chromium.launch(**launch_options)
-        self.page = await self.browser.new_page(viewport={"width": 1280, "height": 800})
-        
-        # Set up CDP session for streaming
-        if self.enable_streaming:
-            await self._setup_cdp_streaming()
-            
-        await self.page.set_extra_http_headers({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-        
-        return self
+            if url.startswith("http"):
+                try:
+                    await self.page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                    await self.wait_for_settle("recycle")
+                except Exception as e:
+                    logger.error(f"❌ Failed to restore {url} after recycling: {e}")
 
-    async def __aexit__(self, exc_type, exc, tb):
-        """Cleanup browser and CDP session"""
-        if self.streaming_active:
-            await self._stop_cdp_streaming()
-        if self.browser:
-            await self.browser.close()
+    @property
+    def recycle_requested(self) -> bool:
+        return self._pending_recycle is not None
+
+    def request_recycle(self, reason: str, new_browser: bool = False):
+        """Ask for a context recycle at the next step boundary; a request for a new browser wins"""
+        if self._pending_recycle is None:
+            self._pending_recycle = (reason, new_browser)
+        elif new_browser and not self._pending_recycle[1]:
+            self._pending_recycle = (reason, True)
+
+    async def recycle_if_requested(self) -> Optional[str]:
+        """Run a requested recycle between steps; returns its reason, None when nothing was pending"""
+        if self._pending_recycle is None:
+            return None
+        reason, new_browser = self._pending_recycle
+        self._pending_recycle = None
+        # Shielded: cancelling the job must not stop a relaunch between releasing and re-leasing
+        self._recycle_task = asyncio.create_task(self.recycle_context(reason, new_browser=new_browser))
+        await asyncio.shield(self._recycle_task)
+        self.watchdog.recycled(reason)
+        return reason
+
+    def get_watchdog_stats(self) -> dict:
+        """Get memory samples, crashes and recycles for this controller"""
+        return self.watchdog.get_stats()
+
+    async def _close_session(self):
+        """Close this job's context and hand the browser back to the pool"""
+        if self._lease:
+            await browser_pool.release(self._lease)
+        self._lease = None
         if self.play:
-            await self.play.stop()
-        self._restore_display()
+            self.play = None
+            await playwright_driver.release()
+        self.context = None
+        self.page = None
+        self.browser = None
 
     async def _setup_cdp_streaming(self):
         """Setup CDP session for real-time streaming with proper error handling"""
@@ -255,6 +496,7 @@ class BrowserController:
         if not self.cdp_session:
             raise RuntimeError("CDP session not initialized")
             
+        self.stream_quality = quality
         try:
             # Check if Page.startScreencast is available
             await self.cdp_session.send('Page.startScreencast', {
@@ -302,10 +544,14 @@ class BrowserController:
                     await asyncio.sleep(1)
         
         # Start screenshot polling in background
-        asyncio.create_task(screenshot_loop())
+        self._polling_task = asyncio.create_task(screenshot_loop())
 
     async def stop_streaming(self):
         """Stop CDP screencast streaming"""
+        if self._polling_task:
+            self._polling_task.cancel()
+            self._polling_task = None
+            self.streaming_active = False
         if self.cdp_session and self.streaming_active:
             try:
                 await self.cdp_session.send('Page.stopScreencast')
@@ -419,6 +665,33 @@ class BrowserController:
         except Exception as e:
             logger.error(f"❌ Error handling keyboard event: {e}")
 
+    async def wait_for_settle(self, reason: str, timeout: float = SETTLE_TIMEOUT) -> float:
+        """Wait until the page is quiet instead of sleeping a fixed time; returns ms waited"""
+        if not self._settle_detector:
+            return 0.0
+        if reason != "page_state":
+            # Every action ends in a settle wait; what it changed may not show as a DOM mutation
+            self.frame_cache.invalidate()
+        result = await self._settle_detector.wait(timeout)
+        self._settle_waits.append((reason, result.waited_ms))
+        return result.waited_ms
+
+    def pop_settle_stats(self) -> dict:
+        """Get the settle time accumulated since the last call (one agent step) and reset it"""
+        waits, self._settle_waits = self._settle_waits, []
+        return {
+            "waited_ms": round(sum(ms for _, ms in waits), 1),
+            "waits": [{"reason": reason, "ms": ms} for reason, ms in waits],
+        }
+
+    def get_resource_stats(self) -> dict:
+        """Get request-blocking statistics for this job"""
+        return self.resource_blocker.get_stats()
+
+    def get_asset_cache_stats(self) -> dict:
+        """Get shared asset cache hits and bytes saved for this job"""
+        return self.asset_cache.get_stats()
+
     def get_streaming_info(self):
         """Get streaming connection information"""
         if self.enable_streaming:
@@ -434,57 +707,170 @@ class BrowserController:
 
     # Keep all your existing methods from the original code
     def _get_dom_extraction_js(self) -> str:
-        """Get the robust DOM extraction JavaScript similar to browser-use"""
+        """Get the single-pass DOM extraction JavaScript (TreeWalker, hidden-subtree pruning, incremental re-scan)"""
         return """
         (args) => {
-            const { doHighlightElements = true, debugMode = false } = args || {};
+            const {
+                debugMode = false, incremental = false, generation = null,
+                attributeNames = [], maxAttributeLength = 200, packed = false, occlusion = false
+            } = args || {};
             
             // Performance tracking
             const startTime = performance.now();
             let nodeCount = 0;
             let processedCount = 0;
+            let prunedSubtrees = 0;
+            let reusedCount = 0;
+            let occludedCount = 0;
             
             // Results
-            const elementMap = new Map();
-            const selectorMap = {};
+            const elements = [];
             let highlightIndex = 0;
             
-            // Helper functions
-            function getClassName(element) {
-                if (!element.className) return '';
-                if (typeof element.className === 'string') return element.className;
-                if (element.className.toString) return element.className.toString();
-                if (element.classList && element.classList.length > 0) {
-                    return Array.from(element.classList).join(' ');
+            const INTERACTIVE_TAGS = new Set(['a', 'button', 'input', 'select', 'textarea', 'label']);
+            const INPUT_TAGS = new Set(['input', 'textarea', 'select']);
+            const SKIP_TAGS = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'HEAD', 'META', 'LINK']);
+            const viewportWidth = window.innerWidth;
+            const viewportHeight = window.innerHeight;
+            const root = document.body || document.documentElement;
+            
+            // Mutations not yet delivered to the observer callback still count as changes
+            const settle = window.__bpSettle;
+            if (settle) settle.collect(settle.observer.takeRecords());
+            const dirtyRoots = settle ? settle.dirty : new Set();
+            const touched = settle ? settle.touched : new Set();
+            
+            // Per-document memory of earlier calls: stable element keys and per-element markup data
+            let dom = window.__bpDom;
+            const fullScan = !incremental || !settle || !dom ||
+                dom.generation !== generation ||
+                settle.dirtyOverflow ||
+                dirtyRoots.has(document.documentElement) || dirtyRoots.has(root) ||
+                dom.scrollX !== window.scrollX || dom.scrollY !== window.scrollY ||
+                dom.viewportWidth !== viewportWidth || dom.viewportHeight !== viewportHeight;
+            if (!dom) {
+                // The token keeps element ids unique across documents (navigations, reloads, frames)
+                dom = window.__bpDom = {
+                    generation: 0, nextKey: 1, keys: new WeakMap(), cache: new WeakMap(),
+                    token: Math.random().toString(36).slice(2, 8)
+                };
+            }
+            if (fullScan) dom.cache = new WeakMap();
+            const previousGeneration = dom.generation;
+            const currentGeneration = previousGeneration + 1;
+            dom.generation = currentGeneration;
+            dom.scrollX = window.scrollX;
+            dom.scrollY = window.scrollY;
+            dom.viewportWidth = viewportWidth;
+            dom.viewportHeight = viewportHeight;
+            
+            // Ancestors of a change show it in their subtree text, so their data is rebuilt too
+            const staleText = new Set();
+            if (!fullScan) {
+                for (const node of [...dirtyRoots, ...touched]) {
+                    staleText.add(node);
+                    for (let parent = node.parentElement; parent && !staleText.has(parent); parent = parent.parentElement) {
+                        staleText.add(parent);
+                    }
                 }
-                return '';
             }
+            const dirtyRootCount = dirtyRoots.size;
+            if (settle) {
+                settle.dirty = new Set();
+                settle.touched = new Set();
+                settle.dirtyOverflow = false;
+            }
+            
+            // Whether each visited element lies inside a changed subtree (parents are visited first)
+            const insideDirty = new Map([[root, dirtyRoots.has(root)]]);
+            
+            // Info of the node the walker accepted last, so style is computed once per element
+            let currentInfo = null;
+            let currentDirty = true;
+            const filter = {
+                acceptNode(node) {
+                    nodeCount++;
+                    // Markup, SVG internals and hidden subtrees can never yield a target
+                    if (SKIP_TAGS.has(node.tagName) || node.ownerSVGElement) {
+                        return NodeFilter.FILTER_REJECT;
+                    }
+                    
+                    const dirty = fullScan || dirtyRoots.has(node) || insideDirty.get(node.parentNode) === true;
+                    if (!fullScan) insideDirty.set(node, dirty);
+                    
+                    // Style is read on every call: stylesheet, class-free and :hover changes never show up as mutations
+                    const style = window.getComputedStyle(node);
+                    if (style.display === 'none' || style.visibility === 'hidden') {
+                        prunedSubtrees++;
+                        return NodeFilter.FILTER_REJECT;
+                    }
+                    
+                    // Only what the element's markup decides is kept between calls
+                    let info = dirty ? undefined : dom.cache.get(node);
+                    if (info === undefined) {
+                        const tagName = node.tagName.toLowerCase();
+                        const role = node.getAttribute('role');
+                        const isInput = INPUT_TAGS.has(tagName) || node.contentEditable === 'true';
+                        info = {
+                            tagName: tagName,
+                            isInput: isInput,
+                            markupInteractive: isInput ||
+                                INTERACTIVE_TAGS.has(tagName) ||
+                                !!node.onclick || node.hasAttribute('onclick') ||
+                                role === 'button' || role === 'link' ||
+                                node.hasAttribute('tabindex'),
+                            emitted: 0
+                        };
+                        dom.cache.set(node, info);
+                    }
+                    info.isInteractive = info.markupInteractive || style.cursor === 'pointer';
+                    info.transparent = style.opacity === '0';
+                    
+                    currentInfo = info;
+                    currentDirty = dirty;
+                    return NodeFilter.FILTER_ACCEPT;
+                }
+            };
             
-            function isInteractive(element) {
-                const tagName = element.tagName.toLowerCase();
-                const interactiveTags = ['a', 'button', 'input', 'select', 'textarea', 'label'];
-                if (interactiveTags.includes(tagName)) return true;
-                if (element.onclick || element.getAttribute('onclick')) return true;
-                if (element.getAttribute('role') === 'button') return true;
-                if (element.getAttribute('role') === 'link') return true;
-                if (element.hasAttribute('tabindex')) return true;
-                if (element.contentEditable === 'true') return true;
-                const style = window.getComputedStyle(element);
-                if (style.cursor === 'pointer') return true;
-                return false;
+            // One walker per tree: open shadow roots are walked right after their host
+            const walkers = [document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT, filter)];
+            let shadowRoots = 0;
+            function nextElement() {
+                while (walkers.length) {
+                    const node = walkers[walkers.length - 1].nextNode();
+                    if (node) return node;
+                    walkers.pop();
+                }
+                return null;
             }
             
-            function isInput(element) {
-                const tagName = element.tagName.toLowerCase();
-                return ['input', 'textarea', 'select'].includes(tagName) ||
-                       element.contentEditable === 'true';
+            // Up to six ancestors as tag#id, crossing shadow roots; part of the element fingerprint
+            function structuralPath(element) {
+                const parts = [];
+                let node = element.parentNode;
+                while (node && parts.length < 6) {
+                    if (node.nodeType === 11 && node.host) {
+                        node = node.host;
+                        continue;
+                    }
+                    if (node.nodeType !== 1 || node === document.body) break;
+                    parts.push(node.id ? `${node.tagName.toLowerCase()}#${node.id}` : node.tagName.toLowerCase());
+                    node = node.parentNode;
+                }
+                return parts.reverse().join('>');
             }
             
-            function getTextContent(element) {
+            function ownText(element) {
                 let text = '';
-                if (element.textContent) {
-                    text = element.textContent.trim();
+                for (let child = element.firstChild; child; child = child.nextSibling) {
+                    if (child.nodeType === 3) text += child.nodeValue;
                 }
+                return text.trim();
+            }
+            
+            function getTextContent(element, interactive) {
+                // Containers repeat their descendants' text; only targets need the full subtree text
+                let text = interactive ? (element.textContent || '').trim() : ownText(element);
                 if (element.value) {
                     text = element.value;
                 } else if (element.placeholder) {
@@ -493,122 +879,188 @@ class BrowserController:
                 if (element.tagName === 'IMG' && element.alt) {
                     text = element.alt;
                 }
-                return text.substring(0, 200);
+                return String(text).substring(0, 200);
             }
-            
-            function isVisibleAndInViewport(element) {
-                const rect = element.getBoundingClientRect();
-                const style = window.getComputedStyle(element);
-                const hasDimensions = rect.width > 0 && rect.height > 0;
-                const isVisible = style.visibility !== 'hidden' &&
-                                style.display !== 'none' &&
-                                style.opacity !== '0';
-                const isInViewport = rect.top < window.innerHeight &&
-                                   rect.bottom > 0 &&
-                                   rect.left < window.innerWidth &&
-                                   rect.right > 0;
-                return hasDimensions && isVisible && isInViewport;
+
+            // Packed transfer: typed array columns plus one table of distinct strings (decoded by backend/dom_packed.py)
+            const columns = packed ? {
+                strings: [], stringIds: new Map(),
+                index: [], key: [], flags: [], rect: [], fields: [], attrOffsets: [0], attrs: []
+            } : null;
+            function intern(value) {
+                if (value === null || value === undefined) return -1;
+                let id = columns.stringIds.get(value);
+                if (id === undefined) {
+                    id = columns.strings.length;
+                    columns.strings.push(value);
+                    columns.stringIds.set(value, id);
+                }
+                return id;
+            }
+            function pack(key, data) {
+                columns.index.push(data.index === null ? -1 : data.index);
+                columns.key.push(key);
+                columns.flags.push((data.isClickable ? 1 : 0) | (data.isInput ? 2 : 0) |
+                    (data.isVisible ? 4 : 0) | (data.reused ? 8 : 0));
+                columns.rect.push(...data.rect);
+                if (data.reused) {
+                    columns.fields.push(-1, -1, -1, -1, -1);
+                } else {
+                    columns.fields.push(intern(data.tagName), intern(data.text), intern(data.path),
+                        intern(data.inputType), intern(data.placeholder));
+                    for (const name in data.attributes) {
+                        columns.attrs.push(intern(name), intern(data.attributes[name]));
+                    }
+                }
+                columns.attrOffsets.push(columns.attrs.length / 2);
+            }
+            function base64(typed) {
+                const bytes = new Uint8Array(typed.buffer, typed.byteOffset, typed.byteLength);
+                let binary = '';
+                for (let i = 0; i < bytes.length; i += 0x8000) {
+                    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+                }
+                return btoa(binary);
+            }
+            function encodeColumns() {
+                const encoded = {
+                    count: columns.key.length,
+                    token: dom.token,
+                    strings: columns.strings,
+                    index: base64(Int32Array.from(columns.index)),
+                    key: base64(Uint32Array.from(columns.key)),
+                    flags: base64(Uint8Array.from(columns.flags)),
+                    rect: base64(Float32Array.from(columns.rect)),
+                    fields: base64(Int32Array.from(columns.fields)),
+                    attrOffsets: base64(Uint32Array.from(columns.attrOffsets)),
+                    attrs: base64(Int32Array.from(columns.attrs))
+                };
+                let bytes = 0;
+                for (const name of ['index', 'key', 'flags', 'rect', 'fields', 'attrOffsets', 'attrs']) {
+                    bytes += encoded[name].length;
+                }
+                for (const value of columns.strings) bytes += value.length + 3;
+                encoded.bytes = bytes;
+                return encoded;
+            }
+
+            // Something else (a modal, an overlay) is hit at the element's center, clamped to the viewport
+            function isOccluded(element, rect) {
+                const x = Math.min(Math.max(rect.left + rect.width / 2, 0), viewportWidth - 1);
+                const y = Math.min(Math.max(rect.top + rect.height / 2, 0), viewportHeight - 1);
+                const scope = element.getRootNode();
+                const hit = (scope.elementFromPoint ? scope : document).elementFromPoint(x, y);
+                return !!hit && hit !== element && !element.contains(hit) && !hit.contains(element);
             }
             
-            // Process elements
-            const allElements = document.querySelectorAll('*');
-            const elements = [];
-            
-            allElements.forEach(element => {
-                nodeCount++;
-                if (!element || element.nodeType !== 1) return;
+            for (let element = nextElement(); element; element = nextElement()) {
+                const info = currentInfo;
+                const dirty = currentDirty;
                 
-                const isElementVisible = isVisibleAndInViewport(element);
-                const isElementInteractive = isInteractive(element);
-                const isElementInput = isInput(element);
+                if (element.shadowRoot) {
+                    // The settle observer does not see inside shadow trees, so their content is never reused
+                    insideDirty.set(element.shadowRoot, true);
+                    walkers.push(document.createTreeWalker(element.shadowRoot, NodeFilter.SHOW_ELEMENT, filter));
+                    shadowRoots++;
+                }
+                
+                // Layout may shift around a change, so geometry is always read fresh
+                const rect = element.getBoundingClientRect();
+                const isElementVisible = rect.width > 0 && rect.height > 0 &&
+                    !info.transparent &&
+                    rect.top < viewportHeight && rect.bottom > 0 &&
+                    rect.left < viewportWidth && rect.right > 0;
                 
-                if (!isElementVisible && !isElementInteractive) return;
+                if (!isElementVisible && !info.isInteractive) continue;
+                
+                // Covered targets are kept as plain elements, without an index
+                const occluded = occlusion && info.isInteractive && isElementVisible && isOccluded(element, rect);
+                if (occluded) occludedCount++;
                 
                 processedCount++;
-                const rect = element.getBoundingClientRect();
-                const elementId = `element_${processedCount}`;
                 let currentHighlightIndex = null;
-                
-                if (isElementInteractive || isElementInput) {
+                if ((info.isInteractive || info.isInput) && !occluded) {
                     currentHighlightIndex = highlightIndex++;
-                    
-                    if (doHighlightElements) {
-                        element.style.outline = '2px solid red';
-                        element.style.outlineOffset = '1px';
-                        
-                        const label = document.createElement('div');
-                        label.textContent = currentHighlightIndex.toString();
-                        label.style.cssText = `
-                            position: absolute;
-                            top: ${rect.top + window.scrollY - 20}px;
-                            left: ${rect.left + window.scrollX}px;
-                            background: red;
-                            color: white;
-                            padding: 2px 6px;
-                            font-size: 12px;
-                            font-weight: bold;
-                            z-index: 10000;
-                            border-radius: 3px;
-                            pointer-events: none;
-                        `;
-                        document.body.appendChild(label);
-                    }
                 }
                 
-                const elementData = {
-                    index: currentHighlightIndex,
-                    id: elementId,
-                    tagName: element.tagName.toLowerCase(),
-                    xpath: '',
-                    cssSelector: '',
-                    text: getTextContent(element),
-                    attributes: {},
-                    isClickable: isElementInteractive,
-                    isInput: isElementInput,
+                let key = dom.keys.get(element);
+                if (key === undefined) {
+                    key = dom.nextKey++;
+                    dom.keys.set(element, key);
+                }
+                
+                const geometry = {
                     isVisible: isElementVisible,
-                    isInViewport: isElementVisible,
-                    inputType: element.type || null,
-                    placeholder: element.placeholder || null,
-                    boundingBox: {
-                        x: rect.x,
-                        y: rect.y,
-                        width: rect.width,
-                        height: rect.height,
-                        top: rect.top,
-                        bottom: rect.bottom,
-                        left: rect.left,
-                        right: rect.right
-                    },
-                    centerCoordinates: {
-                        x: rect.left + rect.width / 2,
-                        y: rect.top + rect.height / 2
-                    }
+                    rect: [rect.x, rect.y, rect.width, rect.height]
                 };
                 
-                if (element.attributes) {
-                    for (let attr of element.attributes) {
-                        elementData.attributes[attr.name] = attr.value;
+                // Unchanged and returned by the previous call: the caller still holds its data
+                // Gaining or losing an index moves it between the caller's interactive and plain elements
+                // Typing, checking and picking an option change properties, not markup: no mutation is recorded
+                const liveState = info.isInput ? `${element.checked ? 1 : 0}:${element.value ?? ''}` : null;
+                const reusable = !dirty && !staleText.has(element) && info.emitted === previousGeneration &&
+                    info.occluded === occluded && info.emittedInteractive === info.isInteractive &&
+                    info.emittedState === liveState;
+                info.emitted = currentGeneration;
+                info.occluded = occluded;
+                info.emittedInteractive = info.isInteractive;
+                info.emittedState = liveState;
+                
+                let elementData;
+                if (reusable) {
+                    reusedCount++;
+                    elementData = { index: currentHighlightIndex, id: `element_${dom.token}_${key}`, reused: true, ...geometry };
+                } else {
+                    elementData = {
+                        index: currentHighlightIndex,
+                        id: `element_${dom.token}_${key}`,
+                        tagName: info.tagName,
+                        xpath: '',
+                        cssSelector: '',
+                        text: getTextContent(element, currentHighlightIndex !== null),
+                        path: structuralPath(element),
+                        attributes: {},
+                        isClickable: info.isInteractive,
+                        isInput: info.isInput,
+                        inputType: element.type || null,
+                        placeholder: element.placeholder || null,
+                        ...geometry
+                    };
+                    for (const name of attributeNames) {
+                        const value = element.getAttribute(name);
+                        if (value !== null) {
+                            elementData.attributes[name] = value.length > maxAttributeLength ? value.slice(0, maxAttributeLength) : value;
+                        }
                     }
                 }
                 
-                elements.push(elementData);
-                
-                if (currentHighlightIndex !== null) {
-                    selectorMap[currentHighlightIndex] = elementData;
+                if (columns) {
+                    pack(key, elementData);
+                } else {
+                    elements.push(elementData);
                 }
-            });
+            }
             
-            const endTime = performance.now();
-            return {
-                elements: elements,
-                selectorMap: selectorMap,
-                stats: {
-                    totalNodes: nodeCount,
-                    processedNodes: processedCount,
-                    interactiveElements: Object.keys(selectorMap).length,
-                    executionTime: endTime - startTime
-                }
+            const stats = {
+                totalNodes: nodeCount,
+                processedNodes: processedCount,
+                prunedSubtrees: prunedSubtrees,
+                shadowRoots: shadowRoots,
+                occludedElements: occludedCount,
+                interactiveElements: highlightIndex,
+                fullScan: fullScan,
+                dirtyRoots: dirtyRootCount,
+                reusedElements: reusedCount,
+                generation: currentGeneration
             };
+            if (!columns) {
+                stats.executionTime = performance.now() - startTime;
+                return { elements: elements, stats: stats };
+            }
+            const result = { packed: encodeColumns(), stats: stats };
+            stats.transferBytes = result.packed.bytes;
+            stats.executionTime = performance.now() - startTime;
+            return result;
         }
         """
 
@@ -617,65 +1069,322 @@ class BrowserController:
         """Navigate to a URL with proper waiting"""
         try:
             logger.info(f"Navigating to: {url}")
+            # A new document always gets a full DOM scan
+            self._cached_page_state = None
             await self.page.goto(url, wait_until=wait_until, timeout=timeout)
-            await asyncio.sleep(2)
+            await self.wait_for_settle("goto")
             logger.info(f"Successfully navigated to: {url}")
         except Exception as e:
             logger.error(f"Failed to navigate to {url}: {e}")
             raise
 
-    async def get_page_state(self, include_screenshot: bool = True, highlight_elements: bool = True) -> PageState:
-        """Get current page state with elements"""
+    async def get_page_state(self, include_screenshot: bool = True, highlight_elements: bool = True,
+                             page: Page | None = None) -> PageState:
+        """Get current page state with elements (of the current page unless another tab is given)"""
+        page = page or self.page
         try:
-            await self.page.wait_for_load_state("domcontentloaded", timeout=10000)
-            await asyncio.sleep(1)
+            await page.wait_for_load_state("domcontentloaded", timeout=10000)
+            if page is self.page:
+                await self.wait_for_settle("page_state")
             
-            url = self.page.url
-            title = await self.page.title()
+            url = page.url
+            title = await page.title()
             
-            screenshot = None
+            screenshot_bytes = None
+            screenshot_scale = 1.0
+            screen_hash = None
             if include_screenshot:
-                screenshot_bytes = await self.page.screenshot(
-                    full_page=False,
-                    clip={'x': 0, 'y': 0, 'width': 1250, 'height': 800}
-                )
-                screenshot = base64.b64encode(screenshot_bytes).decode('utf-8')
+                frame = await self.get_frame(page)
+                screenshot_bytes, screenshot_scale = frame.image, frame.scale
+                screen_hash = await frame.derive("screen_hash", dhash)
             
             # Extract DOM elements
             try:
-                dom_result = await self.page.evaluate(self.dom_js, {"doHighlightElements": highlight_elements})
-                logger.info(f"Extracted {len(dom_result.get('elements', []))} interactive elements")
+                element_table, selector_map, redundant, stats = await self._extract_elements(page)
+                logger.info(f"Extracted {stats.get('interactiveElements', 0)} interactive elements "
+                            f"({stats.get('processedNodes', 0)}/{stats.get('totalNodes', 0)} nodes kept, "
+                            f"{stats.get('prunedSubtrees', 0)} hidden subtrees pruned, "
+                            f"{stats.get('frames', 1)} frames, {stats.get('shadowRoots', 0)} shadow roots, "
+                            f"{stats.get('occludedElements', 0)} occluded and {stats.get('redundantElements', 0)} redundant dropped, "
+                            f"{'full scan' if stats.get('fullScan', True) else str(stats.get('reusedElements', 0)) + ' reused'}) "
+                            f"in {stats.get('executionTime', 0):.1f}ms")
+                if 'transferBytes' in stats:
+                    logger.info(f"📦 Packed DOM transfer: {stats['transferBytes'] / 1024:.1f}KB, "
+                                f"decoded in {stats.get('decodeTime', 0):.1f}ms")
             except Exception as e:
                 logger.error(f"DOM extraction failed: {e}")
-                return PageState(url, title, [], {}, screenshot)
-            
-            elements = []
-            selector_map = {}
+                if page is self.page:
+                    self._cached_page_state = None
+                return PageState(url, title, [], {}, screenshot_bytes, screen_hash=screen_hash)
             
-            for elem_data in dom_result.get('elements', []):
-                element_info = ElementInfo(
-                    index=elem_data.get('index'),
-                    id=elem_data.get('id', ''),
-                    tag_name=elem_data.get('tagName', ''),
-                    xpath=elem_data.get('xpath', ''),
-                    css_selector=elem_data.get('cssSelector', ''),
-                    text=elem_data.get('text', ''),
-                    attributes=elem_data.get('attributes', {}),
-                    is_clickable=elem_data.get('isClickable', False),
-                    is_input=elem_data.get('isInput', False),
-                    center_coordinates=elem_data.get('centerCoordinates')
-                )
-                
-                elements.append(element_info)
-                if element_info.index is not None:
-                    selector_map[element_info.index] = element_info
+            if screenshot_bytes and highlight_elements:
+                # Numbered boxes go on the screenshot, never into the page
+                screenshot_bytes = await asyncio.to_thread(draw_marks, screenshot_bytes, list(selector_map.values()),
+                                                           screenshot_scale, SCREENSHOT_QUALITY)
             
-            return PageState(url, title, elements, selector_map, screenshot)
+            page_state = PageState(url, title, element_table, selector_map, screenshot_bytes, dom_stats=stats,
+                                   redundant=redundant, screen_hash=screen_hash)
+            if page is self.page:
+                # Baseline for the next incremental extraction
+                self._cached_page_state = page_state
+                self._cached_url = url
+            return page_state
             
         except Exception as e:
             logger.error(f"Failed to get page state: {e}")
+            if page is self.page:
+                self._cached_page_state = None
             return PageState("", "", [], {}, None)
 
+    async def get_frame(self, page: Page | None = None) -> Frame:
+        """Screenshot of the page (the current one by default), reused until the page changes"""
+        return await self.frame_cache.get(page or self.page, self._capture_screenshot)
+
+    def get_frame_cache_stats(self) -> dict:
+        """Screenshots captured and served from the frame cache for this job"""
+        return self.frame_cache.get_stats()
+
+    async def _capture_screenshot(self, page: Page) -> Tuple[bytes, float]:
+        """Viewport image from Page.captureScreenshot, encoded by the browser at model size, and its scale"""
+        viewport = page.viewport_size or {"width": 1280, "height": 800}
+        scale = min(1.0, SCREENSHOT_MAX_SIZE[0] / viewport["width"], SCREENSHOT_MAX_SIZE[1] / viewport["height"])
+        params = {"format": SCREENSHOT_FORMAT, "optimizeForSpeed": True}
+        if SCREENSHOT_FORMAT != "png":
+            params["quality"] = SCREENSHOT_QUALITY
+        session, temporary = await self.page_sessions.acquire(page)
+        try:
+            if scale < 1.0:
+                # Clips are in document coordinates
+                metrics = await session.send("Page.getLayoutMetrics")
+                visual = metrics.get("cssVisualViewport", {})
+                params["clip"] = {"x": visual.get("pageX", 0), "y": visual.get("pageY", 0),
+                                  "width": viewport["width"], "height": viewport["height"], "scale": scale}
+            result = await session.send("Page.captureScreenshot", params)
+        finally:
+            await self.page_sessions.release(session, temporary)
+        # The protocol itself carries base64; this is the only decode
+        return base64.b64decode(result["data"]), scale
+
+    async def get_ax_elements(self, page_state: PageState, page: Page | None = None) -> Dict[int, AXElement]:
+        """Accessibility role and name of the page state's indexed elements, by index (empty on failure)"""
+        try:
+            return await self.ax_tree.read(page or self.page, page_state)
+        except Exception as e:
+            logger.warning(f"⚠️ Accessibility tree unavailable: {e}")
+            return {}
+
+    async def _extract_elements(self, page: Page):
+        """Run the job's DOM engine; dom_js re-scans only what changed since the previous state of the current page"""
+        if self.dom_engine == "snapshot":
+            dom_result = await self.dom_snapshot.extract(page)
+            return self._build_elements(dom_result, None)
+
+        previous = self._cached_page_state if page is self.page and self._cached_url == page.url else None
+        args = {
+            "incremental": previous is not None,
+            "generation": previous.dom_stats.get("generation") if previous else None,
+            "attributeNames": ELEMENT_ATTRIBUTES,
+            "maxAttributeLength": MAX_ATTRIBUTE_LENGTH,
+            "packed": PACKED_TRANSFER,
+            "occlusion": OCCLUSION_CHECK,
+        }
+        dom_result = await self._evaluate_frames(page, args)
+        built = self._build_elements(dom_result, previous)
+        if built is None:
+            # Out of sync with the page (another caller ran the extractor); start over
+            logger.warning("⚠️ Incremental DOM state out of sync, doing a full scan")
+            self._cached_page_state = None
+            return await self._extract_elements(page)
+        return built
+
+    async def _evaluate_frames(self, page: Page, args: dict) -> dict:
+        """Run dom_js in the main frame and its child frames concurrently and merge the results"""
+        main_frame = page.main_frame
+        frames = [f for f in page.frames if f is not main_frame and not f.is_detached()][:MAX_FRAMES]
+        if not frames:
+            result = await page.evaluate(self.dom_js, args)
+            decode_result(result)
+            return result
+
+        started = asyncio.get_running_loop().time()
+        # Only the main document keeps incremental state between calls
+        frame_args = {**args, "incremental": False, "generation": None}
+        main_result, *frame_results = await asyncio.gather(
+            page.evaluate(self.dom_js, args),
+            *(self._evaluate_frame(frame, frame_args) for frame in frames),
+            return_exceptions=True,
+        )
+        if isinstance(main_result, BaseException):
+            raise main_result
+        decode_result(main_result)
+
+        results = {}
+        for frame, result in zip(frames, frame_results):
+            if isinstance(result, BaseException):
+                logger.debug(f"Skipping frame {frame.url[:80]}: {result}")
+            elif result[0] is not None:
+                decode_result(result[1])
+                results[frame] = result
+        merged = self._merge_frames(page, main_result, frames, results)
+        merged["stats"]["executionTime"] = (asyncio.get_running_loop().time() - started) * 1000
+        return merged
+
+    async def _evaluate_frame(self, frame, args: dict):
+        """Box of a child frame in its parent's coordinates (None if not rendered) and its dom_js result"""
+        async def frame_box():
+            element = await frame.frame_element()
+            try:
+                box = await element.evaluate(FRAME_BOX_JS)
+            finally:
+                await element.dispose()
+            return box if box[2] > 0 and box[3] > 0 else None
+        return await asyncio.gather(frame_box(), frame.evaluate(self.dom_js, args))
+
+    def _merge_frames(self, page: Page, main_result: dict, frames: list, results: dict) -> dict:
+        """Append child frame elements to the main frame's, shifted into main-viewport coordinates and re-indexed"""
+        viewport = page.viewport_size or {"width": 1280, "height": 800}
+        # Frame → (offset x, offset y, visible area left, top, right, bottom), all in main-viewport coordinates
+        areas = {page.main_frame: (0.0, 0.0, 0.0, 0.0, float(viewport["width"]), float(viewport["height"]))}
+
+        def area(frame):
+            if frame not in areas:
+                parent_area = area(frame.parent_frame) if frame in results and frame.parent_frame else None
+                if parent_area is None:
+                    areas[frame] = None
+                else:
+                    offset_x, offset_y, clip_left, clip_top, clip_right, clip_bottom = parent_area
+                    left, top, width, height = results[frame][0]
+                    left, top = left + offset_x, top + offset_y
+                    areas[frame] = (left, top, max(left, clip_left), max(top, clip_top),
+                                    min(left + width, clip_right), min(top + height, clip_bottom))
+            return areas[frame]
+
+        packed = main_result.get("packed")
+        parts = [packed] if packed is not None else None
+        elements = main_result.get("elements", [])
+        stats = dict(main_result.get("stats", {}))
+        next_index = stats.get("interactiveElements", 0)
+        frame_count = 1
+        for frame in frames:
+            frame_area = area(frame) if frame in results else None
+            if frame_area is None:
+                continue
+            offset_x, offset_y, clip_left, clip_top, clip_right, clip_bottom = frame_area
+            frame_result = results[frame][1]
+            if parts is not None:
+                parts.append(frame_result["packed"].place(offset_x, offset_y, frame_area[2:], next_index))
+            for record in frame_result.get("elements", []):
+                x, y, width, height = record["rect"]
+                x, y = x + offset_x, y + offset_y
+                visible = bool(record.get("isVisible")) and x < clip_right and x + width > clip_left \
+                    and y < clip_bottom and y + height > clip_top
+                if record.get("index") is None:
+                    if not visible:
+                        continue
+                else:
+                    record["index"] += next_index
+                record["rect"] = [x, y, width, height]
+                record["isVisible"] = visible
+                elements.append(record)
+
+            frame_stats = frame_result.get("stats", {})
+            next_index += frame_stats.get("interactiveElements", 0)
+            for key in ("totalNodes", "processedNodes", "prunedSubtrees", "shadowRoots", "occludedElements",
+                        "transferBytes", "decodeTime"):
+                if key in frame_stats:
+                    stats[key] = stats.get(key, 0) + frame_stats[key]
+            frame_count += 1
+
+        stats["interactiveElements"] = next_index
+        stats["frames"] = frame_count
+        if parts is not None:
+            return {"packed": PackedElements.concat(parts), "stats": stats}
+        return {"elements": elements, "stats": stats}
+
+    def _build_elements(self, dom_result: dict, previous: PageState | None):
+        """Turn an engine result into indexed ElementInfo objects, a table of the rest and the redundant
+        interactive elements; None if a reused record is unknown"""
+        stats = dom_result.get('stats', {})
+        incremental = not stats.get('fullScan', True)
+        known = {e.id: e for e in (*previous.selector_map.values(), *previous.redundant.values())} if incremental else {}
+        previous_table = previous.element_table if incremental else None
+        packed = dom_result.get('packed')
+        rows = list(packed.rows() if packed is not None else _record_rows(dom_result.get('elements', [])))
+        
+        # Interactive rows that duplicate a better target lose their index
+        candidates, ranks = [], []
+        for row_number, row in enumerate(rows):
+            if row[0] is None:
+                continue
+            if row[2]:
+                prior = known.get(row[1])
+                if prior is None:
+                    return None
+                ranks.append(element_rank(prior.tag_name, prior.attributes, prior.is_input))
+            else:
+                ranks.append(element_rank(row[5], row[7], row[9]))
+            candidates.append(row_number)
+        rects = np.array([rows[row_number][4] for row_number in candidates], dtype=np.float64).reshape(-1, 4)
+        dropped = {candidates[i] for i in np.flatnonzero(redundant_elements(rects, np.array(ranks, dtype=np.int8)))}
+        
+        table = ElementTable()
+        selector_map = {}
+        redundant = {}
+        position = 0
+        
+        for row_number, (index, element_id, reused, is_visible, rect, tag_name, text, attributes,
+                         is_clickable, is_input, input_type, placeholder, path) in enumerate(rows):
+            if index is None:
+                if reused:
+                    row = previous_table.find(element_id) if previous_table is not None else None
+                    if row is None:
+                        return None
+                    table.append(position, element_id, previous_table.tags[row], previous_table.texts[row],
+                                 previous_table.attributes[row], previous_table.fingerprints[row], rect)
+                else:
+                    table.append(position, element_id, tag_name, text, attributes,
+                                 element_fingerprint(tag_name, attributes, text, path), rect)
+                position += 1
+                continue
+            
+            bounding_box, center = _box(*rect)
+            if reused:
+                # Unchanged element: only its position in the list and on screen can differ.
+                # A copy, so the previous PageState still describes the previous step
+                element_info = replace(known[element_id], index=index, is_visible=is_visible, is_in_viewport=is_visible,
+                                       bounding_box=bounding_box, center_coordinates=center)
+            else:
+                element_info = ElementInfo(
+                    index=index,
+                    id=element_id,
+                    tag_name=tag_name,
+                    xpath='',
+                    css_selector='',
+                    text=text,
+                    attributes=attributes or {},
+                    is_clickable=is_clickable,
+                    is_input=is_input,
+                    is_visible=is_visible,
+                    is_in_viewport=is_visible,
+                    input_type=input_type,
+                    placeholder=placeholder,
+                    bounding_box=bounding_box,
+                    center_coordinates=center,
+                    fingerprint=element_fingerprint(tag_name, attributes, text, path)
+                )
+            
+            if row_number in dropped:
+                redundant[element_id] = element_info
+                continue
+            # Indices stay contiguous after dropping
+            element_info.index = len(selector_map)
+            selector_map[element_info.index] = element_info
+            position += 1
+        
+        stats['redundantElements'] = len(redundant)
+        stats['interactiveElements'] = len(selector_map)
+        return table, selector_map, redundant, stats
+
     async def click_element_by_index(self, index: int, page_state: PageState = None) -> bool:
         """Click element by index"""
         try:
@@ -697,7 +1406,7 @@ class BrowserController:
             logger.info(f"Clicking element {index}: {element.text[:50]}... at ({x}, {y})")
             
             await self.page.mouse.click(x, y)
-            await asyncio.sleep(1)
+            await self.wait_for_settle("click")
             
             logger.info(f"Successfully clicked element {index}")
             return True
@@ -727,7 +1436,8 @@ class BrowserController:
             logger.info(f"Typing '{text}' into element {index}")
             
             await self.page.mouse.click(x, y)
-            await asyncio.sleep(0.5)
+            # Focusing can open autocomplete panels or re-render the field
+            await self.wait_for_settle("input")
             await self.page.keyboard.press('Control+a')
             await self.page.keyboard.type(text)
             
@@ -744,13 +1454,14 @@ class BrowserController:
             await self.page.mouse.wheel(0, amount)
         elif direction == "up":
             await self.page.mouse.wheel(0, -amount)
-        await asyncio.sleep(1)
+        await self.wait_for_settle("scroll")
 
     async def press_key(self, key: str) -> bool:
         """Press a keyboard key"""
         try:
             await self.page.keyboard.press(key)
             logger.info(f"Pressed key: {key}")
+            await self.wait_for_settle("press_key")
             return True
         except Exception as e:
             logger.error(f"Failed to press key {key}: {e}")
@@ -0,0 +1,370 @@
+## process-wide pool of warm Chromium instances that hand out isolated per-job contexts
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from playwright.async_api import Browser, BrowserContext
+
+from backend.playwright_driver import playwright_driver
+from backend.display_pool import display_pool, VirtualDisplay
+from backend.resource_watchdog import WATCHDOG_ENABLED, WATCHDOG_INTERVAL, MAX_BROWSER_RSS_MB, read_rss_mb
+
+logger = logging.getLogger(__name__)
+
+CHROMIUM_ARGS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor",
+    "--window-size=1280,800",
+    "--window-position=0,0",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-extensions",
+    "--no-first-run",
+    "--disable-default-apps",
+    # Enable remote debugging for CDP
+    "--remote-debugging-port=0"  # Use random port
+]
+
+@dataclass
+class PooledBrowser:
+    """A warm Chromium instance owned by the pool"""
+    browser: Browser
+    headless: bool
+    launched_at: float = field(default_factory=time.time)
+    jobs_served: int = 0
+    active_leases: int = 0
+    retiring: bool = False
+    display: Optional[VirtualDisplay] = None
+    # Total RSS of the browser's processes at the last pool monitor pass
+    rss_mb: Optional[float] = None
+
+    @property
+    def healthy(self) -> bool:
+        if self.display and not self.display.is_healthy():
+            return False
+        return not self.retiring and self.browser.is_connected()
+
+@dataclass
+class BrowserLease:
+    """A job's claim on a pooled browser together with its isolated context"""
+    pooled: PooledBrowser
+    context: BrowserContext
+    wait_time: float = 0.0
+
+    @property
+    def browser(self) -> Browser:
+        return self.pooled.browser
+
+class BrowserPool:
+    def __init__(self, size: int | None = None, max_contexts_per_browser: int | None = None,
+                 max_jobs_per_browser: int | None = None, warm_headless: bool | None = None):
+        self.size = size if size is not None else int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        self.max_contexts_per_browser = max_contexts_per_browser if max_contexts_per_browser is not None \
+            else int(os.getenv("BROWSER_POOL_MAX_CONTEXTS", "4"))
+        self.max_jobs_per_browser = max_jobs_per_browser if max_jobs_per_browser is not None \
+            else int(os.getenv("BROWSER_POOL_MAX_JOBS", "50"))
+        # Jobs default to headful mode, so that is the bucket we keep warm unless told otherwise
+        self.warm_headless = warm_headless if warm_headless is not None \
+            else os.getenv("BROWSER_POOL_WARM_HEADLESS", "false").lower() == "true"
+
+        self.play = None
+        self._browsers: Dict[bool, List[PooledBrowser]] = {True: [], False: []}
+        self._launching: Dict[bool, int] = {True: 0, False: 0}
+        self._condition = asyncio.Condition()
+        self._closed = False
+
+        # Tuning metrics
+        self.waiting = 0
+        self.leases_total = 0
+        self.lease_wait_total = 0.0
+        self.lease_wait_max = 0.0
+        self.launch_count = 0
+        self.recycle_count = 0
+        self.rss_retirements = 0
+        self._monitor_task: asyncio.Task | None = None
+
+    async def start(self):
+        """Attach to the shared Playwright driver and pre-launch the warm browsers"""
+        self._closed = False
+        await self._ensure_playwright()
+        self._start_monitor()
+        async with self._condition:
+            missing = self.size - len(self._browsers[self.warm_headless]) - self._launching[self.warm_headless]
+            self._launching[self.warm_headless] += max(missing, 0)
+        if missing > 0:
+            results = await asyncio.gather(*(self._add_browser(self.warm_headless) for _ in range(missing)),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Failed to pre-launch pooled browser: {result}")
+        logger.info(f"🔥 Browser pool ready: {len(self._browsers[self.warm_headless])} warm "
+                    f"{'headless' if self.warm_headless else 'headful'} browsers")
+
+    async def close(self):
+        """Close every pooled browser and release the shared Playwright driver"""
+        self._closed = True
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._monitor_task = None
+        async with self._condition:
+            pooled_browsers = self._browsers[True] + self._browsers[False]
+            self._browsers = {True: [], False: []}
+            self._condition.notify_all()
+
+        for pooled in pooled_browsers:
+            await self._close_browser(pooled)
+
+        if self.play:
+            self.play = None
+            await playwright_driver.release()
+
+    async def acquire(self, headless: bool, **context_options) -> BrowserLease:
+        """Lease a warm browser and open an isolated context on it"""
+        started = time.perf_counter()
+        self._start_monitor()
+        pooled = await self._checkout(headless)
+        wait_time = time.perf_counter() - started
+
+        self.leases_total += 1
+        self.lease_wait_total += wait_time
+        self.lease_wait_max = max(self.lease_wait_max, wait_time)
+
+        try:
+            context = await pooled.browser.new_context(**context_options)
+        except Exception:
+            await self._checkin(pooled)
+            raise
+
+        if wait_time > 1:
+            logger.warning(f"⏳ Waited {wait_time:.2f}s for a pooled browser")
+        return BrowserLease(pooled=pooled, context=context, wait_time=wait_time)
+
+    async def release(self, lease: BrowserLease):
+        """Close the lease's context and return its browser to the pool"""
+        try:
+            await lease.context.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing pooled context: {e}")
+        await self._checkin(lease.pooled)
+
+    def get_stats(self) -> dict:
+        """Get pool statistics for tuning under load"""
+        browsers = self._browsers[True] + self._browsers[False]
+        return {
+            "size": self.size,
+            "max_contexts_per_browser": self.max_contexts_per_browser,
+            "max_jobs_per_browser": self.max_jobs_per_browser,
+            "browsers": len(browsers),
+            "headless_browsers": len(self._browsers[True]),
+            "headful_browsers": len(self._browsers[False]),
+            "launching": self._launching[True] + self._launching[False],
+            "active_leases": sum(p.active_leases for p in browsers),
+            "waiting": self.waiting,
+            "leases_total": self.leases_total,
+            "avg_lease_wait_ms": round(self.lease_wait_total / self.leases_total * 1000, 2) if self.leases_total else 0.0,
+            "max_lease_wait_ms": round(self.lease_wait_max * 1000, 2),
+            "launched": self.launch_count,
+            "recycled": self.recycle_count,
+            "max_browser_rss_mb": MAX_BROWSER_RSS_MB,
+            "rss_retirements": self.rss_retirements,
+            "browser_rss_mb": [p.rss_mb for p in browsers],
+        }
+
+    def _start_monitor(self):
+        if WATCHDOG_ENABLED and not self._closed and (self._monitor_task is None or self._monitor_task.done()):
+            self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def _monitor(self):
+        """Retire browsers whose processes together grow past MAX_BROWSER_RSS_MB"""
+        while True:
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            for pooled in self._browsers[True] + self._browsers[False]:
+                try:
+                    await self._check_rss(pooled)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not read pooled browser RSS: {e}")
+
+    async def _check_rss(self, pooled: PooledBrowser):
+        if pooled.retiring or not pooled.browser.is_connected():
+            return
+        session = await pooled.browser.new_browser_cdp_session()
+        try:
+            result = await session.send("SystemInfo.getProcessInfo")
+        finally:
+            await session.detach()
+        rss = [read_rss_mb(info["id"]) for info in result.get("processInfo", [])]
+        rss = [value for value in rss if value is not None]
+        if not rss:
+            # Remote browser, its processes are not visible from here
+            return
+        pooled.rss_mb = round(sum(rss), 1)
+        if pooled.rss_mb <= MAX_BROWSER_RSS_MB:
+            return
+
+        logger.warning(f"🐘 Pooled browser RSS {pooled.rss_mb}MB over {MAX_BROWSER_RSS_MB}MB, retiring it")
+        self.rss_retirements += 1
+        # No new leases; its current jobs finish on it and the last check-in replaces it
+        pooled.retiring = True
+        async with self._condition:
+            idle = pooled.active_leases <= 0 and pooled in self._browsers[pooled.headless]
+            if idle:
+                self._browsers[pooled.headless].remove(pooled)
+                self.recycle_count += 1
+            self._condition.notify_all()
+        if idle:
+            await self._close_browser(pooled)
+            if pooled.headless == self.warm_headless and not self._closed:
+                asyncio.create_task(self._replenish(pooled.headless))
+
+    async def _checkout(self, headless: bool) -> PooledBrowser:
+        """Reserve a context slot on a browser, launching one if the pool has room"""
+        async with self._condition:
+            self.waiting += 1
+        try:
+            while True:
+                async with self._condition:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is closed")
+
+                    # Drop idle browsers that crashed or finished retiring so they free their slot
+                    dead = [p for p in self._browsers[headless] if not p.healthy and p.active_leases <= 0]
+                    for pooled in dead:
+                        self._browsers[headless].remove(pooled)
+                        self.recycle_count += 1
+                    for pooled in dead:
+                        asyncio.create_task(self._close_browser(pooled))
+
+                    pooled = self._pick(headless)
+                    if pooled:
+                        pooled.active_leases += 1
+                        pooled.jobs_served += 1
+                        if pooled.jobs_served >= self.max_jobs_per_browser:
+                            # Finish the current jobs, then replace this browser
+                            pooled.retiring = True
+                        return pooled
+
+                    can_launch = len(self._browsers[headless]) + self._launching[headless] < self.size
+                    if not can_launch:
+                        await self._condition.wait()
+                        continue
+                    self._launching[headless] += 1
+
+                await self._add_browser(headless)
+        finally:
+            async with self._condition:
+                self.waiting -= 1
+
+    def _pick(self, headless: bool) -> Optional[PooledBrowser]:
+        """Pick the least loaded healthy browser with a free context slot"""
+        candidates = [
+            p for p in self._browsers[headless]
+            if p.healthy and p.active_leases < self.max_contexts_per_browser
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda p: p.active_leases)
+
+    async def _checkin(self, pooled: PooledBrowser):
+        """Return a context slot and recycle the browser once it is drained"""
+        recycle = False
+        async with self._condition:
+            pooled.active_leases -= 1
+            if not pooled.healthy and pooled.active_leases <= 0 and pooled in self._browsers[pooled.headless]:
+                self._browsers[pooled.headless].remove(pooled)
+                self.recycle_count += 1
+                recycle = True
+            self._condition.notify_all()
+
+        if recycle:
+            logger.info(f"♻️ Recycling pooled browser after {pooled.jobs_served} jobs")
+            await self._close_browser(pooled)
+            if pooled.headless == self.warm_headless and not self._closed:
+                # Keep the warm bucket at full size without blocking the caller
+                asyncio.create_task(self._replenish(pooled.headless))
+
+    async def _replenish(self, headless: bool):
+        async with self._condition:
+            if len(self._browsers[headless]) + self._launching[headless] >= self.size:
+                return
+            self._launching[headless] += 1
+        try:
+            await self._add_browser(headless)
+        except Exception as e:
+            logger.error(f"❌ Failed to replenish browser pool: {e}")
+
+    async def _add_browser(self, headless: bool):
+        """Launch a browser into a bucket slot the caller already reserved in ``_launching``"""
+        try:
+            pooled = await self._launch(headless)
+        finally:
+            async with self._condition:
+                self._launching[headless] -= 1
+                self._condition.notify_all()
+
+        async with self._condition:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._browsers[headless].append(pooled)
+                self._condition.notify_all()
+        if closed:
+            await self._close_browser(pooled)
+
+    async def _ensure_playwright(self):
+        """Hold one reference on the shared driver while the pool has browsers to launch"""
+        if not self.play:
+            self.play = await playwright_driver.acquire()
+        return self.play
+
+    async def _launch(self, headless: bool) -> PooledBrowser:
+        """Launch a Chromium instance, starting a virtual display when needed"""
+        await self._ensure_playwright()
+
+        display = None
+        launch_options = {"headless": headless, "args": CHROMIUM_ARGS}
+
+        if not headless and not os.environ.get("DISPLAY"):
+            # Render on a pooled Xvfb through the child environment, never by mutating os.environ
+            display = await display_pool.lease()
+            if display:
+                launch_options["env"] = display.env()
+            else:
+                logger.warning("⚠️ No display available; launching pooled browser headless")
+                launch_options["headless"] = True
+
+        try:
+            browser = await self.play.chromium.launch(**launch_options)
+        except Exception:
+            await display_pool.release(display)
+            raise
+
+        self.launch_count += 1
+        pooled = PooledBrowser(browser=browser, headless=headless, display=display)
+        browser.on("disconnected", lambda _: logger.warning("⚠️ Pooled browser disconnected"))
+        return pooled
+
+    async def _close_browser(self, pooled: PooledBrowser):
+        try:
+            if pooled.browser.is_connected():
+                await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing pooled browser: {e}")
+        finally:
+            await display_pool.release(pooled.display)
+            pooled.display = None
+
+# Global browser pool shared by every job in this worker process
+browser_pool = BrowserPool()
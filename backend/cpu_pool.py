@@ -0,0 +1,135 @@
+## bounded process pool for CPU-heavy stages (image encoding, HTML parsing, PDF building), off the event loop
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 0 runs every stage in a thread of this process instead
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Calls handed to the workers at once; later callers wait their turn without filling the executor queue
+CPU_POOL_MAX_PENDING = int(os.getenv("CPU_POOL_MAX_PENDING", str(max(1, CPU_POOL_WORKERS) * 4)))
+
+def _timed_call(func: Callable, args: tuple, kwargs: dict):
+    """Runs in the worker: the result and the CPU seconds it took there"""
+    started = time.process_time()
+    result = func(*args, **kwargs)
+    return result, time.process_time() - started
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cpu_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cpu_ms": round(self.cpu_seconds * 1000, 1),
+            "avg_cpu_ms": round(self.cpu_seconds * 1000 / self.calls, 2) if self.calls else None,
+            "avg_wait_ms": round(self.wait_seconds * 1000 / self.calls, 2) if self.calls else None,
+            "avg_wall_ms": round(self.wall_seconds * 1000 / self.calls, 2) if self.calls else None,
+        }
+
+class CPUPool:
+    """Runs picklable module-level functions in worker processes, at most max_pending at a time.
+
+    Functions have to live in modules that are cheap to import (every worker imports them),
+    see backend/cpu_tasks.py.
+    """
+
+    def __init__(self, workers: int = CPU_POOL_WORKERS, max_pending: int = CPU_POOL_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.pending = 0
+        self.restarts = 0
+        self.stages: Dict[str, StageStats] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers never inherit the event loop, Playwright pipes or held locks
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"🧮 CPU pool started with {self.workers} worker processes")
+        return self._executor
+
+    async def run(self, stage: str, func: Callable, *args, **kwargs) -> Any:
+        """func(*args, **kwargs) in a worker process, timed under the stage name"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        stats = self.stages.setdefault(stage, StageStats())
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.pending += 1
+        try:
+            if self.workers <= 0:
+                result, cpu_seconds = await asyncio.to_thread(_timed_call, func, args, kwargs)
+            else:
+                result, cpu_seconds = await self._submit(func, args, kwargs)
+            stats.cpu_seconds += cpu_seconds
+            return result
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            self.pending -= 1
+            self._slots.release()
+            stats.calls += 1
+            stats.wait_seconds += started - queued
+            stats.wall_seconds += time.perf_counter() - queued
+
+    async def _submit(self, func: Callable, args: tuple, kwargs: dict):
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, _timed_call, func, args, kwargs)
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault in a native library); retry once on fresh workers.
+            # The call may have partly run, so tasks with side effects must be safe to repeat (see write_pdf)
+            if self._executor is executor:
+                logger.warning("⚠️ CPU pool worker died, restarting the pool")
+                self._reset()
+                self.restarts += 1
+            return await loop.run_in_executor(self._get_executor(), _timed_call, func, args, kwargs)
+
+    def _reset(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def close(self):
+        """Stop the worker processes"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        """Queue depth and per-stage CPU time"""
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.pending,
+            # Calls waiting for a pending slot plus those the workers have not picked up yet
+            "queue_depth": self.waiting + max(0, self.pending - max(self.workers, 1)),
+            "restarts": self.restarts,
+            "stages": {stage: stats.as_dict() for stage, stats in self.stages.items()},
+        }
+
+# Shared by every job of this worker process
+cpu_pool = CPUPool()
@@ -0,0 +1,186 @@
+## CPU-bound stages run in the cpu_pool worker processes; every worker imports this module, so keep its imports light
+
+import base64
+import html
+import io
+import os
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+from bs4 import BeautifulSoup
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+
+def jpeg_thumbnail(img_bytes: bytes, max_size: Tuple[int, int], quality: int = 75) -> bytes:
+    """JPEG of an image shrunk to fit max_size"""
+    image = PILImage.open(io.BytesIO(img_bytes))
+    image.thumbnail(max_size, PILImage.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def decode_image(img_bytes: bytes) -> np.ndarray:
+    """BGR pixels of an encoded image, None if it cannot be decoded"""
+    return cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def structured_content(markup: str) -> str:
+    """Headings, paragraphs, lists and tables of the main content of a page, as tagged text lines"""
+    soup = BeautifulSoup(markup, 'html.parser')
+
+    # Remove script, style, and other non-content elements
+    for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'advertisement']):
+        tag.decompose()
+
+    # Extract main content areas
+    main_content = []
+
+    # Look for main content containers
+    main_containers = soup.find_all(['main', 'article', 'section']) or [soup.find('body')]
+
+    for container in main_containers[:3]:  # Limit to avoid too much content
+        if container:
+            # Extract headings
+            headings = container.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+            for heading in headings:
+                if heading.get_text(strip=True):
+                    main_content.append(f"HEADING: {heading.get_text(strip=True)}")
+
+            # Extract paragraphs
+            paragraphs = container.find_all('p')
+            for p in paragraphs[:20]:  # Limit paragraphs
+                text = p.get_text(strip=True)
+                if len(text) > 20:  # Only meaningful paragraphs
+                    main_content.append(f"TEXT: {text}")
+
+            # Extract lists
+            lists = container.find_all(['ul', 'ol'])
+            for list_elem in lists[:5]:  # Limit lists
+                items = list_elem.find_all('li')
+                if items:
+                    main_content.append("LIST:")
+                    for item in items[:10]:  # Limit list items
+                        text = item.get_text(strip=True)
+                        if text:
+                            main_content.append(f"  - {text}")
+
+            # Extract table data
+            tables = container.find_all('table')
+            for table in tables[:3]:  # Limit tables
+                rows = table.find_all('tr')
+                if rows:
+                    main_content.append("TABLE:")
+                    for row in rows[:10]:  # Limit rows
+                        cells = row.find_all(['td', 'th'])
+                        if cells:
+                            row_text = " | ".join([cell.get_text(strip=True) for cell in cells])
+                            if row_text.strip():
+                                main_content.append(f"  {row_text}")
+
+    # Join and limit content
+    content = "\n".join(main_content)
+    return content[:12000]  # Limit total content to avoid token limits
+
+def write_pdf(filepath: str, data: Dict[str, Any], include_images: bool = False):
+    """Render extracted data (and its collected images) into a PDF file"""
+    # Built under a per-process name and renamed at the end, so a worker that dies mid-build
+    # (and the pool's retry on a fresh one) never leaves a truncated file at filepath
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    doc = SimpleDocTemplate(tmp_path, pagesize=letter, topMargin=72, bottomMargin=72)
+    styles = getSampleStyleSheet()
+    story = []
+    available_width = doc.width
+
+    # Title
+    story.append(Paragraph("Extracted Information", styles['Title']))
+    story.append(Spacer(1, 20))
+
+    # Metadata
+    metadata = data.get("_metadata", {})
+    if metadata:
+        story.append(Paragraph(f"<b>Source:</b> {html.escape(str(metadata.get('source_url', 'Unknown')))}", styles['Normal']))
+        story.append(Paragraph(f"<b>Goal:</b> {html.escape(str(metadata.get('extraction_goal', 'Unknown')))}", styles['Normal']))
+        story.append(Paragraph(f"<b>Website Type:</b> {html.escape(str(metadata.get('website_type', 'Unknown')))}", styles['Normal']))
+        story.append(Spacer(1, 20))
+
+    # Content with better handling
+    def add_content(key: str, value, level: int = 0):
+        if key in ("_metadata", "_media"):
+            return
+
+        if isinstance(value, dict):
+            style = styles['Heading1'] if level == 0 else styles['Heading2']
+            clean_key = html.escape(key.replace('_', ' ').title())
+            story.append(Paragraph(clean_key, style))
+            story.append(Spacer(1, 10))
+            for k, v in value.items():
+                add_content(k, v, level + 1)
+        elif isinstance(value, list):
+            clean_key = html.escape(key.replace('_', ' ').title())
+            story.append(Paragraph(f"<b>{clean_key}:</b>", styles['Normal']))
+            story.append(Spacer(1, 6))
+            for item in value:
+                # Handle long text items and escape HTML
+                item_str = html.escape(str(item))
+                if len(item_str) > 300:
+                    item_str = item_str[:300] + "..."
+                story.append(Paragraph(f"• {item_str}", styles['Normal']))
+            story.append(Spacer(1, 10))
+        else:
+            # Handle long text values and escape HTML
+            clean_key = html.escape(key.replace('_', ' ').title())
+            value_str = html.escape(str(value))
+            if len(value_str) > 800:
+                value_str = value_str[:800] + "..."
+            story.append(Paragraph(f"<b>{clean_key}:</b> {value_str}", styles['Normal']))
+            story.append(Spacer(1, 8))
+
+    def add_images():
+        if not include_images:
+            return
+
+        image_entries = data.get("_media", {}).get("images", [])
+        if not image_entries:
+            return
+
+        story.append(Paragraph("Images", styles['Heading2']))
+        story.append(Spacer(1, 10))
+
+        for idx, image_entry in enumerate(image_entries, start=1):
+            try:
+                img_data = base64.b64decode(image_entry.get("data", ""))
+                img_buffer = io.BytesIO(img_data)
+                reader = ImageReader(img_buffer)
+                img_width, img_height = reader.getSize()
+
+                if img_width > available_width:
+                    scale = available_width / float(img_width)
+                    img_width = available_width
+                    img_height = img_height * scale
+
+                img_buffer.seek(0)
+                story.append(Image(img_buffer, width=img_width, height=img_height))
+
+                caption = image_entry.get("url")
+                if caption:
+                    safe_caption = html.escape(str(caption))
+                    story.append(Paragraph(f"<font size=8 color='#666666'>Image {idx}: {safe_caption}</font>", styles['Normal']))
+
+                story.append(Spacer(1, 12))
+            except Exception as image_error:
+                print(f"⚠️ Could not add image to PDF: {image_error}")
+
+    for key, value in data.items():
+        add_content(key, value)
+
+    add_images()
+
+    try:
+        doc.build(story)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,187 @@
+## pool of long-lived Xvfb displays leased by headful browsers
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class VirtualDisplay:
+    """A running Xvfb server"""
+    number: int
+    process: asyncio.subprocess.Process
+    started_at: float = field(default_factory=time.time)
+    leases: int = 0
+
+    @property
+    def name(self) -> str:
+        return f":{self.number}"
+
+    def is_healthy(self) -> bool:
+        """The server is alive and its X socket is still present"""
+        return self.process.returncode is None and Path(f"/tmp/.X11-unix/X{self.number}").exists()
+
+    def env(self) -> dict:
+        """Environment for a child process that should render on this display"""
+        return {**os.environ, "DISPLAY": self.name}
+
+class DisplayPool:
+    def __init__(self, size: int | None = None, screen: str = "1280x800x24"):
+        self.size = size if size is not None else int(os.getenv("XVFB_POOL_SIZE", "2"))
+        self.screen = screen
+        self.start_timeout = float(os.getenv("XVFB_START_TIMEOUT", "5"))
+        self.health_check_interval = float(os.getenv("XVFB_HEALTH_CHECK_INTERVAL", "30"))
+        self.displays: List[VirtualDisplay] = []
+        self._lock = asyncio.Lock()
+        self._monitor_task: asyncio.Task | None = None
+        self.xvfb_available = True
+
+        self.started_count = 0
+        self.replaced_count = 0
+        self.leases_total = 0
+
+    async def start(self):
+        """Begin periodic health checks of the pooled displays"""
+        if self._monitor_task is None or self._monitor_task.done():
+            self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def close(self):
+        """Stop the health checks and every pooled Xvfb"""
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            self._monitor_task = None
+        async with self._lock:
+            displays, self.displays = self.displays, []
+        for display in displays:
+            await _terminate(display.process)
+
+    async def lease(self) -> Optional[VirtualDisplay]:
+        """Lease the least used healthy display, starting one if the pool has room.
+
+        Returns None when Xvfb cannot be used, in which case callers fall back to headless.
+        """
+        async with self._lock:
+            await self._prune()
+
+            if len(self.displays) < self.size and self.xvfb_available:
+                display = await self._start_display()
+                if display:
+                    self.displays.append(display)
+
+            if not self.displays:
+                return None
+
+            display = min(self.displays, key=lambda d: d.leases)
+            display.leases += 1
+            self.leases_total += 1
+            return display
+
+    async def release(self, display: Optional[VirtualDisplay]):
+        """Return a display; it stays running for the next lease"""
+        if display is None:
+            return
+        async with self._lock:
+            display.leases = max(display.leases - 1, 0)
+
+    async def health_check(self) -> dict:
+        """Replace dead displays and report the pool state"""
+        async with self._lock:
+            await self._prune()
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        return {
+            "size": self.size,
+            "xvfb_available": self.xvfb_available,
+            "displays": [
+                {"display": d.name, "leases": d.leases, "healthy": d.is_healthy(),
+                 "uptime_s": round(time.time() - d.started_at, 1)}
+                for d in self.displays
+            ],
+            "started": self.started_count,
+            "replaced": self.replaced_count,
+            "leases_total": self.leases_total,
+        }
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.health_check()
+            except Exception as e:
+                logger.error(f"❌ Display health check failed: {e}")
+
+    async def _prune(self):
+        """Drop displays that died; browsers still attached to them get recycled by the browser pool"""
+        for display in [d for d in self.displays if not d.is_healthy()]:
+            logger.warning(f"⚠️ Xvfb display {display.name} is unhealthy; replacing it")
+            self.displays.remove(display)
+            self.replaced_count += 1
+            await _terminate(display.process)
+
+    async def _start_display(self) -> Optional[VirtualDisplay]:
+        """Start Xvfb and let it pick a free display number via -displayfd"""
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "Xvfb",
+                "-displayfd",
+                str(write_fd),
+                "-screen",
+                "0",
+                self.screen,
+                "-nolisten",
+                "tcp",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                pass_fds=(write_fd,),
+            )
+        except FileNotFoundError:
+            os.close(read_fd)
+            os.close(write_fd)
+            logger.warning("⚠️ Xvfb not available; headful jobs will fall back to headless mode")
+            self.xvfb_available = False
+            return None
+        os.close(write_fd)
+
+        # Xvfb writes the display number once it is accepting connections
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb", 0)
+        )
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=self.start_timeout)
+        except asyncio.TimeoutError:
+            line = b""
+        finally:
+            transport.close()
+
+        if not line.strip().isdigit():
+            logger.error(f"❌ Xvfb did not become ready (exit code {process.returncode})")
+            await _terminate(process)
+            return None
+
+        display = VirtualDisplay(number=int(line.strip()), process=process)
+        self.started_count += 1
+        logger.info(f"🖥️ Started pooled Xvfb on display {display.name}")
+        return display
+
+async def _terminate(process: asyncio.subprocess.Process):
+    """Stop an Xvfb process"""
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=5)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+# Global display pool for this worker process
+display_pool = DisplayPool()
@@ -0,0 +1,77 @@
+## stable element fingerprints and added/removed/changed diffs between consecutive page states
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Attributes that identify what an element is or does; class and style churn on hover and focus
+FINGERPRINT_ATTRIBUTES = ("id", "name", "type", "role", "href", "aria-label", "placeholder", "title", "alt", "for", "action")
+FINGERPRINT_TEXT_LENGTH = 100
+
+def element_fingerprint(tag_name: str, attributes: Dict[str, str] | None, text: str, path: str) -> str:
+    """Hash of tag, key attributes, text and ancestor path; equal across steps while the element is unchanged"""
+    attributes = attributes or {}
+    key_attributes = "\x1f".join(f"{name}={attributes[name]}" for name in FINGERPRINT_ATTRIBUTES if name in attributes)
+    source = "\x1e".join((tag_name, key_attributes, (text or "")[:FINGERPRINT_TEXT_LENGTH], path or ""))
+    return hashlib.blake2b(source.encode("utf-8", "replace"), digest_size=8).hexdigest()
+
+@dataclass
+class PageDiff:
+    """Elements added, removed and changed between two page states"""
+    url_changed: bool
+    added: List = field(default_factory=list)
+    removed: List = field(default_factory=list)
+    changed: List[Tuple] = field(default_factory=list)  # (before, after) pairs of the same element
+    unchanged: int = 0
+
+    def is_empty(self) -> bool:
+        return not (self.url_changed or self.added or self.removed or self.changed)
+
+    def summary(self) -> dict:
+        return {
+            "url_changed": self.url_changed,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": len(self.changed),
+            "unchanged": self.unchanged,
+        }
+
+def diff_page_states(before, after, interactive_only: bool = True) -> PageDiff:
+    """Compare two PageStates element by element.
+
+    Elements are paired by id first (the same DOM node in the same document);
+    the rest are paired by fingerprint, which catches nodes a framework re-rendered
+    with identical content.
+    """
+    if interactive_only:
+        old_elements = list(before.selector_map.values())
+        new_elements = list(after.selector_map.values())
+    else:
+        old_elements = before.elements
+        new_elements = after.elements
+
+    diff = PageDiff(url_changed=before.url != after.url)
+    old_by_id = {element.id: element for element in old_elements}
+    unmatched_new = []
+    for element in new_elements:
+        previous = old_by_id.pop(element.id, None)
+        if previous is None:
+            unmatched_new.append(element)
+        elif previous.fingerprint == element.fingerprint:
+            diff.unchanged += 1
+        else:
+            diff.changed.append((previous, element))
+
+    old_by_fingerprint: Dict[str, List] = {}
+    for element in old_by_id.values():
+        old_by_fingerprint.setdefault(element.fingerprint, []).append(element)
+    matched = set()
+    for element in unmatched_new:
+        candidates = old_by_fingerprint.get(element.fingerprint)
+        if candidates:
+            matched.add(candidates.pop(0).id)
+            diff.unchanged += 1
+        else:
+            diff.added.append(element)
+    diff.removed = [element for element in old_by_id.values() if element.id not in matched]
+    return diff
@@ -0,0 +1,141 @@
+## decoder for the packed (typed array) dom_js result format
+
+import base64
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+# dom_js returns packed columns instead of one object per element. They are base64 strings inside the
+# evaluate() JSON, not a binary transfer, so the win depends on the page and the option stays opt-in
+PACKED_TRANSFER = os.getenv("DOM_PACKED_TRANSFER", "false").lower() == "true"
+
+FLAG_CLICKABLE = 1
+FLAG_INPUT = 2
+FLAG_VISIBLE = 4
+FLAG_REUSED = 8
+
+# Order of the per-element string columns in `fields`
+FIELDS = ("tagName", "text", "path", "inputType", "placeholder")
+
+def _column(data: str, dtype: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=dtype)
+
+@dataclass
+class PackedElements:
+    """Column view of a packed dom_js result; string columns hold offsets into `strings` (-1 for null)"""
+    strings: List[str]
+    index: np.ndarray         # int32, -1 when the element has no index
+    ids: List[str]
+    flags: np.ndarray         # uint8 bitfield of FLAG_*
+    rects: np.ndarray         # float32 (n, 4): x, y, width, height
+    fields: np.ndarray        # int32 (n, len(FIELDS))
+    attr_offsets: np.ndarray  # int64 (n + 1,), row i owns attrs[attr_offsets[i]:attr_offsets[i + 1]]
+    attrs: np.ndarray         # int32 (m, 2): name, value
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def decode(cls, packed: dict) -> "PackedElements":
+        count = packed["count"]
+        keys = _column(packed["key"], "<u4")
+        token = packed["token"]
+        return cls(
+            strings=packed["strings"],
+            index=_column(packed["index"], "<i4").copy(),
+            ids=[f"element_{token}_{key}" for key in keys.tolist()],
+            flags=_column(packed["flags"], "u1").copy(),
+            rects=_column(packed["rect"], "<f4").reshape(count, 4).copy(),
+            fields=_column(packed["fields"], "<i4").reshape(count, len(FIELDS)),
+            attr_offsets=_column(packed["attrOffsets"], "<u4").astype(np.int64),
+            attrs=_column(packed["attrs"], "<i4").reshape(-1, 2),
+        )
+
+    def place(self, offset_x: float, offset_y: float, clip: tuple, first_index: int) -> "PackedElements":
+        """Move a child frame's elements into main-viewport coordinates, clip visibility and shift indices.
+
+        Like _merge_frames does for record results, unindexed elements outside the clip are dropped.
+        """
+        self.rects[:, 0] += offset_x
+        self.rects[:, 1] += offset_y
+        left, top, right, bottom = clip
+        x, y, width, height = self.rects.T
+        inside = (x < right) & (x + width > left) & (y < bottom) & (y + height > top)
+        visible = ((self.flags & FLAG_VISIBLE) != 0) & inside
+        self.flags = np.where(visible, self.flags | FLAG_VISIBLE, self.flags & ~np.uint8(FLAG_VISIBLE)).astype(np.uint8)
+        indexed = self.index >= 0
+        self.index = np.where(indexed, self.index + first_index, -1).astype(np.int32)
+        keep = indexed | visible
+        return self if keep.all() else self.take(keep)
+
+    def take(self, mask: np.ndarray) -> "PackedElements":
+        """Rows where mask is true"""
+        counts = np.diff(self.attr_offsets)
+        attr_rows = np.repeat(np.arange(len(self)), counts)
+        return PackedElements(
+            strings=self.strings,
+            index=self.index[mask],
+            ids=[element_id for element_id, kept in zip(self.ids, mask.tolist()) if kept],
+            flags=self.flags[mask],
+            rects=self.rects[mask],
+            fields=self.fields[mask],
+            attr_offsets=np.concatenate([np.zeros(1, np.int64), np.cumsum(counts[mask])]),
+            attrs=self.attrs[mask[attr_rows]],
+        )
+
+    @classmethod
+    def concat(cls, parts: List["PackedElements"]) -> "PackedElements":
+        """One column set for several frames; string references are rebased onto a joined table"""
+        strings, fields, attrs, offsets = [], [], [], [np.zeros(1, np.int64)]
+        attr_base = 0
+        for part in parts:
+            base = len(strings)
+            strings.extend(part.strings)
+            fields.append(np.where(part.fields >= 0, part.fields + base, -1))
+            attrs.append(part.attrs + base)
+            offsets.append(part.attr_offsets[1:] + attr_base)
+            attr_base += len(part.attrs)
+        return cls(
+            strings=strings,
+            index=np.concatenate([part.index for part in parts]),
+            ids=[element_id for part in parts for element_id in part.ids],
+            flags=np.concatenate([part.flags for part in parts]),
+            rects=np.concatenate([part.rects for part in parts]),
+            fields=np.concatenate(fields).astype(np.int32),
+            attr_offsets=np.concatenate(offsets),
+            attrs=np.concatenate(attrs).astype(np.int32).reshape(-1, 2),
+        )
+
+    def rows(self) -> Iterator[tuple]:
+        """Rows in the layout BrowserController._build_elements reads"""
+        # Object array with a trailing None, so -1 references resolve to null in one take
+        table = np.empty(len(self.strings) + 1, dtype=object)
+        table[:-1] = self.strings
+        table[-1] = None
+        fields = table[self.fields].tolist() if len(self) else []
+        names = table[self.attrs[:, 0]].tolist()
+        values = table[self.attrs[:, 1]].tolist()
+        offsets = self.attr_offsets.tolist()
+        for row, (index, element_id, flags, rect) in enumerate(zip(self.index.tolist(), self.ids, self.flags.tolist(),
+                                                                   self.rects.tolist())):
+            tag_name, text, path, input_type, placeholder = fields[row]
+            start, end = offsets[row], offsets[row + 1]
+            yield (
+                None if index < 0 else index, element_id, bool(flags & FLAG_REUSED), bool(flags & FLAG_VISIBLE), rect,
+                tag_name or "", text or "", dict(zip(names[start:end], values[start:end])),
+                bool(flags & FLAG_CLICKABLE), bool(flags & FLAG_INPUT), input_type, placeholder, path or "",
+            )
+
+def decode_result(result: dict) -> Optional[PackedElements]:
+    """Replace the packed payload of a dom_js result with its decoded columns, recording the decode time"""
+    packed = result.get("packed")
+    if packed is None or isinstance(packed, PackedElements):
+        return packed
+    started = time.perf_counter()
+    result["packed"] = PackedElements.decode(packed)
+    stats = result.setdefault("stats", {})
+    stats["decodeTime"] = stats.get("decodeTime", 0) + (time.perf_counter() - started) * 1000
+    return result["packed"]
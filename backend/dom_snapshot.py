@@ -0,0 +1,328 @@
+## DOM extraction engine built on CDP DOMSnapshot.captureSnapshot instead of an injected script
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DOM_ENGINES = ("js", "snapshot")
+DEFAULT_DOM_ENGINE = "js"
+
+# Computed styles requested from the snapshot, in this order; the box edges place <iframe> content
+SNAPSHOT_STYLES = [
+    "display", "visibility", "opacity", "cursor",
+    "border-left-width", "padding-left", "border-top-width", "padding-top",
+    "border-right-width", "padding-right", "border-bottom-width", "padding-bottom",
+]
+
+INTERACTIVE_TAGS = {"a", "button", "input", "select", "textarea", "label"}
+INPUT_TAGS = {"input", "textarea", "select"}
+SKIP_TAGS = {"script", "style", "noscript", "template", "head", "meta", "link"}
+
+ELEMENT_NODE = 1
+TEXT_NODE = 3
+DOCUMENT_FRAGMENT_NODE = 11
+PATH_DEPTH = 6
+MAX_TEXT = 200
+
+class PageSessions:
+    """One CDP session for the controller's page, shared by the CDP-based readers; other tabs get a throwaway one"""
+
+    def __init__(self):
+        self._page = None
+        self._session = None
+
+    async def acquire(self, page):
+        """(session, temporary); temporary sessions go back through release()"""
+        if self._page is page and self._session is not None:
+            return self._session, False
+        session = await page.context.new_cdp_session(page)
+        if self._page is None or self._page.is_closed():
+            await _detach(self._session)
+            self._page, self._session = page, session
+            return session, False
+        return session, True
+
+    async def release(self, session, temporary: bool):
+        if temporary:
+            await _detach(session)
+
+    async def close(self):
+        session, self._session, self._page = self._session, None, None
+        await _detach(session)
+
+class DOMSnapshotExtractor:
+    """Builds the same element list as dom_js from a single DOMSnapshot round trip.
+
+    Results use the dom_js result shape ({"elements": [...], "stats": {...}}) so
+    BrowserController turns both into the same PageState. Frames are included,
+    with their elements placed in main-viewport coordinates.
+    """
+
+    def __init__(self, attribute_names=None, max_attribute_length: int = 200, sessions: Optional[PageSessions] = None):
+        self.attribute_names = attribute_names
+        self.max_attribute_length = max_attribute_length
+        self.sessions = sessions or PageSessions()
+
+    async def extract(self, page) -> dict:
+        started = time.perf_counter()
+        session, temporary = await self.sessions.acquire(page)
+        try:
+            snapshot, metrics = await asyncio.gather(
+                session.send("DOMSnapshot.captureSnapshot", {"computedStyles": SNAPSHOT_STYLES}),
+                session.send("Page.getLayoutMetrics"),
+            )
+        finally:
+            await self.sessions.release(session, temporary)
+        captured = time.perf_counter()
+
+        result = parse_snapshot(snapshot, metrics, self.attribute_names, self.max_attribute_length)
+        finished = time.perf_counter()
+        result["stats"].update({
+            "captureTime": (captured - started) * 1000,
+            "parseTime": (finished - captured) * 1000,
+            "executionTime": (finished - started) * 1000,
+        })
+        return result
+
+    async def close(self):
+        await self.sessions.close()
+
+async def _detach(session):
+    if session is None:
+        return
+    try:
+        await session.detach()
+    except Exception:
+        pass
+
+def _rare_set(data: Optional[dict]) -> set:
+    return set(data.get("index", [])) if data else set()
+
+def _rare_map(data: Optional[dict]) -> Dict[int, int]:
+    return dict(zip(data.get("index", []), data.get("value", []))) if data else {}
+
+def _px(value: str) -> float:
+    try:
+        return float(value[:-2]) if value.endswith("px") else 0.0
+    except ValueError:
+        return 0.0
+
+def parse_snapshot(snapshot: dict, metrics: Optional[dict] = None, attribute_names=None,
+                   max_attribute_length: int = 200) -> dict:
+    """Turn captureSnapshot string tables into dom_js-shaped element records"""
+    strings: List[str] = snapshot.get("strings", [])
+    documents = snapshot.get("documents", [])
+
+    def string(index: int) -> str:
+        return strings[index] if 0 <= index < len(strings) else ""
+
+    metrics = metrics or {}
+    css_viewport = metrics.get("cssVisualViewport") or {}
+    device_viewport = metrics.get("visualViewport") or {}
+    viewport_width = css_viewport.get("clientWidth") or 1280
+    viewport_height = css_viewport.get("clientHeight") or 800
+    # Snapshot geometry is in device pixels
+    device_pixel_ratio = 1.0
+    if css_viewport.get("clientWidth") and device_viewport.get("clientWidth"):
+        device_pixel_ratio = device_viewport["clientWidth"] / css_viewport["clientWidth"] or 1.0
+
+    elements = []
+    node_count = 0
+    processed_count = 0
+    highlight_index = 0
+    shadow_roots = 0
+
+    # Document → (offset x, offset y, visible area left, top, right, bottom), all in main-viewport coordinates;
+    # frames are positioned at the content box of their <iframe> and clipped by it, like _merge_frames does
+    areas = {0: (0.0, 0.0, 0.0, 0.0, float(viewport_width), float(viewport_height))} if documents else {}
+    queue = [0] if documents else []
+    visited = set()
+
+    while queue:
+        doc_index = queue.pop(0)
+        if doc_index in visited or doc_index >= len(documents):
+            continue
+        visited.add(doc_index)
+        document = documents[doc_index]
+        offset_x, offset_y, clip_left, clip_top, clip_right, clip_bottom = areas[doc_index]
+        scroll_x = document.get("scrollOffsetX", 0) or 0
+        scroll_y = document.get("scrollOffsetY", 0) or 0
+
+        nodes = document.get("nodes", {})
+        layout = document.get("layout", {})
+        parent_index = nodes.get("parentIndex", [])
+        node_type = nodes.get("nodeType", [])
+        node_name = nodes.get("nodeName", [])
+        node_value = nodes.get("nodeValue", [])
+        backend_ids = nodes.get("backendNodeId", [])
+        attributes = nodes.get("attributes", [])
+        clickable = _rare_set(nodes.get("isClickable"))
+        input_values = _rare_map(nodes.get("inputValue"))
+        content_documents = _rare_map(nodes.get("contentDocumentIndex"))
+        shadow_types = _rare_map(nodes.get("shadowRootType"))
+        node_count += len(parent_index)
+
+        # Parents come before their children; closed and user-agent shadow trees are left out like in dom_js
+        children: Dict[int, List[int]] = {}
+        excluded = [False] * len(parent_index)
+        for index, parent in enumerate(parent_index):
+            if parent >= 0:
+                children.setdefault(parent, []).append(index)
+                excluded[index] = excluded[parent]
+            if index in shadow_types:
+                if string(shadow_types[index]) == "open":
+                    shadow_roots += 1
+                else:
+                    excluded[index] = True
+
+        def own_text(index: int) -> str:
+            return "".join(
+                string(node_value[child]) for child in children.get(index, ())
+                if node_type[child] == TEXT_NODE
+            ).strip()
+
+        def subtree_text(index: int) -> str:
+            parts, length, stack = [], 0, list(reversed(children.get(index, ())))
+            while stack and length < MAX_TEXT * 2:
+                child = stack.pop()
+                if node_type[child] == TEXT_NODE:
+                    value = string(node_value[child])
+                    parts.append(value)
+                    length += len(value)
+                else:
+                    stack.extend(reversed(children.get(child, ())))
+            return "".join(parts).strip()
+
+        # Ancestor path a child of each node gets, in dom_js structuralPath format
+        prefixes: Dict[int, tuple] = {-1: ()}
+
+        def path_prefix(node: int) -> tuple:
+            chain = []
+            while node not in prefixes:
+                chain.append(node)
+                node = parent_index[node]
+            prefix = prefixes[node]
+            for node in reversed(chain):
+                if node_type[node] == ELEMENT_NODE:
+                    tag = string(node_name[node]).lower()
+                    if tag == "body":
+                        prefix = ()
+                    else:
+                        raw = attributes[node] if node < len(attributes) else []
+                        element_id = next((string(raw[i + 1]) for i in range(0, len(raw) - 1, 2) if string(raw[i]) == "id"), "")
+                        prefix = (prefix + (f"{tag}#{element_id}" if element_id else tag,))[-PATH_DEPTH:]
+                elif node_type[node] != DOCUMENT_FRAGMENT_NODE:
+                    # Documents (and anything else) start a fresh path; shadow roots are transparent
+                    prefix = ()
+                prefixes[node] = prefix
+            return prefix
+
+        layout_nodes = layout.get("nodeIndex", [])
+        styles = layout.get("styles", [])
+        bounds = layout.get("bounds", [])
+
+        # Layout entries follow document order; nodes without one are not rendered (display:none)
+        for layout_index, index in enumerate(layout_nodes):
+            if node_type[index] != ELEMENT_NODE or excluded[index]:
+                continue
+            tag_name = string(node_name[index]).lower()
+            if tag_name in SKIP_TAGS or tag_name.startswith("::"):
+                continue
+
+            style = [string(value) for value in styles[layout_index]] if layout_index < len(styles) else []
+            style += [""] * (len(SNAPSHOT_STYLES) - len(style))
+            display, visibility, opacity, cursor = style[:4]
+            if display == "none" or visibility == "hidden":
+                continue
+
+            raw_attributes = attributes[index] if index < len(attributes) else []
+            attrs = {string(raw_attributes[i]): string(raw_attributes[i + 1]) for i in range(0, len(raw_attributes) - 1, 2)}
+
+            x, y, width, height = (bounds[layout_index] + [0, 0, 0, 0])[:4] if layout_index < len(bounds) else (0, 0, 0, 0)
+            left = (x - scroll_x) / device_pixel_ratio + offset_x
+            top = (y - scroll_y) / device_pixel_ratio + offset_y
+            width /= device_pixel_ratio
+            height /= device_pixel_ratio
+
+            if index in content_documents:
+                child_doc = content_documents[index]
+                border_left, padding_left, border_top, padding_top, border_right, padding_right, \
+                    border_bottom, padding_bottom = (_px(value) for value in style[4:12])
+                frame_left = left + border_left + padding_left
+                frame_top = top + border_top + padding_top
+                frame_right = left + width - border_right - padding_right
+                frame_bottom = top + height - border_bottom - padding_bottom
+                if child_doc not in areas and frame_right > frame_left and frame_bottom > frame_top:
+                    areas[child_doc] = (frame_left, frame_top, max(frame_left, clip_left), max(frame_top, clip_top),
+                                        min(frame_right, clip_right), min(frame_bottom, clip_bottom))
+                    queue.append(child_doc)
+
+            is_input = tag_name in INPUT_TAGS or attrs.get("contenteditable") in ("", "true")
+            is_interactive = (
+                is_input
+                or tag_name in INTERACTIVE_TAGS
+                or index in clickable
+                or "onclick" in attrs
+                or attrs.get("role") in ("button", "link")
+                or "tabindex" in attrs
+                or cursor == "pointer"
+            )
+            is_visible = (
+                width > 0 and height > 0 and opacity != "0"
+                and top < clip_bottom and top + height > clip_top
+                and left < clip_right and left + width > clip_left
+            )
+            if not is_visible and not is_interactive:
+                continue
+
+            processed_count += 1
+            current_index = None
+            if is_interactive:
+                current_index = highlight_index
+                highlight_index += 1
+
+            text = subtree_text(index) if current_index is not None else own_text(index)
+            value = string(input_values[index]) if index in input_values else attrs.get("value", "")
+            if value:
+                text = value
+            elif attrs.get("placeholder"):
+                text = attrs["placeholder"]
+            if tag_name == "img" and attrs.get("alt"):
+                text = attrs["alt"]
+
+            element = {
+                "index": current_index,
+                "id": f"element_{backend_ids[index] if index < len(backend_ids) else processed_count}",
+                "tagName": tag_name,
+                "xpath": "",
+                "cssSelector": "",
+                "text": text[:MAX_TEXT],
+                "path": ">".join(path_prefix(parent_index[index])),
+                "attributes": {
+                    name: value[:max_attribute_length] for name, value in attrs.items()
+                    if attribute_names is None or name in attribute_names
+                },
+                "isClickable": is_interactive,
+                "isInput": is_input,
+                "isVisible": is_visible,
+                "inputType": attrs.get("type"),
+                "placeholder": attrs.get("placeholder"),
+                "rect": [left, top, width, height],
+            }
+            elements.append(element)
+
+    return {
+        "elements": elements,
+        "stats": {
+            "engine": "snapshot",
+            "documents": len(visited),
+            "totalNodes": node_count,
+            "processedNodes": processed_count,
+            "shadowRoots": shadow_roots,
+            "interactiveElements": highlight_index,
+            "fullScan": True,
+        },
+    }
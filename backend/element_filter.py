@@ -0,0 +1,61 @@
+## drops interactive elements that duplicate or sit inside a better target, using vectorized box overlap
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from backend.dom_snapshot import INTERACTIVE_TAGS
+
+# Boxes overlapping this much (intersection over union) are the same target
+DUPLICATE_IOU = float(os.getenv("DOM_DUPLICATE_IOU", "0.9"))
+# Share of an element's box inside another target that makes it a nested duplicate
+NESTED_RATIO = 0.95
+# Boxes compared per block; each block is checked against the boxes in its vertical band
+BLOCK_SIZE = 128
+
+RANK_STYLED = 0  # only looks clickable: cursor:pointer, tabindex, onclick
+RANK_NATIVE = 1  # links, buttons, labels and ARIA buttons/links
+RANK_INPUT = 2
+
+def element_rank(tag_name: str, attributes: Optional[Dict[str, str]], is_input: bool) -> int:
+    """How strong a target an interactive element is; weaker duplicates are dropped"""
+    if is_input:
+        return RANK_INPUT
+    if tag_name in INTERACTIVE_TAGS or (attributes or {}).get("role") in ("button", "link"):
+        return RANK_NATIVE
+    return RANK_STYLED
+
+def redundant_elements(rects: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """Mask of elements another one makes redundant, for rects (x, y, width, height) in document order.
+
+    An element goes when an overlapping box of the same target ranks higher (or equal
+    and earlier, i.e. its ancestor), or when it only looks clickable and lies inside a
+    native target, like a cursor:pointer span inside a link.
+    """
+    count = len(rects)
+    redundant = np.zeros(count, dtype=bool)
+    if count < 2:
+        return redundant
+    x0, y0 = rects[:, 0], rects[:, 1]
+    x1, y1 = x0 + rects[:, 2], y0 + rects[:, 3]
+    area = rects[:, 2] * rects[:, 3]
+    valid = np.flatnonzero(area > 0)
+
+    # Blocks of boxes sorted by top edge only meet the few boxes in their vertical band
+    by_top = valid[np.argsort(y0[valid], kind="stable")]
+    for start in range(0, len(by_top), BLOCK_SIZE):
+        rows = by_top[start:start + BLOCK_SIZE]
+        band = valid[(y0[valid] < y1[rows].max()) & (y1[valid] > y0[rows].min())]
+        width = np.minimum(x1[rows, None], x1[band]) - np.maximum(x0[rows, None], x0[band])
+        height = np.minimum(y1[rows, None], y1[band]) - np.maximum(y0[rows, None], y0[band])
+        intersection = np.clip(width, 0, None) * np.clip(height, 0, None)
+        iou = intersection / (area[rows, None] + area[band] - intersection)
+        inside = intersection / area[rows, None]
+
+        rank, other_rank = ranks[rows, None], ranks[band][None, :]
+        better = (other_rank > rank) | ((other_rank == rank) & (band[None, :] < rows[:, None]))
+        duplicate = (iou >= DUPLICATE_IOU) & better
+        nested = (rank == RANK_STYLED) & (other_rank > RANK_STYLED) & (inside >= NESTED_RATIO)
+        redundant[rows] = (duplicate | nested).any(axis=1)
+    return redundant
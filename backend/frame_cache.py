@@ -0,0 +1,92 @@
+## per-step cache of the page's screenshot, shared by anti-bot checks, captcha solving, page state and clients
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Identity of what is on screen: the document (its time origin is unique per navigation),
+# its DOM mutation count from the settle observer, and the scroll position
+FRAME_KEY_JS = """() => [
+    performance.timeOrigin,
+    window.__bpSettle ? window.__bpSettle.mutations : -1,
+    window.scrollX, window.scrollY
+]"""
+
+# Size of the image the anti-bot check looks at
+ANTI_BOT_SIZE = (1024, 768)
+
+def resized(image_bytes: bytes, max_size: Tuple[int, int], quality: int = 80) -> bytes:
+    """JPEG of an image scaled down to fit max_size (re-encoded even if it already fits)"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    height, width = image.shape[:2]
+    scale = min(1.0, max_size[0] / width, max_size[1] / height)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode resized screenshot")
+    return encoded.tobytes()
+
+@dataclass
+class Frame:
+    """One capture of a page and the variants derived from it, each built on first use"""
+    page: Any
+    key: Optional[tuple]
+    image: bytes
+    scale: float
+    _derived: Dict[str, asyncio.Task] = field(default_factory=dict)
+
+    async def derive(self, name: str, build: Callable[[bytes], Any]) -> Any:
+        """Result of build(image), computed once however many consumers ask; sync builds run in a worker thread"""
+        if name not in self._derived:
+            if asyncio.iscoroutinefunction(build):
+                self._derived[name] = asyncio.ensure_future(build(self.image))
+            else:
+                self._derived[name] = asyncio.ensure_future(asyncio.to_thread(build, self.image))
+        return await self._derived[name]
+
+class FrameCache:
+    """Holds the last frame of a page until its navigation, DOM mutation count or scroll position changes"""
+
+    def __init__(self):
+        self._frame: Optional[Frame] = None
+        self._lock = asyncio.Lock()
+        self.captures = 0
+        self.hits = 0
+
+    def invalidate(self):
+        """Forget the frame, for changes the key does not see (typed values, focus, hover)"""
+        self._frame = None
+
+    async def get(self, page, capture: Callable[[Any], Awaitable[Tuple[bytes, float]]]) -> Frame:
+        """The page's current frame, captured with capture(page) only if the cached one is stale"""
+        async with self._lock:
+            try:
+                key = tuple(await page.evaluate(FRAME_KEY_JS))
+            except Exception:
+                # Mid-navigation; capture whatever is there but never reuse it
+                key = None
+            if key is not None and key[1] < 0:
+                # No mutation observer in this document, changes would go unnoticed
+                key = None
+
+            frame = self._frame
+            if frame is not None and key is not None and frame.page is page and frame.key == key:
+                self.hits += 1
+                logger.debug("🖼️ Reusing the frame captured earlier this step")
+                return frame
+
+            image, scale = await capture(page)
+            self.captures += 1
+            self._frame = Frame(page, key, image, scale)
+            return self._frame
+
+    def get_stats(self) -> dict:
+        return {"captures": self.captures, "hits": self.hits}
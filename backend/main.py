@@ -1,10 +1,22 @@
 import asyncio, json, os, uuid, shutil, base64
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, UploadFile, Form
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, UploadFile, Form, HTTPException
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from pathlib import Path
 from backend.smart_browser_controller import SmartBrowserController  # Updated import
 from backend.proxy_manager import SmartProxyManager  # Updated import
+from backend.browser_pool import browser_pool
+from backend.playwright_driver import playwright_driver
+from backend.display_pool import display_pool
+from backend.resource_blocker import RESOURCE_PROFILES
+from backend.resource_watchdog import watchdog_registry
+from backend.tab_explorer import MAX_TABS_LIMIT
+from backend.storage_state_cache import storage_state_cache
+from backend.asset_cache import asset_cache
+from backend.cpu_pool import cpu_pool
+from backend.screenshot_store import screenshot_store
+from backend.dom_snapshot import DOM_ENGINES
+from backend.ax_tree import PAGE_REPRESENTATIONS
 from backend.agent import run_agent
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -39,6 +51,11 @@ class JobRequest(BaseModel):
     enable_streaming: bool = False
     storage_location: str | None = None
     include_images: bool = False
+    resource_profile: str = "none" # none | trackers | lean | text
+    max_tabs: int = 3 # parallel tabs for link exploration, 1 disables it
+    asset_cache: bool = False # serve static assets from the shared disk cache
+    dom_engine: str = "js" # js | snapshot (CDP DOMSnapshot)
+    page_representation: str = "dom" # dom | ax (accessibility tree) element list in the prompt
 
 async def store_job_info(job_id: str, info: dict):
     """Store job information for later retrieval"""
@@ -92,6 +109,23 @@ async def create_job(req: JobRequest):
         print(f"⚠️ Invalid format '{req.format}', defaulting to 'txt'")
         req.format = "txt"
     
+    if req.resource_profile not in RESOURCE_PROFILES:
+        print(f"⚠️ Invalid resource profile '{req.resource_profile}', defaulting to 'none'")
+        req.resource_profile = "none"
+    
+    if not 1 <= req.max_tabs <= MAX_TABS_LIMIT:
+        clamped = max(1, min(req.max_tabs, MAX_TABS_LIMIT))
+        print(f"⚠️ max_tabs {req.max_tabs} out of range, using {clamped}")
+        req.max_tabs = clamped
+    
+    if req.dom_engine not in DOM_ENGINES:
+        print(f"⚠️ Invalid DOM engine '{req.dom_engine}', defaulting to 'js'")
+        req.dom_engine = "js"
+    
+    if req.page_representation not in PAGE_REPRESENTATIONS:
+        print(f"⚠️ Invalid page representation '{req.page_representation}', defaulting to 'dom'")
+        req.page_representation = "dom"
+    
     job_id = str(uuid.uuid4())
     
     # Use smart proxy manager to get the best available proxy
@@ -105,6 +139,11 @@ async def create_job(req: JobRequest):
     print(f"📡 Streaming: {req.enable_streaming}")
     print(f"🗂️ Storage preference: {req.storage_location or 'Descargar al finalizar'}")
     print(f"🖼️ Include images in PDF: {req.include_images}")
+    print(f"🚧 Resource profile: {req.resource_profile}")
+    print(f"🗂️ Max tabs: {req.max_tabs}")
+    print(f"📦 Shared asset cache: {req.asset_cache}")
+    print(f"🧬 DOM engine: {req.dom_engine}")
+    print(f"♿ Page representation: {req.page_representation}")
     print(f"🔄 Selected proxy: {proxy.get('server', 'None') if proxy else 'None'}")
     
     # Get initial proxy stats
@@ -121,6 +160,11 @@ async def create_job(req: JobRequest):
         req.enable_streaming,
         req.storage_location,
         req.include_images,
+        req.resource_profile,
+        req.max_tabs,
+        req.asset_cache,
+        req.dom_engine,
+        req.page_representation,
     )
     tasks[job_id] = asyncio.create_task(coro)
     
@@ -203,6 +247,10 @@ async def stream_ws(websocket: WebSocket, job_id: str):
                 message = await asyncio.wait_for(websocket.receive_text(), timeout=30)
                 data = json.loads(message)
 
+                if data['type'] in ('mouse', 'keyboard'):
+                    # Sessions without an agent loop recycle between remote input events
+                    await browser_ctrl.recycle_if_requested()
+
                 if data['type'] == 'mouse':
                     await browser_ctrl.handle_mouse_event(data)
                 elif data['type'] == 'keyboard':
@@ -237,6 +285,7 @@ async def create_streaming_session(job_id: str):
         
         # Create smart browser controller with streaming enabled
         browser_ctrl = SmartBrowserController(headless=False, proxy=proxy, enable_streaming=True)
+        browser_ctrl.watchdog.label = job_id
         await browser_ctrl.__aenter__()
         await browser_ctrl.start_streaming(quality=80)
         streaming_sessions[job_id] = browser_ctrl
@@ -365,6 +414,29 @@ def get_job_info(job_id: str):
     else:
         return {"error": "Job not found", "job_id": job_id}
 
+@app.get("/job/{job_id}/screenshots")
+def list_job_screenshots(job_id: str):
+    """References (URLs, sizes) of a job's stored screenshots"""
+    return {"job_id": job_id, "screenshots": screenshot_store.references(job_id)}
+
+@app.get("/job/{job_id}/screenshots/{digest}")
+def get_job_screenshot(job_id: str, digest: str):
+    """A stored screenshot; content-addressed, so it never changes"""
+    return _screenshot_response(job_id, digest, thumbnail=False)
+
+@app.get("/job/{job_id}/screenshots/{digest}/thumbnail")
+def get_job_screenshot_thumbnail(job_id: str, digest: str):
+    """Small JPEG thumbnail of a stored screenshot"""
+    return _screenshot_response(job_id, digest, thumbnail=True)
+
+def _screenshot_response(job_id: str, digest: str, thumbnail: bool):
+    stored = screenshot_store.get(job_id, digest, thumbnail)
+    if stored is None or not stored[0].exists():
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    path, media_type = stored
+    return FileResponse(path=path, media_type=media_type,
+                        headers={"Cache-Control": "private, max-age=31536000, immutable"})
+
 @app.get("/proxy/stats")
 def get_proxy_stats():
     """Get current proxy pool statistics"""
@@ -374,6 +446,54 @@ def get_proxy_stats():
         "timestamp": asyncio.get_event_loop().time()
     }
 
+@app.get("/browser/pool/stats")
+def get_browser_pool_stats():
+    """Get warm browser pool statistics (size, lease wait times, recycles)"""
+    return {
+        "pool_stats": browser_pool.get_stats(),
+        "driver_stats": playwright_driver.get_stats(),
+        "display_stats": display_pool.get_stats(),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+
+@app.get("/browser/watchdog/stats")
+def get_browser_watchdog_stats():
+    """Get renderer memory, browser RSS, crashes and context recycles of running sessions"""
+    return {
+        "watchdog_stats": watchdog_registry.get_stats(),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+
+@app.get("/storage/cache/stats")
+def get_storage_cache_stats():
+    """Get per-site cookie/localStorage cache statistics"""
+    return {
+        "storage_cache_stats": storage_state_cache.get_stats(),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+
+@app.delete("/storage/cache")
+def clear_storage_cache():
+    """Forget all cached cookies and localStorage"""
+    storage_state_cache.clear()
+    return {"success": True, "message": "Storage state cache cleared"}
+
+@app.get("/asset/cache/stats")
+def get_asset_cache_stats():
+    """Get shared static asset cache statistics (size, hit rate, bytes saved)"""
+    return {
+        "asset_cache_stats": asset_cache.get_stats(),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+
+@app.get("/cpu/pool/stats")
+def get_cpu_pool_stats():
+    """Get CPU worker pool statistics (queue depth, per-stage CPU time)"""
+    return {
+        "cpu_pool_stats": cpu_pool.get_stats(),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+
 @app.post("/proxy/reload")
 def reload_proxies():
     """Reload proxy list from environment"""
@@ -417,12 +537,30 @@ async def register_streaming_session(job_id: str, browser_ctrl):
         "streaming": stream_info
     })
 
+# Warm the browser pool on startup
+@app.on_event("startup")
+async def warm_browser_pool():
+    """Pre-launch pooled browsers so the first jobs skip Chromium cold start"""
+    try:
+        await display_pool.start()
+        await browser_pool.start()
+    except Exception as e:
+        print(f"⚠️ Browser pool warm-up failed, browsers will launch on demand: {e}")
+
 # Cleanup on shutdown
 @app.on_event("shutdown")
 async def cleanup():
     """Cleanup resources on shutdown"""
     print("🧹 Cleaning up resources...")
     
+    # Stop running jobs so their browser contexts go back to the pool
+    running = [task for task in tasks.values() if not task.done()]
+    for task in running:
+        task.cancel()
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+        print(f"✅ Cancelled {len(running)} running jobs")
+    
     # Cleanup streaming sessions
     for job_id, browser_ctrl in streaming_sessions.items():
         try:
@@ -434,6 +572,15 @@ async def cleanup():
     streaming_sessions.clear()
     job_info.clear()
     
+    # Close pooled browsers, then the shared Playwright driver they were multiplexed over
+    print(f"📊 Final browser pool stats: {browser_pool.get_stats()}")
+    await browser_pool.close()
+    await playwright_driver.shutdown()
+    await display_pool.close()
+    
+    print(f"📊 Final CPU pool stats: {cpu_pool.get_stats()}")
+    await cpu_pool.close()
+    
     # Print final proxy stats
     final_stats = smart_proxy_manager.get_proxy_stats()
     print(f"📊 Final proxy stats: {final_stats}")
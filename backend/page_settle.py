@@ -0,0 +1,177 @@
+## event-driven detection of when a page has settled after navigation or an action
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Ceiling for a single settle wait and the DOM quiet window that counts as settled
+SETTLE_TIMEOUT = float(os.getenv("PAGE_SETTLE_TIMEOUT", "3"))
+SETTLE_QUIET_MS = int(os.getenv("PAGE_SETTLE_QUIET_MS", "300"))
+# Requests open longer than this are treated as long-polls and no longer block settling
+LONG_REQUEST_SECONDS = float(os.getenv("PAGE_SETTLE_LONG_REQUEST", "5"))
+# Streaming connections never finish, so they never count as in-flight
+IGNORED_RESOURCE_TYPES = {"websocket", "eventsource", "ping"}
+
+# Also records what changed so the DOM extractor can re-scan only those regions:
+# dirty holds subtree roots to re-scan, touched holds elements whose own text changed
+_INSTALL_OBSERVER_JS = """
+    if (!window.__bpSettle) {
+        const MAX_DIRTY = 1000;
+        const state = {
+            lastMutation: performance.now(), mutations: 0,
+            dirty: new Set(), touched: new Set(), dirtyOverflow: false
+        };
+        const mark = (set, node) => {
+            if (!node) return;
+            if (set.size >= MAX_DIRTY) { state.dirtyOverflow = true; return; }
+            set.add(node);
+        };
+        state.collect = records => {
+            for (const record of records) {
+                if (record.type === 'attributes') {
+                    mark(state.dirty, record.target);
+                } else if (record.type === 'characterData') {
+                    mark(state.touched, record.target.parentElement);
+                } else {
+                    mark(state.touched, record.target.nodeType === 1 ? record.target : record.target.parentElement);
+                    for (const node of record.addedNodes) {
+                        if (node.nodeType === 1) mark(state.dirty, node);
+                    }
+                }
+            }
+        };
+        state.observer = new MutationObserver(records => {
+            state.lastMutation = performance.now();
+            state.mutations += records.length;
+            state.collect(records);
+        });
+        window.__bpSettle = state;
+        state.observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+    }
+"""
+
+# Installed on every document of a context so the quiet window is measured from the last real mutation
+SETTLE_INIT_JS = "(() => {" + _INSTALL_OBSERVER_JS + "})();"
+
+# Resolves once the DOM has been quiet for quietMs with no finite animations running, or at timeoutMs
+WAIT_FOR_QUIET_JS = """
+async ({ quietMs, timeoutMs }) => {
+""" + _INSTALL_OBSERVER_JS + """
+    const state = window.__bpSettle;
+    const started = performance.now();
+
+    function runningAnimations() {
+        if (!document.getAnimations) return 0;
+        return document.getAnimations().filter(animation => {
+            if (animation.playState !== 'running' || !animation.effect) return false;
+            // Infinite loaders and carousels would never finish; only wait for finite transitions
+            return Number.isFinite(animation.effect.getComputedTiming().endTime);
+        }).length;
+    }
+
+    while (true) {
+        const now = performance.now();
+        const domQuiet = now - state.lastMutation >= quietMs && document.readyState !== 'loading';
+        if (domQuiet && runningAnimations() === 0) {
+            return { settled: true, waited: now - started, mutations: state.mutations };
+        }
+        if (now - started >= timeoutMs) {
+            return { settled: false, waited: now - started, mutations: state.mutations };
+        }
+        await new Promise(resolve => setTimeout(resolve, 50));
+    }
+}
+"""
+
+@dataclass
+class SettleResult:
+    waited_ms: float
+    settled: bool
+
+class NetworkIdleTracker:
+    """Tracks in-flight requests of a page from Playwright request events"""
+
+    def __init__(self, page):
+        self._inflight = {}
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def _on_request(self, request):
+        if request.resource_type in IGNORED_RESOURCE_TYPES:
+            return
+        if "text/event-stream" in request.headers.get("accept", ""):
+            # Server-sent events opened with fetch() are streams too
+            return
+        self._inflight[request] = time.monotonic()
+
+    def _on_done(self, request):
+        self._inflight.pop(request, None)
+
+    def pending(self) -> int:
+        """Requests still blocking settle (long-polls excluded)"""
+        cutoff = time.monotonic() - LONG_REQUEST_SECONDS
+        # Long-polls and streams may never finish; forget them once they pass the cutoff
+        stale = [request for request, started in self._inflight.items() if started <= cutoff]
+        for request in stale:
+            del self._inflight[request]
+        return len(self._inflight)
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no blocking request is in flight; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+class PageSettleDetector:
+    def __init__(self, page, quiet_ms: int = SETTLE_QUIET_MS):
+        self.page = page
+        self.quiet_ms = quiet_ms
+        self.network = NetworkIdleTracker(page)
+
+    async def wait(self, timeout: float = SETTLE_TIMEOUT) -> SettleResult:
+        """Return as soon as the network is idle and the DOM is quiet, or when timeout is reached"""
+        started = time.monotonic()
+        deadline = started + timeout
+        settled = False
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not await self.network.wait_idle(remaining):
+                break
+
+            remaining = deadline - time.monotonic()
+            try:
+                result = await self.page.evaluate(
+                    WAIT_FOR_QUIET_JS, {"quietMs": self.quiet_ms, "timeoutMs": max(remaining * 1000, 0)}
+                )
+            except Exception:
+                # A navigation destroyed the execution context; wait for the new document and retry
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await self.page.wait_for_load_state("domcontentloaded", timeout=remaining * 1000)
+                except Exception:
+                    break
+                continue
+
+            if not result.get("settled"):
+                break
+            if not self.network.pending():
+                settled = True
+                break
+
+        waited_ms = (time.monotonic() - started) * 1000
+        if not settled:
+            logger.info(f"⏱️ Page did not settle within {timeout:.1f}s")
+        return SettleResult(waited_ms=round(waited_ms, 1), settled=settled)
@@ -0,0 +1,69 @@
+## single reference-counted Playwright driver shared by everything in a worker process
+
+import asyncio
+import logging
+
+from playwright.async_api import async_playwright, Playwright
+
+logger = logging.getLogger(__name__)
+
+class PlaywrightDriver:
+    """Owns the one Playwright node driver subprocess of this worker process.
+
+    Browser pools and controllers acquire a reference while they need the
+    driver and release it when done; the subprocess is stopped when the last
+    reference goes away or when the app shuts down.
+    """
+
+    def __init__(self):
+        self.play: Playwright | None = None
+        self.refs = 0
+        self.starts = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> Playwright:
+        """Take a reference, starting the driver if this is the first one"""
+        async with self._lock:
+            if self.play is None:
+                self.play = await async_playwright().start()
+                self.starts += 1
+                logger.info("🎭 Playwright driver started")
+            self.refs += 1
+            return self.play
+
+    async def release(self):
+        """Drop a reference, stopping the driver when nothing uses it anymore"""
+        async with self._lock:
+            if self.refs > 0:
+                self.refs -= 1
+            if self.refs == 0:
+                await self._stop()
+
+    async def shutdown(self):
+        """Stop the driver regardless of outstanding references"""
+        async with self._lock:
+            if self.refs:
+                logger.warning(f"⚠️ Stopping Playwright driver with {self.refs} references still held")
+            self.refs = 0
+            await self._stop()
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.play is not None,
+            "references": self.refs,
+            "starts": self.starts,
+        }
+
+    async def _stop(self):
+        if self.play is None:
+            return
+        try:
+            await self.play.stop()
+            logger.info("🛑 Playwright driver stopped")
+        except Exception as e:
+            logger.warning(f"⚠️ Error stopping Playwright driver: {e}")
+        finally:
+            self.play = None
+
+# Global driver for this worker process
+playwright_driver = PlaywrightDriver()
@@ -103,14 +103,16 @@ class SmartProxyManager:
         
         return sorted_proxies[0]
     
-    async def detect_anti_bot_with_vision(self, page, goal: str) -> Tuple[bool, str, Optional[str]]:
-        """Use vision model to detect anti-bot systems"""
+    async def detect_anti_bot_with_vision(self, page, goal: str,
+                                          screenshot_bytes: Optional[bytes] = None) -> Tuple[bool, str, Optional[str]]:
+        """Use vision model to detect anti-bot systems (on the given screenshot, or a new one of the page)"""
         if not self.vision_model:
             return False, "", None
         
         try:
             # Take screenshot for vision analysis
-            screenshot_bytes = await page.screenshot(type='png')
+            if screenshot_bytes is None:
+                screenshot_bytes = await page.screenshot(type='png')
             screenshot_b64 = base64.b64encode(screenshot_bytes).decode('utf-8')
             
             # Get page content for context
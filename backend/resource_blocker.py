@@ -0,0 +1,159 @@
+## per-job request interception that blocks heavy resource types and third-party trackers
+
+import logging
+from collections import Counter
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Resource types blocked by each profile; trackers are blocked by every profile except "none"
+RESOURCE_PROFILES = {
+    "none": {"block_types": frozenset(), "block_trackers": False},
+    "trackers": {"block_types": frozenset(), "block_trackers": True},
+    "lean": {"block_types": frozenset({"font", "media"}), "block_trackers": True},
+    "text": {"block_types": frozenset({"image", "font", "media"}), "block_trackers": True},
+}
+
+DEFAULT_PROFILE = "none"
+
+# Local list of analytics, ad and tag-manager hosts; subdomains match too
+TRACKER_DOMAINS = frozenset({
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "analytics.google.com",
+    "connect.facebook.net",
+    "facebook.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "hotjar.com",
+    "hotjar.io",
+    "mixpanel.com",
+    "segment.com",
+    "segment.io",
+    "amplitude.com",
+    "fullstory.com",
+    "mouseflow.com",
+    "crazyegg.com",
+    "clarity.ms",
+    "newrelic.com",
+    "nr-data.net",
+    "optimizely.com",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "adnxs.com",
+    "amazon-adsystem.com",
+    "ads-twitter.com",
+    "analytics.twitter.com",
+    "bat.bing.com",
+    "snap.licdn.com",
+    "px.ads.linkedin.com",
+    "tiktok-analytics.com",
+    "mc.yandex.ru",
+    "chartbeat.com",
+    "chartbeat.net",
+    "parsely.com",
+    "moatads.com",
+    "rubiconproject.com",
+    "pubmatic.com",
+    "openx.net",
+    "casalemedia.com",
+    "adsrvr.org",
+    "bluekai.com",
+    "krxd.net",
+    "demdex.net",
+    "omtrdc.net",
+    "everesttech.net",
+    "onetrust.com",
+    "cookielaw.org",
+})
+
+# Typical transfer sizes, used to estimate what a request we never made would have cost
+ESTIMATED_BYTES = {
+    "image": 45_000,
+    "media": 500_000,
+    "font": 35_000,
+    "script": 25_000,
+    "stylesheet": 15_000,
+    "xhr": 3_000,
+    "fetch": 3_000,
+    "document": 30_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+def is_tracker_host(host: str) -> bool:
+    """Check a hostname (or any of its parent domains) against the tracker list"""
+    labels = host.lower().split(".")
+    return any(".".join(labels[i:]) in TRACKER_DOMAINS for i in range(len(labels) - 1))
+
+class ResourceBlocker:
+    def __init__(self, profile: str = DEFAULT_PROFILE, allow_images: bool = False):
+        if profile not in RESOURCE_PROFILES:
+            logger.warning(f"⚠️ Unknown resource profile '{profile}', using '{DEFAULT_PROFILE}'")
+            profile = DEFAULT_PROFILE
+        self.profile = profile
+        settings = RESOURCE_PROFILES[profile]
+        self.block_trackers = settings["block_trackers"]
+        self.block_types = set(settings["block_types"])
+        if allow_images:
+            # PDF output with images needs them downloaded
+            self.block_types.discard("image")
+
+        self.requests_seen = 0
+        self.requests_blocked = 0
+        self.estimated_bytes_saved = 0
+        self.blocked_by_type = Counter()
+        self.blocked_trackers = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.block_trackers or bool(self.block_types)
+
+    async def attach(self, context):
+        """Intercept every request made by the context"""
+        if self.enabled:
+            await context.route("**/*", self._handle_route)
+
+    def _block_reason(self, request) -> str | None:
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            # Never block the page the agent asked for
+            return None
+        if request.resource_type in self.block_types:
+            return request.resource_type
+        if self.block_trackers and is_tracker_host(urlparse(request.url).hostname or ""):
+            return "tracker"
+        return None
+
+    async def _handle_route(self, route):
+        request = route.request
+        self.requests_seen += 1
+        reason = self._block_reason(request)
+        if reason is None:
+            await route.fallback()
+            return
+
+        self.requests_blocked += 1
+        self.blocked_by_type[request.resource_type] += 1
+        if reason == "tracker":
+            self.blocked_trackers += 1
+        self.estimated_bytes_saved += ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+        await route.abort("blockedbyclient")
+
+    def get_stats(self) -> dict:
+        """Requests and (estimated) bytes saved for this job"""
+        return {
+            "profile": self.profile,
+            "blocked_types": sorted(self.block_types),
+            "block_trackers": self.block_trackers,
+            "requests_seen": self.requests_seen,
+            "requests_blocked": self.requests_blocked,
+            "trackers_blocked": self.blocked_trackers,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+        }
@@ -0,0 +1,280 @@
+## per-controller watchdog that samples Chromium memory and asks for a recycle of contexts that grow too large or crash
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "true").lower() == "true"
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "10"))
+# Per-page limits come from Performance.getMetrics of the job's page
+MAX_JS_HEAP_MB = float(os.getenv("WATCHDOG_MAX_JS_HEAP_MB", "512"))
+MAX_DOM_NODES = int(os.getenv("WATCHDOG_MAX_DOM_NODES", "200000"))
+# The browser RSS is sampled here for reporting only; BrowserPool enforces its limit for all tenants
+MAX_BROWSER_RSS_MB = float(os.getenv("WATCHDOG_MAX_BROWSER_RSS_MB", "2048"))
+
+MB = 1024 * 1024
+# Limits that only concern the job's own page; a fresh context on the same browser fixes them
+PAGE_LIMIT_REASONS = ("js_heap", "dom_nodes")
+
+@dataclass
+class ResourceSample:
+    """One watchdog reading of a controller's page and browser"""
+    timestamp: float = field(default_factory=time.time)
+    js_heap_used_mb: float = 0.0
+    js_heap_total_mb: float = 0.0
+    dom_nodes: int = 0
+    event_listeners: int = 0
+    documents: int = 0
+    browser_rss_mb: Optional[float] = None
+    browser_processes: int = 0
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a local process from /proc, None when it is not readable"""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+class ResourceWatchdog:
+    """Samples a controller's page and browser and requests a context recycle past the limits.
+
+    The recycle itself runs in the job's own loop between steps (controller.recycle_if_requested),
+    never from this background task, so it cannot swap the page under a running action.
+    """
+
+    def __init__(self, controller, interval: float = WATCHDOG_INTERVAL):
+        self.controller = controller
+        self.interval = interval
+        self.label = f"session-{id(controller):x}"
+        self.last_sample: Optional[ResourceSample] = None
+        self.peak_js_heap_mb = 0.0
+        self.peak_browser_rss_mb = 0.0
+        self.samples = 0
+        self.sample_errors = 0
+        self.recycles = Counter()
+        self.crashes = 0
+
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._crashed = False
+        self._page = None
+        self._page_cdp = None
+        self._browser = None
+        self._browser_cdp = None
+
+    async def start(self):
+        """Begin periodic sampling of the controller"""
+        if not WATCHDOG_ENABLED:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        watchdog_registry.register(self)
+
+    async def stop(self):
+        """Stop sampling and detach the watchdog's CDP sessions"""
+        watchdog_registry.unregister(self)
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self._detach_page()
+        await self._detach_browser()
+
+    def watch_page(self, page):
+        """Get notified immediately when the renderer of a page crashes"""
+        page.on("crash", lambda _: self._on_crash(page))
+
+    def _on_crash(self, page):
+        if page is self.controller.page:
+            logger.error(f"💥 Renderer crashed for {self.label}")
+            self._crashed = True
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Watchdog check failed for {self.label}: {e}")
+
+    async def check(self) -> Optional[str]:
+        """Sample once and request a recycle when the page crashed or a limit was exceeded; returns the reason"""
+        controller = self.controller
+        if controller.page is None or controller.recycle_requested:
+            return None
+
+        reason = None
+        if self._crashed or controller.page.is_closed():
+            reason = "crash"
+        elif controller.browser is not None and not controller.browser.is_connected():
+            reason = "browser_disconnected"
+        else:
+            sample = await self.sample()
+            if sample:
+                reason = self._limit_exceeded(sample)
+
+        if reason:
+            await self._detach_page()
+            await self._detach_browser()
+            controller.request_recycle(reason, new_browser=reason not in PAGE_LIMIT_REASONS)
+        return reason
+
+    def recycled(self, reason: str):
+        """Called by the controller once a requested recycle has run"""
+        if reason in ("crash", "browser_disconnected"):
+            self.crashes += 1
+        self.recycles[reason] += 1
+        self._crashed = False
+
+    async def sample(self) -> Optional[ResourceSample]:
+        """Read Performance.getMetrics of the page and the RSS of the browser processes"""
+        try:
+            metrics = await self._page_metrics()
+        except Exception as e:
+            self.sample_errors += 1
+            logger.warning(f"⚠️ Could not read page metrics for {self.label}: {e}")
+            await self._detach_page()
+            return None
+
+        sample = ResourceSample(
+            js_heap_used_mb=round(metrics.get("JSHeapUsedSize", 0) / MB, 1),
+            js_heap_total_mb=round(metrics.get("JSHeapTotalSize", 0) / MB, 1),
+            dom_nodes=int(metrics.get("Nodes", 0)),
+            event_listeners=int(metrics.get("JSEventListeners", 0)),
+            documents=int(metrics.get("Documents", 0)),
+        )
+
+        try:
+            pids = await self._browser_pids()
+        except Exception:
+            # Non-Chromium or remote browsers expose no process info
+            pids = []
+            await self._detach_browser()
+        rss = [read_rss_mb(pid) for pid in pids]
+        rss = [value for value in rss if value is not None]
+        if rss:
+            sample.browser_rss_mb = round(sum(rss), 1)
+            sample.browser_processes = len(rss)
+            self.peak_browser_rss_mb = max(self.peak_browser_rss_mb, sample.browser_rss_mb)
+
+        self.samples += 1
+        self.peak_js_heap_mb = max(self.peak_js_heap_mb, sample.js_heap_used_mb)
+        self.last_sample = sample
+        return sample
+
+    def _limit_exceeded(self, sample: ResourceSample) -> Optional[str]:
+        if sample.js_heap_used_mb > MAX_JS_HEAP_MB:
+            logger.warning(f"🐘 {self.label}: JS heap {sample.js_heap_used_mb}MB over {MAX_JS_HEAP_MB}MB")
+            return "js_heap"
+        if sample.dom_nodes > MAX_DOM_NODES:
+            logger.warning(f"🐘 {self.label}: {sample.dom_nodes} DOM nodes over {MAX_DOM_NODES}")
+            return "dom_nodes"
+        return None
+
+    async def _page_metrics(self) -> Dict[str, float]:
+        page = self.controller.page
+        if self._page_cdp is None or self._page is not page:
+            await self._detach_page()
+            self._page_cdp = await page.context.new_cdp_session(page)
+            self._page = page
+            await self._page_cdp.send("Performance.enable")
+        result = await self._page_cdp.send("Performance.getMetrics")
+        return {metric["name"]: metric["value"] for metric in result.get("metrics", [])}
+
+    async def _browser_pids(self) -> list:
+        browser = self.controller.browser
+        if browser is None:
+            return []
+        if self._browser_cdp is None or self._browser is not browser:
+            await self._detach_browser()
+            self._browser_cdp = await browser.new_browser_cdp_session()
+            self._browser = browser
+        result = await self._browser_cdp.send("SystemInfo.getProcessInfo")
+        return [info["id"] for info in result.get("processInfo", [])]
+
+    async def _detach_page(self):
+        session, self._page_cdp, self._page = self._page_cdp, None, None
+        if session:
+            try:
+                await session.detach()
+            except Exception:
+                pass
+
+    async def _detach_browser(self):
+        session, self._browser_cdp, self._browser = self._browser_cdp, None, None
+        if session:
+            try:
+                await session.detach()
+            except Exception:
+                pass
+
+    def get_stats(self) -> dict:
+        return {
+            "label": self.label,
+            "url": self.controller.page.url if self.controller.page else None,
+            "last_sample": asdict(self.last_sample) if self.last_sample else None,
+            "peak_js_heap_mb": self.peak_js_heap_mb,
+            "peak_browser_rss_mb": self.peak_browser_rss_mb,
+            "samples": self.samples,
+            "sample_errors": self.sample_errors,
+            "crashes": self.crashes,
+            "recycles": dict(self.recycles),
+        }
+
+class WatchdogRegistry:
+    """Tracks the live watchdogs of this worker so operators can read their metrics"""
+
+    def __init__(self):
+        self.watchdogs: Dict[int, ResourceWatchdog] = {}
+        self.recycles_total = Counter()
+        self.crashes_total = 0
+
+    def register(self, watchdog: ResourceWatchdog):
+        self.watchdogs[id(watchdog)] = watchdog
+
+    def unregister(self, watchdog: ResourceWatchdog):
+        if self.watchdogs.pop(id(watchdog), None) is not None:
+            # Keep the totals of finished sessions
+            self.recycles_total.update(watchdog.recycles)
+            self.crashes_total += watchdog.crashes
+
+    def get_stats(self) -> dict:
+        live = list(self.watchdogs.values())
+        recycles = Counter(self.recycles_total)
+        for watchdog in live:
+            recycles.update(watchdog.recycles)
+        return {
+            "enabled": WATCHDOG_ENABLED,
+            "interval_s": WATCHDOG_INTERVAL,
+            "limits": {
+                "js_heap_mb": MAX_JS_HEAP_MB,
+                "dom_nodes": MAX_DOM_NODES,
+            },
+            "active": len(live),
+            "crashes": self.crashes_total + sum(w.crashes for w in live),
+            "recycles": dict(recycles),
+            "sessions": [watchdog.get_stats() for watchdog in live],
+        }
+
+# Global registry of the watchdogs running in this worker process
+watchdog_registry = WatchdogRegistry()
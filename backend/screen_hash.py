@@ -0,0 +1,32 @@
+## perceptual (difference) hash of page screenshots, to notice steps whose action changed nothing on screen
+
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# Hash of HASH_SIZE x HASH_SIZE bits
+HASH_SIZE = 16
+# Bits two screenshots of the same screen may differ by (JPEG noise, a blinking caret, an animated spinner)
+SAME_SCREEN_DISTANCE = int(os.getenv("SCREEN_HASH_DISTANCE", "6"))
+# Unchanged steps in a row still sent to the model (without the screenshot) before a local policy decides
+UNCHANGED_MODEL_STEPS = int(os.getenv("UNCHANGED_MODEL_STEPS", "2"))
+
+def dhash(image_bytes: bytes, hash_size: int = HASH_SIZE) -> Optional[int]:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a downscaled grayscale image"""
+    # The decoder downscales by 8 itself, so the full-size image is never built
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hash_distance(a: int, b: int) -> int:
+    """Number of differing bits"""
+    return bin(a ^ b).count("1")
+
+def same_screen(a: Optional[int], b: Optional[int]) -> bool:
+    """Whether two screenshot hashes show the same screen; unknown hashes never match"""
+    return a is not None and b is not None and hash_distance(a, b) <= SAME_SCREEN_DISTANCE
@@ -0,0 +1,172 @@
+## per-job content-addressed store of step screenshots and their thumbnails, served over HTTP instead of the websocket
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+
+from backend.cpu_pool import cpu_pool
+from backend.cpu_tasks import jpeg_thumbnail
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_DIR = Path(os.getenv("SCREENSHOT_DIR", "screenshots"))
+THUMBNAIL_SIZE = (320, 200)
+THUMBNAIL_QUALITY = 70
+# Jobs whose screenshots are kept; the oldest job's directory goes when a new job stores its first one
+SCREENSHOT_STORE_MAX_JOBS = int(os.getenv("SCREENSHOT_STORE_MAX_JOBS", "50"))
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+@dataclass
+class StoredScreenshot:
+    """Reference to a stored screenshot, what the websocket sends instead of the image"""
+    hash: str
+    url: str
+    thumbnail_url: str
+    media_type: str
+    width: int
+    height: int
+    thumbnail_width: int
+    thumbnail_height: int
+    bytes: int
+
+class ScreenshotStore:
+    """Screenshots of each job under SCREENSHOT_DIR/<job_id>/, named by the SHA-256 of their bytes"""
+
+    def __init__(self, directory: Path = SCREENSHOT_DIR, max_jobs: int = SCREENSHOT_STORE_MAX_JOBS):
+        self.directory = directory
+        self.max_jobs = max_jobs
+        # job_id → {hash → StoredScreenshot}, oldest job first; None until read from disk on first use,
+        # and a job's entries stay None until that job is asked for
+        self._jobs: "Optional[OrderedDict[str, Optional[Dict[str, StoredScreenshot]]]]" = None
+        # The HTTP endpoints read from worker threads while jobs store on the event loop
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.duplicates = 0
+
+    def _image_path(self, job_id: str, digest: str) -> Path:
+        return self.directory / job_id / digest
+
+    def _thumbnail_path(self, job_id: str, digest: str) -> Path:
+        return self.directory / job_id / f"{digest}.thumb.jpg"
+
+    async def put(self, job_id: str, image: bytes) -> StoredScreenshot:
+        """Store a screenshot once per job and return its reference"""
+        digest = hashlib.sha256(image).hexdigest()
+        entries = self._jobs.get(job_id) if self._jobs is not None else None
+        if entries is None:
+            entries = await asyncio.to_thread(self._entries, job_id)
+        if entries is None:
+            entries = self._jobs[job_id] = {}
+            await self._evict()
+        if digest in entries:
+            # The same screen again (nothing changed since an earlier step)
+            self.duplicates += 1
+            return entries[digest]
+
+        header = Image.open(io.BytesIO(image))  # reads the header only
+        thumbnail = await cpu_pool.run("thumbnail", jpeg_thumbnail, image, THUMBNAIL_SIZE, THUMBNAIL_QUALITY)
+        thumbnail_width, thumbnail_height = Image.open(io.BytesIO(thumbnail)).size
+        await asyncio.to_thread(self._write, job_id, digest, image, thumbnail)
+
+        entries[digest] = self._reference(job_id, digest, header, thumbnail_width, thumbnail_height, len(image))
+        self.stored += 1
+        return entries[digest]
+
+    @staticmethod
+    def _reference(job_id: str, digest: str, header: Image.Image, thumbnail_width: int,
+                   thumbnail_height: int, size: int) -> StoredScreenshot:
+        base = f"/job/{job_id}/screenshots/{digest}"
+        return StoredScreenshot(
+            hash=digest,
+            url=base,
+            thumbnail_url=f"{base}/thumbnail",
+            media_type=MEDIA_TYPES.get(header.format, "application/octet-stream"),
+            width=header.width,
+            height=header.height,
+            thumbnail_width=thumbnail_width,
+            thumbnail_height=thumbnail_height,
+            bytes=size,
+        )
+
+    def _write(self, job_id: str, digest: str, image: bytes, thumbnail: bytes):
+        (self.directory / job_id).mkdir(parents=True, exist_ok=True)
+        self._image_path(job_id, digest).write_bytes(image)
+        self._thumbnail_path(job_id, digest).write_bytes(thumbnail)
+
+    def _load_index(self) -> OrderedDict:
+        """Rebuild the job order from directory times the first time the store is used, so jobs
+        stored before a restart are still served and still count against max_jobs"""
+        with self._lock:
+            if self._jobs is None:
+                directories = sorted((p for p in self.directory.iterdir() if p.is_dir()),
+                                     key=lambda p: p.stat().st_mtime) if self.directory.exists() else []
+                self._jobs = OrderedDict((p.name, None) for p in directories)
+            return self._jobs
+
+    def _entries(self, job_id: str) -> Optional[Dict[str, StoredScreenshot]]:
+        """A job's screenshots, read back from its directory if it was stored before a restart"""
+        jobs = self._load_index()
+        with self._lock:
+            if job_id not in jobs:
+                return None
+            if jobs[job_id] is None:
+                jobs[job_id] = self._read_job(job_id)
+            return jobs[job_id]
+
+    def _read_job(self, job_id: str) -> Dict[str, StoredScreenshot]:
+        entries = {}
+        files = sorted((p for p in (self.directory / job_id).iterdir() if "." not in p.name),
+                       key=lambda p: p.stat().st_mtime)
+        for path in files:
+            digest = path.name
+            try:
+                with Image.open(path) as header, Image.open(self._thumbnail_path(job_id, digest)) as thumbnail:
+                    entries[digest] = self._reference(job_id, digest, header, *thumbnail.size, path.stat().st_size)
+            except OSError:
+                # Half-written before the restart
+                continue
+        return entries
+
+    async def _evict(self):
+        """Remove the oldest jobs' screenshots beyond max_jobs"""
+        while len(self._jobs) > self.max_jobs:
+            job_id, _ = self._jobs.popitem(last=False)
+            await asyncio.to_thread(shutil.rmtree, self.directory / job_id, True)
+            logger.info(f"🧹 Removed stored screenshots of job {job_id}")
+
+    def get(self, job_id: str, digest: str, thumbnail: bool = False) -> Optional[tuple]:
+        """(path, media type) of a stored screenshot or its thumbnail, None if unknown"""
+        entry = (self._entries(job_id) or {}).get(digest)
+        if entry is None:
+            return None
+        if thumbnail:
+            return self._thumbnail_path(job_id, digest), "image/jpeg"
+        return self._image_path(job_id, digest), entry.media_type
+
+    def references(self, job_id: str) -> list:
+        """References of a job's stored screenshots, in the order they were first seen"""
+        return [asdict(entry) for entry in (self._entries(job_id) or {}).values()]
+
+    def get_stats(self) -> dict:
+        jobs = self._jobs or {}
+        return {
+            "jobs": len(jobs),
+            # Jobs from before a restart count once they have been read back
+            "screenshots": sum(len(entries) for entries in jobs.values() if entries),
+            "stored": self.stored,
+            "duplicates": self.duplicates,
+        }
+
+# Shared by every job of this worker process
+screenshot_store = ScreenshotStore()
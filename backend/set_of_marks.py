@@ -0,0 +1,115 @@
+## draws numbered element boxes (set-of-marks) onto screenshots, leaving the live page untouched
+
+from typing import Iterable
+
+import cv2
+import numpy as np
+
+# BGR, matching the red outline and label of the old in-page highlighting
+MARK_COLOR = np.array([0, 0, 255], dtype=np.uint8)
+TEXT_COLOR = (255, 255, 255)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.45
+FONT_THICKNESS = 1
+OUTLINE_WIDTH = 2
+OUTLINE_OFFSET = 1
+LABEL_PADDING = 3
+JPEG_MAGIC = b"\xff\xd8"
+
+def _coverage(height: int, width: int, boxes: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Weighted count of boxes (x0, y0, x1, y1, ends exclusive) covering each pixel, via a 2D difference array"""
+    diff = np.zeros((height + 1, width + 1), dtype=np.int32)
+    x0, y0, x1, y1 = boxes.T
+    np.add.at(diff, (y0, x0), weights)
+    np.add.at(diff, (y0, x1), -weights)
+    np.add.at(diff, (y1, x0), -weights)
+    np.add.at(diff, (y1, x1), weights)
+    return diff.cumsum(axis=0).cumsum(axis=1)[:height, :width]
+
+def _clip(boxes: np.ndarray, height: int, width: int) -> np.ndarray:
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    # Boxes entirely off the image collapse to nothing
+    boxes[:, 2] = np.maximum(boxes[:, 2], boxes[:, 0])
+    boxes[:, 3] = np.maximum(boxes[:, 3], boxes[:, 1])
+    return boxes
+
+def annotate(image: np.ndarray, indices: np.ndarray, rects: np.ndarray) -> np.ndarray:
+    """Outline rects (x, y, width, height) on a BGR image and label them with their indices, in place"""
+    if not len(indices):
+        return image
+    height, width = image.shape[:2]
+    x0 = np.floor(rects[:, 0]).astype(np.int64)
+    y0 = np.floor(rects[:, 1]).astype(np.int64)
+    x1 = np.ceil(rects[:, 0] + rects[:, 2]).astype(np.int64)
+    y1 = np.ceil(rects[:, 1] + rects[:, 3]).astype(np.int64)
+
+    # Only elements with some area on the image get a mark
+    on_image = (x1 > 0) & (y1 > 0) & (x0 < width) & (y0 < height) & (x1 > x0) & (y1 > y0)
+    if not on_image.all():
+        indices, x0, y0, x1, y1 = indices[on_image], x0[on_image], y0[on_image], x1[on_image], y1[on_image]
+        if not len(indices):
+            return image
+
+    # Outline band between an outer and an inner box, drawn just outside the element
+    inner_grow = OUTLINE_OFFSET
+    outer_grow = OUTLINE_OFFSET + OUTLINE_WIDTH
+    outer = _clip(np.stack([x0 - outer_grow, y0 - outer_grow, x1 + outer_grow, y1 + outer_grow], axis=1), height, width)
+    inner = _clip(np.stack([x0 - inner_grow, y0 - inner_grow, x1 + inner_grow, y1 + inner_grow], axis=1), height, width)
+
+    # Label size only depends on the number of digits
+    labels = [str(index) for index in indices.tolist()]
+    digits = np.array([len(label) for label in labels])
+    text_sizes = {n: cv2.getTextSize("0" * n, FONT, FONT_SCALE, FONT_THICKNESS) for n in set(digits.tolist())}
+    text_width = np.array([text_sizes[n][0][0] for n in digits.tolist()])
+    text_height = max(size[0][1] + size[1] for size in text_sizes.values())
+    label_width = text_width + 2 * LABEL_PADDING
+    label_height = text_height + 2 * LABEL_PADDING
+
+    # Labels sit above the box, or inside its top edge when there is no room above
+    label_x0 = np.clip(x0 - outer_grow, 0, None)
+    label_y0 = np.where(y0 - outer_grow - label_height >= 0, y0 - outer_grow - label_height, np.clip(y0, 0, None))
+    label_boxes = _clip(np.stack([label_x0, label_y0, label_x0 + label_width, label_y0 + label_height], axis=1),
+                        height, width)
+
+    # Outer boxes minus inner boxes leave the outline bands; a single pass covers bands and labels
+    count = len(indices)
+    boxes = np.concatenate([outer, inner, label_boxes])
+    weights = np.concatenate([np.ones(count, np.int32), -np.ones(count, np.int32), np.ones(count, np.int32)])
+    mask = _coverage(height, width, boxes, weights) > 0
+    image[mask] = MARK_COLOR
+
+    baselines = label_y0 + LABEL_PADDING + text_height - 2
+    for label, x, y, (lx0, ly0, lx1, ly1) in zip(labels, (label_x0 + LABEL_PADDING).tolist(), baselines.tolist(),
+                                                 label_boxes.tolist()):
+        if lx1 > lx0 and ly1 > ly0:
+            cv2.putText(image, label, (x, y), FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS, cv2.LINE_AA)
+    return image
+
+def draw_marks(screenshot: bytes, elements: Iterable, scale: float = 1.0, quality: int = 75) -> bytes:
+    """Screenshot with every visible indexed element boxed and numbered, in the format it came in.
+
+    Element boxes are in CSS pixels; scale maps them onto a screenshot taken at another size.
+    """
+    marked = [e for e in elements if e.index is not None and e.is_visible and e.bounding_box]
+    if not marked:
+        return screenshot
+    image = cv2.imdecode(np.frombuffer(screenshot, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return screenshot
+
+    indices = np.fromiter((e.index for e in marked), dtype=np.int64, count=len(marked))
+    rects = np.array([
+        (e.bounding_box["x"], e.bounding_box["y"], e.bounding_box["width"], e.bounding_box["height"])
+        for e in marked
+    ], dtype=np.float64) * scale
+    annotate(image, indices, rects)
+
+    if screenshot[:2] == JPEG_MAGIC:
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    elif screenshot[8:12] == b"WEBP":
+        ok, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    else:
+        ok, encoded = cv2.imencode(".png", image)
+    return encoded.tobytes() if ok else screenshot
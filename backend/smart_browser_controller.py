@@ -6,13 +6,17 @@ from urllib.parse import urlparse
 from backend.browser_controller import BrowserController
 from backend.proxy_manager import SmartProxyManager
 from backend.anti_bot_detection import AntiBotVisionModel
+from backend.frame_cache import resized, ANTI_BOT_SIZE
+from backend.storage_state_cache import (
+    storage_state_cache, site_key, local_storage_scripts, STORAGE_CACHE_ENABLED
+)
 import logging
 import base64
 logger = logging.getLogger(__name__)
 
 class SmartBrowserController(BrowserController):
-    def __init__(self, headless: bool, proxy: dict | None, enable_streaming: bool = False):
-        super().__init__(headless, proxy, enable_streaming)
+    def __init__(self, headless: bool, proxy: dict | None, enable_streaming: bool = False, **kwargs):
+        super().__init__(headless, proxy, enable_streaming, **kwargs)
         
         # Initialize smart proxy management
         self.vision_model = AntiBotVisionModel()
@@ -22,6 +26,53 @@ class SmartBrowserController(BrowserController):
         self.proxy_retry_count = 0
         self.max_captcha_solve_attempts = 3
         self.captcha_solve_count = 0
+        self.rotation_count = 0
+        self.rotation_time_total = 0.0
+        self.last_rotation_ms = None
+        self._seeded_sites = set()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        """Remember the site's cookies and localStorage for the next job, then clean up"""
+        if self.page and self.context:
+            await self._save_storage_state(self.page.url)
+        await super().__aexit__(exc_type, exc, tb)
+    
+    async def _prepare_context(self, context):
+        """A new context starts empty, so cached site state has to be loaded again"""
+        await super()._prepare_context(context)
+        self._seeded_sites = set()
+    
+    async def _seed_storage_state(self, url: str):
+        """Load cached cookies and localStorage for the site before navigating to it"""
+        site = site_key(urlparse(url).hostname or "")
+        if not STORAGE_CACHE_ENABLED or not site or site in self._seeded_sites:
+            return
+        self._seeded_sites.add(site)
+        state = await asyncio.to_thread(storage_state_cache.get, url, self.current_proxy)
+        if not state:
+            return
+        
+        try:
+            # Never overwrite cookies the site already set in this context
+            existing = {(c["name"], c["domain"], c["path"]) for c in await self.context.cookies()}
+            cookies = [c for c in state["cookies"] if (c["name"], c["domain"], c["path"]) not in existing]
+            if cookies:
+                await self.context.add_cookies(cookies)
+            for script in local_storage_scripts(state):
+                await self.context.add_init_script(script)
+            logger.info(f"🍪 Restored {len(cookies)} cookies and {len(state['origins'])} storage origins for {site}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not restore cached storage state for {site}: {e}")
+    
+    async def _save_storage_state(self, url: str):
+        """Update the cache with the current cookies and localStorage of a site"""
+        if not STORAGE_CACHE_ENABLED or not url.startswith("http"):
+            return
+        try:
+            state = await self.context.storage_state()
+            await asyncio.to_thread(storage_state_cache.put, url, self.current_proxy, state)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save storage state for {url}: {e}")
     
     async def smart_navigate(self, url: str, wait_until: str = "domcontentloaded", timeout: int = 30000) -> bool:
         """Navigate with intelligent anti-bot detection and proxy rotation"""
@@ -32,16 +83,22 @@ class SmartBrowserController(BrowserController):
                 logger.info(f"🌐 Smart navigation attempt {attempt + 1}/{self.max_proxy_retries} to: {url}")
                 start_time = time.time()
                 
-                # Navigate to the page
+                # Start from what earlier jobs already accepted or logged into on this site
+                await self._seed_storage_state(url)
+                
+                # Navigate to the page; the new document always gets a full DOM scan
+                self._cached_page_state = None
                 response = await self.page.goto(url, wait_until=wait_until, timeout=timeout)
                 response_time = time.time() - start_time
                 
-                # Wait a moment for page to fully load
-                await asyncio.sleep(2)
+                # Wait for the page to settle instead of a fixed delay
+                await self.wait_for_settle("navigate")
                 
-                # Use vision model to detect anti-bot systems
+                # Use vision model to detect anti-bot systems; the first page state reuses this frame
+                frame = await self.get_frame()
                 is_antibot, detection_type, suggested_action = await self.proxy_manager.detect_anti_bot_with_vision(
-                    self.page, f"navigate to {url}"
+                    self.page, f"navigate to {url}",
+                    await frame.derive("anti_bot", lambda image: resized(image, ANTI_BOT_SIZE))
                 )
                 
                 if is_antibot:
@@ -73,8 +130,7 @@ class SmartBrowserController(BrowserController):
                             if new_proxy_info:
                                 new_proxy = new_proxy_info.to_playwright_dict()
                                 logger.info(f"🔄 Rotating to new proxy: {new_proxy['server']}")
-                                await self._restart_browser_with_proxy(new_proxy)
-                                await asyncio.sleep(3)  # Wait before retry
+                                await self._rotate_proxy(new_proxy)
                                 continue
                             else:
                                 logger.error("❌ No available proxies for rotation")
@@ -93,6 +149,7 @@ class SmartBrowserController(BrowserController):
                             self.proxy_manager.mark_proxy_success(proxy_info, response_time)
                     self.proxy_retry_count = 0
                     self.captcha_solve_count = 0
+                    await self._save_storage_state(self.page.url)
                     return True
                     
             except Exception as e:
@@ -109,8 +166,7 @@ class SmartBrowserController(BrowserController):
                     if new_proxy_info:
                         new_proxy = new_proxy_info.to_playwright_dict()
                         logger.info(f"🔄 Retrying with new proxy due to connection error")
-                        await self._restart_browser_with_proxy(new_proxy)
-                        await asyncio.sleep(3)
+                        await self._rotate_proxy(new_proxy)
                         continue
         
         logger.error(f"❌ Failed to navigate to {url} after all retries")
@@ -121,8 +177,8 @@ class SmartBrowserController(BrowserController):
         try:
             logger.info(f"🧩 Attempting to solve {detection_type} CAPTCHA...")
             
-            # Take screenshot for CAPTCHA analysis
-            screenshot_bytes = await self.page.screenshot(type='png')
+            # Same frame the anti-bot check just saw, at full capture size
+            screenshot_bytes = (await self.get_frame()).image
             screenshot_b64 = base64.b64encode(screenshot_bytes).decode('utf-8')
             
             # Use vision model to solve CAPTCHA
@@ -190,54 +246,25 @@ class SmartBrowserController(BrowserController):
             logger.error(f"❌ Error applying CAPTCHA solution: {e}")
             return False
     
-    async def _restart_browser_with_proxy(self, new_proxy: dict):
-        """Restart browser with new proxy"""
+    async def _rotate_proxy(self, new_proxy: dict):
+        """Rotate proxies by moving onto a new context on the already-running browser"""
+        started = time.perf_counter()
         try:
-            # Close current browser
-            if self.browser:
-                await self.browser.close()
-            
             # Update proxy
             self.current_proxy = new_proxy
-            
-            # Launch new browser with new proxy
-            launch_options = {
-                "headless": self.headless,
-                "args": [
-                    "--no-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-gpu",
-                    "--disable-web-security",
-                    "--disable-features=VizDisplayCompositor",
-                    "--window-size=1280,800",
-                    "--window-position=0,0",
-                    "--disable-blink-features=AutomationControlled",
-                    "--disable-extensions",
-                    "--no-first-run",
-                    "--disable-default-apps",
-                    "--remote-debugging-port=0"
-                ]
-            }
-            
-            if new_proxy:
-                launch_options["proxy"] = new_proxy
-            
-            self.browser = await self.play.chromium.launch(**launch_options)
-            self.page = await self.browser.new_page(viewport={"width": 1280, "height": 800})
-            
-            # Re-setup CDP streaming if enabled
-            if self.enable_streaming:
-                await self._setup_cdp_streaming()
-            
-            # Set headers with randomization
-            await self.page.set_extra_http_headers({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            })
-            
-            logger.info("✅ Browser restarted with new proxy")
+            self.proxy = new_proxy
+
+            # New context carries over CDP streaming setup, live stream clients and headers
+            await self._replace_context()
+
+            elapsed = time.perf_counter() - started
+            self.rotation_count += 1
+            self.rotation_time_total += elapsed
+            self.last_rotation_ms = round(elapsed * 1000, 2)
+            logger.info(f"✅ Rotated to new proxy context in {self.last_rotation_ms}ms")
             
         except Exception as e:
-            logger.error(f"❌ Failed to restart browser with new proxy: {e}")
+            logger.error(f"❌ Failed to rotate proxy context: {e}")
             raise
     
     def get_proxy_stats(self) -> dict:
@@ -246,7 +273,10 @@ class SmartBrowserController(BrowserController):
         stats.update({
             "current_proxy": self.current_proxy.get("server", "None") if self.current_proxy else "None",
             "retry_count": self.proxy_retry_count,
-            "captcha_solve_count": self.captcha_solve_count
+            "captcha_solve_count": self.captcha_solve_count,
+            "rotation_count": self.rotation_count,
+            "last_rotation_ms": self.last_rotation_ms,
+            "avg_rotation_ms": round(self.rotation_time_total / self.rotation_count * 1000, 2) if self.rotation_count else None
         })
         return stats
     
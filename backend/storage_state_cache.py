@@ -0,0 +1,208 @@
+## local cache of cookies and localStorage per site and proxy, so repeat jobs skip consent walls and logins
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Off by default: the cache writes session cookies (logins included) to disk and shares them between jobs
+STORAGE_CACHE_ENABLED = os.getenv("STORAGE_CACHE_ENABLED", "false").lower() == "true"
+
+# Second-level labels under which registrations happen one level deeper (example.co.uk)
+_SECOND_LEVEL = {"co", "com", "net", "org", "gov", "edu", "ac", "or", "ne", "go"}
+
+# Seeds localStorage for one origin without overwriting anything the site already stored
+_SEED_LOCAL_STORAGE_JS = """
+(() => {
+    if (location.origin !== %s) return;
+    try {
+        for (const [name, value] of %s) {
+            if (localStorage.getItem(name) === null) localStorage.setItem(name, value);
+        }
+    } catch (e) {}
+})();
+"""
+
+def site_key(host: str) -> str:
+    """Registrable part of a hostname so login.example.com and www.example.com share state"""
+    host = (host or "").lower().split(":")[0].strip(".")
+    labels = host.split(".")
+    if len(labels) <= 2 or host.replace(".", "").isdigit():
+        return host
+    if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+def proxy_identity(proxy: dict | None) -> str:
+    """Sites tie sessions to the exit IP, so state is only reused through the same proxy"""
+    if not proxy:
+        return "direct"
+    return f"{proxy.get('username') or ''}@{proxy.get('server', '')}"
+
+def _belongs_to(domain: str, site: str) -> bool:
+    domain = domain.lstrip(".").lower()
+    return domain == site or domain.endswith("." + site)
+
+def local_storage_scripts(state: dict) -> list:
+    """Init scripts that seed the cached localStorage of each origin"""
+    scripts = []
+    for origin in state.get("origins", []):
+        items = [[item["name"], item["value"]] for item in origin.get("localStorage", [])]
+        if items:
+            scripts.append(_SEED_LOCAL_STORAGE_JS % (json.dumps(origin["origin"]), json.dumps(items)))
+    return scripts
+
+class StorageStateCache:
+    """File-backed cache; its methods block on disk I/O, so async callers run them in a thread"""
+
+    def __init__(self, directory: str | None = None, ttl_hours: float | None = None,
+                 max_entries: int | None = None):
+        self.directory = Path(directory or os.getenv("STORAGE_CACHE_DIR", "storage_cache"))
+        self.ttl = (ttl_hours if ttl_hours is not None
+                    else float(os.getenv("STORAGE_CACHE_TTL_HOURS", "24"))) * 3600
+        self.max_entries = max_entries if max_entries is not None \
+            else int(os.getenv("STORAGE_CACHE_MAX_DOMAINS", "200"))
+        # key → last used time, least recently used first
+        self._index: Optional[OrderedDict] = None
+        # Calls arrive from worker threads of several jobs at once
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saves = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, url: str, proxy: dict | None) -> Optional[dict]:
+        """Cached cookies and localStorage for the site of a URL, None when missing or expired"""
+        with self._lock:
+            return self._get(url, proxy)
+
+    def _get(self, url: str, proxy: dict | None) -> Optional[dict]:
+        site = site_key(urlparse(url).hostname or "")
+        key = self._key(site, proxy)
+        index = self._load_index()
+        if key not in index:
+            self.misses += 1
+            return None
+
+        entry = self._read(key)
+        if entry is None or time.time() - entry.get("saved_at", 0) > self.ttl:
+            if entry is not None:
+                self.expired += 1
+            self.misses += 1
+            self._remove(key)
+            return None
+
+        # Drop cookies that expired since they were saved
+        now = time.time()
+        entry["cookies"] = [c for c in entry.get("cookies", []) if c.get("expires", -1) in (-1, None) or c["expires"] > now]
+        index[key] = now
+        index.move_to_end(key)
+        try:
+            # The file time carries the LRU order across restarts
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        self.hits += 1
+        return {"cookies": entry["cookies"], "origins": entry.get("origins", [])}
+
+    def put(self, url: str, proxy: dict | None, state: dict):
+        """Store the part of a context storage_state that belongs to the site of a URL"""
+        with self._lock:
+            self._put(url, proxy, state)
+
+    def _put(self, url: str, proxy: dict | None, state: dict):
+        site = site_key(urlparse(url).hostname or "")
+        if not site:
+            return
+        cookies = [c for c in state.get("cookies", []) if _belongs_to(c.get("domain", ""), site)]
+        origins = [o for o in state.get("origins", []) if _belongs_to(urlparse(o.get("origin", "")).hostname or "", site)]
+        if not cookies and not origins:
+            return
+
+        key = self._key(site, proxy)
+        entry = {
+            "site": site,
+            "proxy": proxy_identity(proxy),
+            "saved_at": time.time(),
+            "cookies": cookies,
+            "origins": origins,
+        }
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path(key).with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(entry))
+            tmp_path.replace(self._path(key))
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save storage state for {site}: {e}")
+            return
+
+        index = self._load_index()
+        index[key] = entry["saved_at"]
+        index.move_to_end(key)
+        self.saves += 1
+
+        while len(index) > self.max_entries:
+            oldest = next(iter(index))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        """Forget every cached site"""
+        with self._lock:
+            for key in list(self._load_index()):
+                self._remove(key)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": STORAGE_CACHE_ENABLED,
+            "entries": len(self._load_index()),
+            "max_entries": self.max_entries,
+            "ttl_hours": self.ttl / 3600,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "saves": self.saves,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    def _key(self, site: str, proxy: dict | None) -> str:
+        return hashlib.sha1(f"{site}|{proxy_identity(proxy)}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _read(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads(self._path(key).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, key: str):
+        self._load_index().pop(key, None)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _load_index(self) -> OrderedDict:
+        """Rebuild the LRU order from file times the first time the cache is used"""
+        if self._index is None:
+            files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime) \
+                if self.directory.exists() else []
+            self._index = OrderedDict((p.stem, p.stat().st_mtime) for p in files)
+        return self._index
+
+# Global storage-state cache shared by every job in this worker process
+storage_state_cache = StorageStateCache()
@@ -0,0 +1,120 @@
+## opens several candidate links in parallel tabs, scores them against the goal and keeps the best
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+from urllib.parse import urljoin, urlparse
+
+from backend.page_settle import PageSettleDetector
+
+# Hard ceiling on the per-job max_tabs setting
+MAX_TABS_LIMIT = int(os.getenv("MAX_EXPLORE_TABS", "5"))
+TAB_LOAD_TIMEOUT = float(os.getenv("EXPLORE_TAB_TIMEOUT", "20"))
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "what", "which", "about", "into", "onto",
+    "find", "get", "give", "show", "list", "tell", "search", "look", "save", "extract", "page",
+    "website", "site", "format", "pdf", "csv", "json", "html", "markdown", "txt", "text", "please",
+    "information", "info", "details", "all", "are", "was", "were", "how", "who", "when", "where",
+}
+
+PAGE_TEXT_JS = "() => document.body ? document.body.innerText.slice(0, 20000) : ''"
+
+@dataclass
+class TabCandidate:
+    """A link opened in its own tab during exploration"""
+    index: int
+    url: str
+    title: str = ""
+    score: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "url": self.url, "title": self.title,
+                "score": round(self.score, 2), "error": self.error}
+
+def goal_keywords(goal: str) -> set:
+    """Content words of the goal that a relevant page should mention"""
+    words = re.findall(r"[a-z0-9][a-z0-9\-]{2,}", goal.lower())
+    return {word for word in words if word not in STOPWORDS and not word.startswith("http")}
+
+def score_page(keywords: set, title: str, url: str, text: str) -> float:
+    """Keyword overlap of a page with the goal; title and URL hits weigh more than body hits"""
+    if not keywords:
+        return 0.0
+    title_lower = title.lower()
+    url_lower = url.lower()
+    text_lower = text.lower()
+    score = 0.0
+    for keyword in keywords:
+        if keyword in title_lower:
+            score += 3
+        if keyword in url_lower:
+            score += 1
+        # Diminishing credit for repeated body mentions
+        score += min(text_lower.count(keyword), 5) * 0.4
+    # Average per keyword so scores read the same for short and long goals
+    return score / len(keywords)
+
+def candidate_links(page_state, indices: List[int], limit: int) -> List[TabCandidate]:
+    """Resolve the chosen elements to distinct http(s) links"""
+    candidates, seen = [], set()
+    for index in indices:
+        elem = page_state.selector_map.get(index)
+        href = elem.attributes.get("href") if elem else None
+        if not href:
+            continue
+        url = urljoin(page_state.url, href)
+        if urlparse(url).scheme not in ("http", "https") or url in seen:
+            continue
+        seen.add(url)
+        candidates.append(TabCandidate(index=index, url=url))
+        if len(candidates) >= limit:
+            break
+    return candidates
+
+async def _load_and_score(page, candidate: TabCandidate, keywords: set):
+    try:
+        await page.goto(candidate.url, wait_until="domcontentloaded", timeout=TAB_LOAD_TIMEOUT * 1000)
+        await PageSettleDetector(page).wait()
+        candidate.title = await page.title()
+        text = await page.evaluate(PAGE_TEXT_JS)
+        candidate.score = score_page(keywords, candidate.title, page.url, text)
+        candidate.url = page.url
+    except Exception as e:
+        candidate.error = str(e)[:200]
+        candidate.score = -1.0
+
+async def explore_tabs(browser, page_state, indices: List[int], goal: str, max_tabs: int) -> dict:
+    """Open up to max_tabs links concurrently, continue on the best match and close the other tabs"""
+    max_tabs = max(1, min(max_tabs, MAX_TABS_LIMIT))
+    candidates = candidate_links(page_state, indices, max_tabs)
+    if not candidates:
+        return {"opened": 0, "tabs": [], "chosen": None}
+
+    keywords = goal_keywords(goal)
+    pages = []
+    try:
+        for _ in candidates:
+            pages.append(await browser.open_tab())
+        await asyncio.gather(*(
+            _load_and_score(page, candidate, keywords)
+            for page, candidate in zip(pages, candidates)
+        ))
+
+        # Earlier indices break ties, they are what the model ranked first
+        best = max(range(len(candidates)), key=lambda i: (candidates[i].score, -i))
+        chosen = candidates[best] if candidates[best].error is None else None
+        if chosen:
+            await browser.adopt_tab(pages[best])
+    finally:
+        for page in pages:
+            await browser.close_tab(page)
+
+    return {
+        "opened": len(candidates),
+        "tabs": [candidate.to_dict() for candidate in candidates],
+        "chosen": chosen.to_dict() if chosen else None,
+    }
@@ -4,6 +4,8 @@ from PIL import Image
 import io
 
 from backend.gemini_client import GeminiClient
+from backend.cpu_pool import cpu_pool
+from backend.cpu_tasks import jpeg_thumbnail
 
 gemini_client = GeminiClient()
 
@@ -33,6 +35,9 @@ SCROLL - Navigate the page vertically:
 PRESS_KEY - Press any keyboard key:
 {"action": "press_key", "key": "Enter|Tab|Escape|Space|etc", "reason": "reason for key press"}
 
+EXPLORE - Open several promising links at once in parallel tabs and continue on the most relevant one:
+{"action": "explore", "indices": [N, M, K], "reason": "why these links are candidates"}
+
 NAVIGATE - Go to a specific URL (only if needed):
 {"action": "navigate", "url": "https://example.com", "reason": "reason for navigation"}
 
@@ -58,7 +63,7 @@ WEBSITE TYPE DETECTION:
 
 INTERACTION STRATEGY:
 - **First time on page**: Look for main navigation, search, or primary actions
-- **Search results**: Click on most relevant results for user's goal
+- **Search results**: Click on the most relevant result, or EXPLORE the top few link results when several look promising
 - **Product pages**: Look for details, specifications, reviews as needed
 - **Profile/About pages**: Extract relevant information about person/entity
 - **Forms**: Fill systematically, validate inputs
@@ -73,59 +78,102 @@ EXTRACTION TIMING:
 REMEMBER: Be universal - work with ANY website structure, ANY content type, ANY user goal.
 """
 
-async def decide(img_bytes: bytes, page_state, goal: str) -> dict:
-    """Universal AI decision making for any website"""
+MAX_PROMPT_ELEMENTS = 20
+MAX_IMAGE_SIZE = (1280, 800)
+
+async def model_image(img_bytes: bytes, max_size: tuple = MAX_IMAGE_SIZE, stage: str = "model_image") -> dict:
+    """Image part for the model; page state screenshots already are JPEG at model size and pass through untouched"""
+    image = Image.open(io.BytesIO(img_bytes))  # reads the header only
+    if image.format == "JPEG" and image.width <= max_size[0] and image.height <= max_size[1]:
+        return {"mime_type": "image/jpeg", "data": img_bytes}
+
+    # Compress image efficiently, in a worker process
+    return {"mime_type": "image/jpeg", "data": await cpu_pool.run(stage, jpeg_thumbnail, img_bytes, max_size)}
+
+def dom_element_list(page_state, max_elements: int = MAX_PROMPT_ELEMENTS) -> list:
+    """Element descriptions from tag, text and attribute hints of the indexed DOM elements"""
+    interactive_elements = []
+    for index in sorted(page_state.selector_map.keys())[:max_elements]:
+        elem = page_state.selector_map[index]
+        
+        # Dynamic element description based on context
+        element_data = {
+            "index": index,
+            "tag": elem.tag_name,
+            "text": elem.text[:60] if elem.text else "",
+            "clickable": elem.is_clickable,
+            "input": elem.is_input,
+        }
+        
+        # Add contextual attributes dynamically
+        if elem.attributes.get("href"):
+            element_data["link"] = elem.attributes["href"][:100]
+        if elem.attributes.get("placeholder"):
+            element_data["placeholder"] = elem.attributes["placeholder"][:30]
+        if elem.attributes.get("type"):
+            element_data["type"] = elem.attributes["type"]
+        if elem.attributes.get("class"):
+            # Extract meaningful class hints
+            classes = elem.attributes["class"].lower()
+            if any(hint in classes for hint in ["search", "login", "submit", "button", "nav", "menu"]):
+                element_data["class_hint"] = classes[:50]
+        if elem.attributes.get("id"):
+            element_data["id"] = elem.attributes["id"][:30]
+            
+        interactive_elements.append(element_data)
+    return interactive_elements
+
+def ax_element_list(page_state, ax_elements: dict, max_elements: int = MAX_PROMPT_ELEMENTS) -> list:
+    """Element descriptions from accessibility roles and names, for indexed elements that have one"""
+    interactive_elements = []
+    for index in sorted(ax_elements)[:max_elements]:
+        ax = ax_elements[index]
+        element_data = {"index": index, "role": ax.role, "name": ax.name[:60]}
+        if ax.value:
+            element_data["value"] = ax.value[:30]
+        element_data.update(ax.states)
+        elem = page_state.selector_map.get(index)
+        if ax.role == "link" and elem is not None and elem.attributes.get("href"):
+            element_data["link"] = elem.attributes["href"][:100]
+        interactive_elements.append(element_data)
+    return interactive_elements
+
+async def count_text_tokens(text: str) -> int:
+    try:
+        return (await gemini_client.count_tokens(text)).total_tokens
+    except Exception:
+        return len(text) // 4
+
+async def decide(img_bytes: bytes | None, page_state, goal: str, ax_elements: dict | None = None,
+                 representation: str = "dom", unchanged_note: str | None = None) -> dict:
+    """Universal AI decision making for any website
+
+    The element list comes from the DOM (tag/attribute hints) or, with representation "ax",
+    from the accessibility tree; whenever ax_elements are given the token cost of both is logged.
+    With an unchanged_note the page looks as it did last step, and only the note goes with the prompt, no image.
+    """
     print(f"🤖 Universal AI decision")
-    print(f"📊 Image size: {len(img_bytes)} bytes")
+    if unchanged_note:
+        print(f"🔁 Page unchanged, deciding without the screenshot")
+    else:
+        print(f"📊 Image size: {len(img_bytes)} bytes")
     print(f"🎯 Goal: {goal}")
     print(f"🖱️ Interactive elements: {len(page_state.selector_map)}")
     print(f"📍 Current URL: {page_state.url}")
 
     try:
-        # Compress image efficiently
-        image = Image.open(io.BytesIO(img_bytes))
-        max_size = (1280, 800)
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        compressed_buffer = io.BytesIO()
-        image.save(compressed_buffer, format='JPEG', quality=75, optimize=True)
-        compressed_image = Image.open(compressed_buffer)
-
         # Create comprehensive element information (dynamic based on content)
-        interactive_elements = []
-        max_elements = min(20, len(page_state.selector_map))  # Adaptive limit
-        
-        for index in sorted(page_state.selector_map.keys())[:max_elements]:
-            elem = page_state.selector_map[index]
-            
-            # Dynamic element description based on context
-            element_data = {
-                "index": index,
-                "tag": elem.tag_name,
-                "text": elem.text[:60] if elem.text else "",
-                "clickable": elem.is_clickable,
-                "input": elem.is_input,
-            }
-            
-            # Add contextual attributes dynamically
-            if elem.attributes.get("href"):
-                element_data["link"] = elem.attributes["href"][:100]
-            if elem.attributes.get("placeholder"):
-                element_data["placeholder"] = elem.attributes["placeholder"][:30]
-            if elem.attributes.get("type"):
-                element_data["type"] = elem.attributes["type"]
-            if elem.attributes.get("class"):
-                # Extract meaningful class hints
-                classes = elem.attributes["class"].lower()
-                if any(hint in classes for hint in ["search", "login", "submit", "button", "nav", "menu"]):
-                    element_data["class_hint"] = classes[:50]
-            if elem.attributes.get("id"):
-                element_data["id"] = elem.attributes["id"][:30]
-                
-            interactive_elements.append(element_data)
+        representations = {"dom": dom_element_list(page_state)}
+        if ax_elements:
+            representations["ax"] = ax_element_list(page_state, ax_elements)
+        if representation not in representations:
+            if representation == "ax":
+                print("⚠️ No accessibility tree elements, describing DOM elements instead")
+            representation = "dom"
+        interactive_elements = representations[representation]
 
         # Detect website type dynamically
-        website_type = detect_website_type(page_state.url, page_state.title, interactive_elements)
+        website_type = detect_website_type(page_state.url, page_state.title, representations["dom"])
         
         # Create dynamic context-aware prompt
         prompt = f"""
@@ -144,13 +192,27 @@ Based on the user's goal and current page context, what is the BEST next action?
 Consider the website type and adapt your strategy accordingly.
 """
 
-        content = [SYSTEM_PROMPT, prompt, compressed_image]
+        if unchanged_note:
+            content = [SYSTEM_PROMPT, prompt + f"""
+PAGE UNCHANGED: {unchanged_note}
+The screenshot is the same as in the previous step, so it is not attached; decide from the elements above.
+"""]
+        else:
+            content = [SYSTEM_PROMPT, prompt, await model_image(img_bytes)]
 
         # Count tokens and send request
         token_count_response = await gemini_client.count_tokens(content)
         input_tokens = token_count_response.total_tokens
 
-        response = await gemini_client.generate_content(content)
+        # Both element lists are counted while the model answers
+        listings = {mode: json.dumps(elements, indent=1) for mode, elements in representations.items()}
+        response, *list_tokens = await asyncio.gather(
+            gemini_client.generate_content(content),
+            *(count_text_tokens(listing) for listing in listings.values()),
+        )
+        element_tokens = dict(zip(listings, list_tokens))
+        print("📏 Element list tokens: " + ", ".join(f"{mode} {tokens}" for mode, tokens in element_tokens.items())
+              + f" (prompt uses {representation})")
 
         raw_text = response.text
         response_tokens = await count_response_tokens(raw_text)
@@ -163,7 +225,10 @@ Consider the website type and adapt your strategy accordingly.
         result['token_usage'] = {
             'prompt_tokens': input_tokens,
             'response_tokens': response_tokens,
-            'total_tokens': total_tokens
+            'total_tokens': total_tokens,
+            'element_tokens': element_tokens,
+            'representation': representation,
+            'image_sent': not unchanged_note
         }
         
         print(f"🎯 Universal Result: {result}")
@@ -228,10 +293,23 @@ def parse_ai_response(raw_text: str, page_state, goal: str, website_type: str) -
             result = json.loads(json_str)
             
             # Validate action
-            valid_actions = ["click", "type", "scroll", "press_key", "navigate", "extract", "done"]
+            valid_actions = ["click", "type", "scroll", "press_key", "navigate", "explore", "extract", "done"]
             if result.get("action") not in valid_actions:
                 return get_fallback_action(page_state, goal, website_type)
             
+            # Keep only explore indices that are links on this page
+            if result.get("action") == "explore":
+                indices = result.get("indices")
+                if not isinstance(indices, list):
+                    return get_fallback_action(page_state, goal, website_type)
+                result["indices"] = [
+                    i for i in indices
+                    if i in page_state.selector_map and page_state.selector_map[i].attributes.get("href")
+                ]
+                if not result["indices"]:
+                    print(f"❌ No valid explore indices in {indices}")
+                    return get_fallback_action(page_state, goal, website_type)
+            
             # Validate index if present
             if "index" in result and result["index"] not in page_state.selector_map:
                 print(f"❌ Invalid index {result['index']}")
@@ -276,6 +354,27 @@ def get_fallback_action(page_state, goal: str, website_type: str) -> dict:
     return {"action": "scroll", "direction": "down", "amount": 400, 
            "reason": "Exploring page to find relevant content"}
 
+def no_change_note(previous_decision: dict) -> str:
+    """Tells the model its last action left the page as it was"""
+    action = previous_decision.get("action")
+    if action == "scroll":
+        return (f"Scrolling {previous_decision.get('direction', 'down')} did not move the page, "
+                "it is already at its end in that direction.")
+    target = f" on element {previous_decision['index']}" if previous_decision.get("index") is not None else ""
+    return f"The last action ({action}{target}) had no visible effect. Do not repeat it; choose a different element or action."
+
+def unchanged_page_action(page_state, goal: str, previous_decision: dict) -> dict:
+    """Local decision for a page that stayed the same for several steps, made without calling the model"""
+    if previous_decision.get("action") == "scroll" and previous_decision.get("direction", "down") == "down":
+        return {"action": "extract", "reason": "Page stopped changing at its end, extracting what is there"}
+    website_type = detect_website_type(page_state.url, page_state.title, dom_element_list(page_state))
+    fallback = get_fallback_action(page_state, goal, website_type)
+    if fallback["action"] == previous_decision.get("action") and fallback.get("index") == previous_decision.get("index"):
+        # The fallback is what already did nothing
+        return {"action": "scroll", "direction": "down", "amount": 400,
+                "reason": "Page unchanged by the last action, looking further down"}
+    return fallback
+
 def extract_search_query(goal: str) -> str:
     """Extract search query from user goal"""
     # Remove common command words
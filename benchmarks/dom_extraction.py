@@ -0,0 +1,115 @@
+"""Compare the dom_js and CDP DOMSnapshot extraction engines on large pages.
+
+dom_js is measured with both transfer formats: JSON records and packed typed arrays.
+
+Run from the repository root:
+
+    python -m benchmarks.dom_extraction --cards 500 2000 5000 --runs 5
+    python -m benchmarks.dom_extraction --url https://example.com
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from playwright.async_api import async_playwright
+
+from backend.browser_controller import BrowserController, ELEMENT_ATTRIBUTES, MAX_ATTRIBUTE_LENGTH
+from backend.dom_snapshot import DOMSnapshotExtractor
+
+
+def synthetic_page(cards: int) -> str:
+    """Product-listing style page: visible and hidden cards, nested wrappers, links and buttons."""
+    parts = ["<html><head><style>.card{padding:4px;margin:2px;border:1px solid #ccc}"
+             ".hidden{display:none}.ghost{visibility:hidden}</style></head><body>",
+             "<header><input type='search' placeholder='Search'><button>Go</button></header><main>"]
+    for i in range(cards):
+        css = "card hidden" if i % 7 == 0 else "card ghost" if i % 11 == 0 else "card"
+        parts.append(
+            f"<div class='{css}'><div><div><span>Product {i}</span>"
+            f"<p>Description of product {i} with <b>bold</b> and <i>italic</i> text.</p></div>"
+            f"<a href='/item/{i}'>Details</a> <button onclick='void 0'>Add {i}</button>"
+            f"<div style='cursor:pointer'>Quick view</div></div></div>"
+        )
+    parts.append("</main></body></html>")
+    return "".join(parts)
+
+
+async def time_js(controller: BrowserController, page, packed: bool = False) -> tuple[float, int, dict]:
+    started = time.perf_counter()
+    result = await controller._evaluate_frames(page, {
+        "incremental": False, "generation": None, "attributeNames": ELEMENT_ATTRIBUTES, "maxAttributeLength": MAX_ATTRIBUTE_LENGTH,
+        "packed": packed,
+    })
+    table, selector_map, redundant, stats = controller._build_elements(result, None)
+    elapsed = (time.perf_counter() - started) * 1000
+    if not packed:
+        # Outside the timed part; roughly what the JSON records cost on the wire
+        stats["transferBytes"] = len(json.dumps(result["elements"]))
+    return elapsed, len(table) + len(selector_map) + len(redundant), stats
+
+
+async def time_js_packed(controller: BrowserController, page) -> tuple[float, int, dict]:
+    return await time_js(controller, page, packed=True)
+
+
+async def time_snapshot(controller: BrowserController, page) -> tuple[float, int, dict]:
+    started = time.perf_counter()
+    result = await controller.dom_snapshot.extract(page)
+    table, selector_map, redundant, stats = controller._build_elements(result, None)
+    return (time.perf_counter() - started) * 1000, len(table) + len(selector_map) + len(redundant), stats
+
+
+def summarize(samples: list[float]) -> str:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(len(ordered) * 0.95)) - 1)]
+    return f"median {statistics.median(ordered):8.1f}ms  p95 {p95:8.1f}ms"
+
+
+async def bench_page(controller: BrowserController, page, label: str, runs: int):
+    node_count = await page.evaluate("() => document.getElementsByTagName('*').length")
+    print(f"\n{label} ({node_count} elements)")
+    for engine, measure in (("js", time_js), ("js-packed", time_js_packed), ("snapshot", time_snapshot)):
+        await measure(controller, page)  # warm-up
+        samples, found, stats = [], 0, {}
+        for _ in range(runs):
+            elapsed, found, stats = await measure(controller, page)
+            samples.append(elapsed)
+        line = f"  {engine:<9} {summarize(samples)}  {found} elements, {stats.get('interactiveElements', 0)} interactive"
+        if "transferBytes" in stats:
+            line += f", {stats['transferBytes'] / 1024:.0f}KB transferred"
+        if "decodeTime" in stats:
+            line += f", decoded in {stats['decodeTime']:.1f}ms"
+        print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, nargs="*", default=[500, 2000, 5000],
+                        help="sizes of the synthetic listing page")
+    parser.add_argument("--url", action="append", default=[], help="also benchmark a live page")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    controller = BrowserController(headless=True, proxy=None)
+    async with async_playwright() as play:
+        browser = await play.chromium.launch(headless=True)
+        page = await browser.new_page(viewport={"width": 1280, "height": 800})
+        try:
+            for cards in args.cards:
+                await page.set_content(synthetic_page(cards))
+                await bench_page(controller, page, f"synthetic, {cards} cards", args.runs)
+            for url in args.url:
+                await page.goto(url, wait_until="load")
+                await bench_page(controller, page, url, args.runs)
+        finally:
+            await controller.dom_snapshot.close()
+            await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,14 +5,21 @@ from __future__ import annotations
 import asyncio
 from typing import Awaitable, Callable, Optional
 
-import cv2
 import numpy as np
 
 from backend.browser_controller import BrowserController
+from backend.cpu_pool import cpu_pool
+from backend.cpu_tasks import decode_image
 
 CaptchaSolver = Callable[[np.ndarray], str | None] | Callable[[np.ndarray], Awaitable[str | None]]
 
 
+async def _decode_image(image_bytes: bytes) -> np.ndarray:
+    """BGR pixels of a screenshot, as the solver receives them, decoded in the CPU pool."""
+
+    return await cpu_pool.run("captcha_decode", decode_image, image_bytes)
+
+
 async def _detect_captcha(page) -> bool:
     """Detect common CAPTCHA widgets on the current page."""
 
@@ -68,7 +75,7 @@ async def handle_captcha(
     """Detect and optionally solve CAPTCHA challenges using vision or manual review.
 
     When a CAPTCHA is detected, the function logs the event, optionally delegates
-    to a vision-based solver, and waits for the challenge to clear before
+    to a vision-based solver (given the current viewport frame), and waits for the challenge to clear before
     continuing. Returns ``True`` when the page is clear of CAPTCHAs, ``False``
     otherwise.
     """
@@ -80,8 +87,9 @@ async def handle_captcha(
     print("🛡️ CAPTCHA Detected")
 
     if solver:
-        screenshot_bytes = await browser.page.screenshot(full_page=True)
-        image = cv2.imdecode(np.frombuffer(screenshot_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        # The step's frame (captured once and shared with the page state) and its decoded pixels
+        frame = await browser.get_frame()
+        image = await frame.derive("captcha_image", _decode_image)
 
         maybe_awaitable = solver(image)
         solution = await maybe_awaitable if asyncio.iscoroutine(maybe_awaitable) else maybe_awaitable
@@ -4,7 +4,7 @@ import { JobForm } from './JobForm';
 import { StatusDisplay } from './StatusDisplay';
 import { TokenUsage } from './TokenUsage';
 import { DecisionLog } from './DecisionLog';
-import { ScreenshotGallery } from './ScreenshotGallery';
+import { ScreenshotGallery, ScreenshotRef } from './ScreenshotGallery';
 import { StreamingViewer } from './StreamingViewer';
 import { ProxyStats } from './ProxyStats';
 import { WebSocketManager } from '../services/WebSocketManager';
@@ -28,7 +28,7 @@ export const BrowserPilotDashboard: React.FC = () => {
     retry_count: 0
   });
   const [decisions, setDecisions] = useState<any[]>([]);
-  const [screenshots, setScreenshots] = useState<string[]>([]);
+  const [screenshots, setScreenshots] = useState<ScreenshotRef[]>([]);
   const [currentJobId, setCurrentJobId] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [streamingEnabled, setStreamingEnabled] = useState(false);
@@ -99,9 +99,9 @@ export const BrowserPilotDashboard: React.FC = () => {
     });
 
     wsManager.on('screenshot', (data: any) => {
-      const screenshot = data.screenshot || data;
-      if (typeof screenshot === 'string') {
-        setScreenshots(prev => [...prev, screenshot]);
+      // Only a reference arrives; the gallery loads thumbnails and full images by URL
+      if (data && typeof data.url === 'string') {
+        setScreenshots(prev => prev.some(shot => shot.hash === data.hash) ? prev : [...prev, data as ScreenshotRef]);
       }
     });
 
@@ -1,15 +1,31 @@
 import React, { useState } from 'react'
 import { Camera, X, Maximize2 } from 'lucide-react'
 
+// Reference to a screenshot stored on the server, as sent over the job websocket
+export interface ScreenshotRef {
+  hash: string
+  url: string
+  thumbnail_url: string
+  width: number
+  height: number
+  thumbnail_width: number
+  thumbnail_height: number
+  step?: number
+}
+
 interface ScreenshotGalleryProps {
-  screenshots: string[]
+  screenshots: ScreenshotRef[]
   onClear: () => void
 }
 
+// In development the frontend runs on the Vite port and the backend on 8000
+const backendBase = window.location.port === '5173' ? `${window.location.protocol}//localhost:8000` : ''
+const imageSrc = (path: string) => `${backendBase}${path}`
+
 export const ScreenshotGallery: React.FC<ScreenshotGalleryProps> = ({ screenshots, onClear }) => {
-  const [selectedImage, setSelectedImage] = useState<string | null>(null)
+  const [selectedImage, setSelectedImage] = useState<ScreenshotRef | null>(null)
 
-  const handleImageClick = (screenshot: string) => {
+  const handleImageClick = (screenshot: ScreenshotRef) => {
     setSelectedImage(screenshot)
   }
 
@@ -55,12 +71,15 @@ export const ScreenshotGallery: React.FC<ScreenshotGalleryProps> = ({ screenshot
             ) : (
               screenshots.map((screenshot, index) => (
                 <div 
-                  key={index}
+                  key={screenshot.hash}
                   className="relative group cursor-pointer transform hover:scale-105 transition-all duration-300"
                   onClick={() => handleImageClick(screenshot)}
                 >
                   <img 
-                    src={`data:image/png;base64,${screenshot}`}
+                    src={imageSrc(screenshot.thumbnail_url)}
+                    width={screenshot.thumbnail_width}
+                    height={screenshot.thumbnail_height}
+                    loading="lazy"
                     className="w-full h-32 object-cover rounded-xl border border-stone-200 dark:border-stone-700 shadow-sm group-hover:shadow-md transition-all duration-300" 
                     alt={`Screenshot ${index + 1}`}
                   />
@@ -69,7 +88,7 @@ export const ScreenshotGallery: React.FC<ScreenshotGalleryProps> = ({ screenshot
                   </div>
                   <div className="absolute bottom-2 left-2 right-2">
                     <div className="bg-black/70 text-white text-xs px-2 py-1 rounded-lg backdrop-blur-sm">
-                      Screenshot {index + 1} - {new Date().toLocaleTimeString()}
+                      {screenshot.step ? `Step ${screenshot.step}` : `Screenshot ${index + 1}`} - {screenshot.width}×{screenshot.height}
                     </div>
                   </div>
                 </div>
@@ -93,7 +112,9 @@ export const ScreenshotGallery: React.FC<ScreenshotGalleryProps> = ({ screenshot
               <X className="w-8 h-8" />
             </button>
             <img
-              src={`data:image/png;base64,${selectedImage}`}
+              src={imageSrc(selectedImage.url)}
+              width={selectedImage.width}
+              height={selectedImage.height}
               className="max-w-full max-h-full object-contain rounded-xl shadow-2xl"
               alt="Full size screenshot"
             />
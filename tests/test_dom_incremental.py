@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from playwright.async_api import async_playwright
+
+from backend.browser_controller import BrowserController
+from backend.page_settle import PageSettleDetector, SETTLE_INIT_JS
+
+FORM_URL = "data:text/html,<input id='q' name='q'><input id='c' type='checkbox'><button>Go</button>"
+
+
+async def _page_states(*actions):
+    """Page state of the form, then one more after each action (none of which changes the markup)"""
+    async with async_playwright() as play:
+        try:
+            browser = await play.chromium.launch()
+        except Exception as e:
+            pytest.skip(f"Chromium is not available: {e}")
+        try:
+            page = await browser.new_page()
+            await page.add_init_script(SETTLE_INIT_JS)
+            await page.goto(FORM_URL)
+
+            controller = BrowserController(headless=True, proxy=None)
+            controller.page = page
+            controller._settle_detector = PageSettleDetector(page)
+
+            states = [await controller.get_page_state(include_screenshot=False)]
+            for action in actions:
+                await action(page)
+                states.append(await controller.get_page_state(include_screenshot=False))
+            return states
+        finally:
+            await browser.close()
+
+
+def _element(page_state, element_id):
+    return next(e for e in page_state.selector_map.values() if e.attributes.get("id") == element_id)
+
+
+def test_typed_value_shows_in_next_state():
+    before, after = asyncio.run(_page_states(lambda page: page.fill("#q", "typed words")))
+
+    assert after.dom_stats["fullScan"] is False
+    assert _element(before, "q").text == ""
+    assert _element(after, "q").text == "typed words"
+    assert _element(after, "q").fingerprint != _element(before, "q").fingerprint
+
+
+async def _nothing(page):
+    pass
+
+
+def test_checked_input_is_not_reused():
+    before, checked, unchanged = asyncio.run(_page_states(lambda page: page.check("#c"), _nothing))
+
+    assert checked.dom_stats["fullScan"] is False
+    assert unchanged.dom_stats["fullScan"] is False
+    # Checking re-sends the checkbox and nothing else; with no change everything is reused
+    assert unchanged.dom_stats["reusedElements"] - checked.dom_stats["reusedElements"] == 1
+    assert _element(checked, "c").id == _element(before, "c").id